@@ -0,0 +1,199 @@
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import mne
+import numpy as np
+import pandas as pd
+
+from intermodulation.analysis import data_channels, epoch_window
+from intermodulation.freqplan import response_terms, term_labels
+from intermodulation.source import fourier_coefficients
+
+
+def coupling_triplets(
+    freqs: np.ndarray,
+    tagfreqs: Sequence[float],
+    noise_n_neighbor_freqs: int = 1,
+    noise_skip_neighbor_freqs: int = 1,
+) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Bin triplets (a, b, a + b) of every second-order term and its noise triplets.
+
+    Each second-order term couples two first-order components: f1 + f2 is (f1, f2), 2f1 is
+    (f1, f1), and the difference |f1 - f2| is written as a sum, e.g. (f1, f2 - f1) -> f2 when
+    f1 < f2. The noise triplets of a term shift `b` and `a + b` together by the same bin offsets
+    as the noise bins of `analysis.snr_spectrum`, so they keep the sum relation but pair the
+    tag with off-target frequencies.
+
+    Parameters
+    ----------
+    freqs : np.ndarray
+        (n_freqs,) evenly spaced frequencies of the spectrum, from 0 Hz.
+    tagfreqs : Sequence[float]
+        Tag frequencies f1 and f2.
+    noise_n_neighbor_freqs, noise_skip_neighbor_freqs : int, optional
+        Noise offsets on each side and offsets skipped next to the term, by default 1 and 1.
+
+    Returns
+    -------
+    triplets : pd.DataFrame
+        One row per term with its `term` label and `term_freq`, and the bins `bin_a`, `bin_b`
+        and `bin_c` (= `bin_a` + `bin_b`) of the triplet. Terms whose triplets do not fit in
+        `freqs` are dropped.
+    offsets : np.ndarray
+        (2 * noise_n_neighbor_freqs,) bin offsets of the noise triplets.
+    """
+    terms = response_terms(2)
+    terms = terms[np.abs(terms).sum(axis=1) == 2]
+    tagfreqs = np.asarray(tagfreqs, dtype=float)
+    step = freqs[1] - freqs[0]
+    tagbins = np.round(tagfreqs / step).astype(int)
+    rows = []
+    for (m1, m2), label in zip(terms, term_labels(terms)):
+        # Signed first-order components u + v of the term, flipped so their sum is positive
+        u, v = [np.sign(m) * tagbins[i] for i, m in enumerate((m1, m2)) for _ in range(abs(m))]
+        if u + v < 0:
+            u, v = -u, -v
+        # a + b = c with all bins positive, moving a negative component to the other side
+        lo, hi = sorted((u, v))
+        a, b, c = (lo, hi, lo + hi) if lo > 0 else (lo + hi, -lo, hi)
+        rows.append(
+            dict(
+                term=label,
+                term_freq=abs(m1 * tagfreqs[0] + m2 * tagfreqs[1]),
+                bin_a=a,
+                bin_b=b,
+                bin_c=c,
+            )
+        )
+    triplets = pd.DataFrame(rows, columns=["term", "term_freq", "bin_a", "bin_b", "bin_c"])
+    offsets = np.arange(1, noise_n_neighbor_freqs + 1) + noise_skip_neighbor_freqs
+    offsets = np.concatenate([-offsets[::-1], offsets])
+    inside = (
+        (triplets["bin_a"] > 0)
+        & (triplets["bin_b"] + offsets.min() > 0)
+        & (triplets["bin_c"] + offsets.max() < len(freqs))
+    )
+    triplets = triplets[inside].sort_values("term_freq").reset_index(drop=True)
+    return triplets, offsets
+
+
+def bicoherence(coefs: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """
+    Squared bicoherence over epochs of bin triplets of Fourier coefficients.
+
+    The bispectrum `B = mean(X_a X_b conj(X_c))` is normalized as in Kim and Powers (1979), by
+    `mean(|X_a X_b|**2) mean(|X_c|**2)`, so values lie in [0, 1] and reach 1 when the phase of
+    `c` is the sum of those of `a` and `b` in every epoch.
+
+    Parameters
+    ----------
+    coefs : np.ndarray
+        (n_epochs, n_channels, n_bins) Fourier coefficients, e.g. from
+        `source.fourier_coefficients`.
+    a, b, c : np.ndarray
+        Indices into the last axis of `coefs` of the triplets, all of the same shape.
+
+    Returns
+    -------
+    np.ndarray
+        (n_channels, *a.shape) squared bicoherence.
+    """
+    pair = coefs[..., a] * coefs[..., b]
+    target = coefs[..., c]
+    bispec = np.abs((pair * target.conj()).mean(axis=0)) ** 2
+    norm = (np.abs(pair) ** 2).mean(axis=0) * (np.abs(target) ** 2).mean(axis=0)
+    return np.divide(bispec, norm, out=np.zeros_like(bispec), where=norm > 0)
+
+
+@dataclass
+class Bicoherence:
+    """
+    Squared bicoherence of the second-order terms and of their noise triplets.
+
+    Attributes
+    ----------
+    triplets : pd.DataFrame
+        Triplets as from `coupling_triplets`, with their frequencies `freq_a`, `freq_b` and
+        `freq_c`.
+    offsets : np.ndarray
+        (n_noise,) bin offsets of the noise triplets.
+    bicoherence : np.ndarray
+        (n_channels, n_triplets) squared bicoherence of every term.
+    noise : np.ndarray
+        (n_channels, n_triplets, n_noise) squared bicoherence of the noise triplets.
+    ratio : np.ndarray
+        (n_channels, n_triplets) bicoherence over the mean of its noise triplets, the coupling
+        analogue of the SNR.
+    ch_names : list[str]
+        Channels.
+    """
+
+    triplets: pd.DataFrame
+    offsets: np.ndarray
+    bicoherence: np.ndarray
+    noise: np.ndarray
+    ratio: np.ndarray
+    ch_names: list[str]
+
+
+def epoch_bicoherence(
+    epochs: mne.BaseEpochs,
+    tagfreqs: Sequence[float],
+    tmin: float | None = None,
+    tmax: float | None = None,
+    noise_n_neighbor_freqs: int = 1,
+    noise_skip_neighbor_freqs: int = 1,
+    picks: list[str] | None = None,
+) -> Bicoherence:
+    """
+    Phase coupling of the IM and second harmonic terms with the tags, across epochs.
+
+    Only the Fourier coefficients of the bins of the target and noise triplets are computed,
+    once per epoch, so the cost is about that of an SNR at the same bins; the full bispectrum
+    is never formed.
+
+    Parameters
+    ----------
+    epochs : mne.BaseEpochs
+        Epochs, e.g. the miniblocks of one condition.
+    tagfreqs : Sequence[float]
+        Tag frequencies f1 and f2. They should fall on bins of the window.
+    tmin, tmax : float | None, optional
+        Window, by default the whole epoch.
+    noise_n_neighbor_freqs, noise_skip_neighbor_freqs : int, optional
+        Noise triplets, see `coupling_triplets`, by default 1 and 1.
+    picks : list[str] | None, optional
+        Channels, by default `analysis.data_channels`.
+
+    Returns
+    -------
+    Bicoherence
+        Bicoherence of every term and channel.
+    """
+    _, n_times = epoch_window(epochs, tmin, tmax)
+    freqs = np.fft.rfftfreq(n_times, 1.0 / epochs.info["sfreq"])
+    triplets, offsets = coupling_triplets(
+        freqs, tagfreqs, noise_n_neighbor_freqs, noise_skip_neighbor_freqs
+    )
+    for col in "abc":
+        triplets[f"freq_{col}"] = freqs[triplets[f"bin_{col}"]]
+    a = triplets["bin_a"].to_numpy()[:, None]
+    b = triplets["bin_b"].to_numpy()[:, None] + np.concatenate([[0], offsets])
+    c = triplets["bin_c"].to_numpy()[:, None] + np.concatenate([[0], offsets])
+    a = np.broadcast_to(a, b.shape)
+    bins, cols = np.unique(np.stack([a, b, c]).ravel(), return_inverse=True)
+    cols = cols.reshape(3, *b.shape)
+
+    if picks is None:
+        picks = data_channels(epochs.info)
+    coefs = fourier_coefficients(epochs, bins, picks, tmin, tmax)
+    bicoh = bicoherence(coefs, *cols)
+    return Bicoherence(
+        triplets=triplets,
+        offsets=offsets,
+        bicoherence=bicoh[..., 0],
+        noise=bicoh[..., 1:],
+        ratio=bicoh[..., 0] / bicoh[..., 1:].mean(axis=-1),
+        ch_names=list(picks),
+    )
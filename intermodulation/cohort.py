@@ -0,0 +1,236 @@
+import os
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from intermodulation.schedule import ScheduleConstraints
+from intermodulation.utils import load_prep_words
+from intermodulation.wordcache import cached_prep_words, prep_cache_key
+
+GROUPS = ("even", "odd")
+# Value of the "even_group" checkbox of `miniblock_task.py` that selects each group. The task reads
+# an unchecked box (0) as the even group.
+EVEN_GROUP_CHECKBOX = {"even": False, "odd": True}
+MANIFEST_INDEX = ["subject", "task", "trial"]
+
+
+@dataclass(frozen=True)
+class SubjectSpec:
+    """
+    Everything needed to prepare one subject's word lists.
+
+    Attributes
+    ----------
+    subject : str
+        Subject identifier.
+    group : str
+        Stimulus group, "even" or "odd".
+    seed : int
+        Session seed. `np.random.default_rng(seed)` reproduces the subject's lists, so this is the
+        value to enter in the session dialog of `miniblock_task.py`, together with `even_group`.
+    """
+
+    subject: str
+    group: str
+    seed: int
+
+    @property
+    def even_group(self) -> bool:
+        """State of the "even_group" checkbox of the session dialog for this subject's group."""
+        return EVEN_GROUP_CHECKBOX[self.group]
+
+
+def cohort_specs(
+    subjects: int | Sequence[str], cohort_seed: int, groups: Sequence[str] = GROUPS
+) -> list[SubjectSpec]:
+    """
+    Assign groups and independent seeds to the subjects of a cohort.
+
+    Each subject's seed is drawn from its own child of `np.random.SeedSequence(cohort_seed)`, so
+    seeds are statistically independent and subject `i` always gets the same seed for a given
+    cohort seed, no matter how many subjects are planned. Groups alternate in subject order.
+
+    Parameters
+    ----------
+    subjects : int | Sequence[str]
+        Number of subjects, named "sub-001", "sub-002", ..., or an explicit list of identifiers.
+    cohort_seed : int
+        Seed for the whole cohort.
+    groups : Sequence[str], optional
+        Groups to alternate between, by default ("even", "odd").
+
+    Returns
+    -------
+    list[SubjectSpec]
+        One spec per subject.
+    """
+    if isinstance(subjects, int):
+        subjects = [f"sub-{i + 1:03d}" for i in range(subjects)]
+    if len(set(subjects)) != len(subjects):
+        raise ValueError("Subject identifiers must be unique.")
+    children = np.random.SeedSequence(cohort_seed).spawn(len(subjects))
+    return [
+        SubjectSpec(
+            subject=str(sub),
+            group=groups[i % len(groups)],
+            seed=int(child.generate_state(1, dtype=np.uint32)[0]),
+        )
+        for i, (sub, child) in enumerate(zip(subjects, children))
+    ]
+
+
+def _plan_subject(
+    spec: SubjectSpec,
+    wordspath: Path,
+    miniblock_len: int,
+    freqs: Sequence[float],
+    constraints: ScheduleConstraints | None,
+    cache_dir: Path | None,
+) -> pd.DataFrame:
+    # Runs in a worker process: prepare the lists exactly as the session would and flatten them
+    path_1w = wordspath / f"{spec.group}_one_word_stimuli.csv"
+    path_2w = wordspath / f"{spec.group}_two_word_stimuli.csv"
+    rng = np.random.default_rng(spec.seed)
+    key = prep_cache_key(path_1w, path_2w, rng, miniblock_len, freqs, constraints)
+    if cache_dir is None:
+        onewords, twowords, _ = load_prep_words(
+            path_1w, path_2w, rng, miniblock_len, freqs, constraints
+        )
+    else:
+        onewords, twowords, _ = cached_prep_words(
+            path_1w, path_2w, rng, miniblock_len, freqs, cache_dir, constraints
+        )
+    tables = []
+    for task, words in (("twoword", twowords), ("oneword", onewords)):
+        words = words.rename_axis("stim_idx").reset_index()
+        words.insert(0, "trial", np.arange(len(words)))
+        words.insert(0, "task", task)
+        tables.append(words)
+    plan = pd.concat(tables, ignore_index=True)
+    plan.insert(0, "subject", spec.subject)
+    plan.insert(1, "group", spec.group)
+    plan.insert(2, "seed", spec.seed)
+    plan.insert(3, "even_group", spec.even_group)
+    plan.insert(4, "cache_key", key)
+    return plan
+
+
+def plan_cohort(
+    subjects: int | Sequence[str],
+    cohort_seed: int,
+    wordspath: str | Path,
+    miniblock_len: int,
+    freqs: Sequence[float],
+    constraints: ScheduleConstraints | None = None,
+    cache_dir: str | Path | None = None,
+    manifest_path: str | Path | None = None,
+    n_jobs: int | None = None,
+) -> pd.DataFrame:
+    """
+    Prepare the word lists, miniblock orders and tag frequencies of a whole cohort in parallel.
+
+    Every subject is prepared in a worker process with `load_prep_words`, seeded with the
+    subject's seed from `cohort_specs`. The result is a single manifest with one row per trial of
+    every subject, which can be audited offline and from which `subject_plan` recovers any
+    subject's lists. If `cache_dir` is given, the prepared lists are also stored in the word cache,
+    so running the session with the subject's seed reads the planned lists instead of recomputing
+    them. The session dialog needs both the `seed` and the `even_group` columns of the manifest:
+    the checkbox is left unchecked for the even group and checked for the odd group.
+
+    Parameters
+    ----------
+    subjects : int | Sequence[str]
+        Number of subjects or explicit identifiers, as in `cohort_specs`.
+    cohort_seed : int
+        Seed for the whole cohort.
+    wordspath : str | Path
+        Directory holding the `{group}_one_word_stimuli.csv` and `{group}_two_word_stimuli.csv`
+        files.
+    miniblock_len : int
+        Number of stimuli per miniblock.
+    freqs : Sequence[float]
+        Tagging frequencies.
+    constraints : ScheduleConstraints | None, optional
+        Miniblock schedule constraints, by default None (shuffle and split only).
+    cache_dir : str | Path | None, optional
+        Word cache directory to fill, by default None (no caching).
+    manifest_path : str | Path | None, optional
+        CSV file to write the manifest to, by default None (not written).
+    n_jobs : int | None, optional
+        Number of worker processes, by default one per CPU. 1 runs in the calling process.
+
+    Returns
+    -------
+    pd.DataFrame
+        Manifest indexed by (subject, task, trial), with the subject's group, seed, session
+        dialog checkbox `even_group` and cache key, the original stimulus index `stim_idx` and all
+        word list columns.
+    """
+    specs = cohort_specs(subjects, cohort_seed)
+    wordspath = Path(wordspath)
+    cache_dir = None if cache_dir is None else Path(cache_dir)
+    args = (wordspath, miniblock_len, list(freqs), constraints, cache_dir)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+
+    if n_jobs == 1:
+        plans = [_plan_subject(spec, *args) for spec in specs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(_plan_subject, spec, *args) for spec in specs]
+            plans = [future.result() for future in futures]
+
+    manifest = pd.concat(plans, ignore_index=True).set_index(MANIFEST_INDEX)
+    if manifest_path is not None:
+        manifest_path = Path(manifest_path)
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        manifest.to_csv(manifest_path)
+    return manifest
+
+
+def read_manifest(path: str | Path) -> pd.DataFrame:
+    """
+    Read a cohort manifest written by `plan_cohort`.
+
+    Parameters
+    ----------
+    path : str | Path
+        Manifest CSV file.
+
+    Returns
+    -------
+    pd.DataFrame
+        Manifest indexed by (subject, task, trial).
+    """
+    return pd.read_csv(path, index_col=MANIFEST_INDEX, dtype={"subject": str, "cache_key": str})
+
+
+def subject_plan(manifest: pd.DataFrame, subject: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Recover one subject's prepared one-word and two-word lists from a cohort manifest.
+
+    Parameters
+    ----------
+    manifest : pd.DataFrame
+        Manifest from `plan_cohort` or `read_manifest`.
+    subject : str
+        Subject identifier.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, pd.DataFrame]
+        One-word and two-word tables in presentation order, indexed by the original stimulus
+        index as from `load_prep_words`.
+    """
+    subplan = manifest.xs(subject, level="subject")
+    tables = []
+    for task in ("oneword", "twoword"):
+        words = subplan.xs(task, level="task")
+        words = words.drop(columns=["group", "seed", "even_group", "cache_key"])
+        words = words.dropna(axis=1, how="all")
+        tables.append(words.set_index("stim_idx").rename_axis(None))
+    return tuple(tables)
@@ -0,0 +1,200 @@
+import os
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import mne
+import numpy as np
+
+from intermodulation.spectra import SpectrumSummary
+
+SPECTRUM_ARRAYS = ("psds", "freqs", "snrs")
+
+
+def save_spectra(spectra: Mapping[str, Mapping[str, np.ndarray]], directory: str | Path) -> Path:
+    """
+    Write spectra to `.npy` files that figure workers can memory-map.
+
+    Parameters
+    ----------
+    spectra : Mapping[str, Mapping[str, np.ndarray]]
+        Spectra keyed by name, e.g. "oneword/allcond/F1", each with `psds`, `freqs` and `snrs`
+        arrays as computed in `02_subject_sensor_snr.py`.
+    directory : str | Path
+        Directory to write to. Each spectrum gets a subdirectory named after its key.
+
+    Returns
+    -------
+    Path
+        The directory.
+    """
+    directory = Path(directory)
+    for key, arrays in spectra.items():
+        keydir = directory / key
+        keydir.mkdir(parents=True, exist_ok=True)
+        for name in SPECTRUM_ARRAYS:
+            np.save(keydir / f"{name}.npy", np.asarray(arrays[name]))
+    return directory
+
+
+def load_spectrum(directory: str | Path, key: str) -> dict[str, np.ndarray]:
+    """
+    Memory-map one spectrum written by `save_spectra`.
+
+    Parameters
+    ----------
+    directory : str | Path
+        Directory passed to `save_spectra`.
+    key : str
+        Spectrum key.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Read-only memory-mapped `psds`, `freqs` and `snrs` arrays.
+    """
+    keydir = Path(directory) / key
+    return {name: np.load(keydir / f"{name}.npy", mmap_mode="r") for name in SPECTRUM_ARRAYS}
+
+
+@dataclass
+class FigureJob:
+    """
+    One figure to render from saved spectra.
+
+    Attributes
+    ----------
+    path : Path
+        File to save the figure to.
+    kind : str
+        "snr" for a grid of `plot.plot_snr` columns, one per key, or "snr_topo" for a
+        `plot.snr_topo` of the channel SNRs of a single key averaged over epochs.
+    keys : list[str]
+        Spectrum keys to plot.
+    titles : list[str]
+        Title annotation of each column ("snr") or figure title ("snr_topo").
+    tagfreqs : list
+        Frequency markers for each key, a float or list of floats each.
+    suptitle : str | None
+        Figure title of "snr" grids, by default None.
+    figsize : tuple[float, float] | None
+        Size of "snr" grids, by default 5 x 11 inches per column.
+    kwargs : dict
+        Extra arguments for the plot function.
+    """
+
+    path: Path
+    kind: str
+    keys: list[str]
+    titles: list[str]
+    tagfreqs: list
+    suptitle: str | None = None
+    figsize: tuple[float, float] | None = None
+    kwargs: dict = field(default_factory=dict)
+
+
+_WORKER_STATE = {}
+
+
+def _init_worker(spectra_dir: Path, info: mne.Info | None, use_agg: bool = True) -> None:
+    # Runs once per worker: force the non-interactive backend before pyplot is used
+    if use_agg:
+        import matplotlib
+
+        matplotlib.use("Agg")
+    _WORKER_STATE.update(spectra_dir=spectra_dir, info=info, summaries={})
+
+
+def _summary(key: str) -> SpectrumSummary:
+    # Jobs on the same worker often share keys, so band statistics are computed once per key
+    summaries = _WORKER_STATE["summaries"]
+    if key not in summaries:
+        summaries[key] = SpectrumSummary.from_spectrum(
+            load_spectrum(_WORKER_STATE["spectra_dir"], key)
+        )
+    return summaries[key]
+
+
+def _render(job: FigureJob) -> Path:
+    import matplotlib.pyplot as plt
+
+    import intermodulation.plot as imp
+
+    if job.kind == "snr":
+        ncols = len(job.keys)
+        figsize = (ncols * 5, 11) if job.figsize is None else job.figsize
+        fig, axes = plt.subplots(2, ncols, figsize=figsize, sharex=True, sharey="row")
+        axes = np.asarray(axes).reshape(2, ncols)
+        for i, (key, title, tagfreq) in enumerate(zip(job.keys, job.titles, job.tagfreqs)):
+            imp.plot_snr(
+                _summary(key),
+                fig=fig,
+                axes=axes[:, i],
+                titleannot=title,
+                tagfreq=tagfreq,
+                plotpsd=True,
+                **job.kwargs,
+            )
+        axes[1, 0].set_ylim([-0.5, 4.0])
+        if job.suptitle is not None:
+            fig.suptitle(job.suptitle, fontsize=16)
+            fig.tight_layout()
+    elif job.kind == "snr_topo":
+        (key,), (title,), (tagfreq,) = job.keys, job.titles, job.tagfreqs
+        vlines = tagfreq if isinstance(tagfreq, (list, np.ndarray)) else [tagfreq]
+        fig = imp.snr_topo(
+            _summary(key),
+            _WORKER_STATE["info"],
+            vlines=vlines,
+            **job.kwargs,
+        )
+        fig.suptitle(title, color="w")
+    else:
+        raise ValueError(f"Unknown figure kind {job.kind!r}.")
+    Path(job.path).parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(job.path)
+    plt.close(fig)
+    return Path(job.path)
+
+
+def render_figures(
+    jobs: Sequence[FigureJob],
+    spectra_dir: str | Path,
+    info: mne.Info | None = None,
+    n_jobs: int | None = None,
+) -> list[Path]:
+    """
+    Render figures from saved spectra, each in its own job of a process pool.
+
+    Workers use the Agg backend and memory-map the arrays written by `save_spectra`, so the
+    spectra are never pickled; only the jobs and, once per worker, `info` are sent over.
+
+    Parameters
+    ----------
+    jobs : Sequence[FigureJob]
+        Figures to render.
+    spectra_dir : str | Path
+        Directory written by `save_spectra`.
+    info : mne.Info | None, optional
+        Channel info for topographies, by default None (only needed for "snr_topo" jobs).
+    n_jobs : int | None, optional
+        Number of worker processes, by default one per CPU. 1 renders in the calling process,
+        with its current backend.
+
+    Returns
+    -------
+    list[Path]
+        Paths of the saved figures, in job order.
+    """
+    spectra_dir = Path(spectra_dir)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = max(1, min(n_jobs, len(jobs)))
+    if n_jobs == 1:
+        _init_worker(spectra_dir, info, use_agg=False)
+        return [_render(job) for job in jobs]
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, initializer=_init_worker, initargs=(spectra_dir, info)
+    ) as pool:
+        return list(pool.map(_render, jobs))
@@ -0,0 +1,353 @@
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+LINE_FREQ = 50.0  # Hz, mains frequency in the lab
+
+
+def renderable_frequencies(
+    framerate: float, fmin: float = 1.0, fmax: float | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Tag frequencies a display can render exactly as a square wave.
+
+    A tag is renderable if a cycle lasts an even number of frames, so that the on and off halves
+    are equally long.
+
+    Parameters
+    ----------
+    framerate : float
+        Display refresh rate in Hz.
+    fmin : float, optional
+        Lowest frequency to return, by default 1.0 Hz.
+    fmax : float | None, optional
+        Highest frequency to return, by default framerate / 2.
+
+    Returns
+    -------
+    frequencies : np.ndarray
+        Renderable frequencies in Hz, in decreasing order.
+    frames : np.ndarray
+        Frames per cycle of each frequency.
+    """
+    if framerate <= 0 or fmin <= 0:
+        raise ValueError("Framerate and minimum frequency must be positive.")
+    frames = np.arange(2, int(framerate / fmin) + 1, 2)
+    frequencies = framerate / frames
+    keep = frequencies >= fmin
+    if fmax is not None:
+        keep &= frequencies <= fmax
+    return frequencies[keep], frames[keep]
+
+
+def response_terms(order: int) -> np.ndarray:
+    """
+    Coefficients of every harmonic and intermodulation term up to an order.
+
+    Parameters
+    ----------
+    order : int
+        Largest order |m1| + |m2|.
+
+    Returns
+    -------
+    np.ndarray
+        (n_terms, 2) integer coefficients (m1, m2) of the terms m1 * f1 + m2 * f2. Each term is
+        listed with one sign only (m1 > 0, or m1 == 0 and m2 > 0). Terms with a zero coefficient
+        are harmonics of a single tag.
+    """
+    if order < 1:
+        raise ValueError("Order must be at least 1.")
+    m1, m2 = np.meshgrid(np.arange(order + 1), np.arange(-order, order + 1), indexing="ij")
+    m1, m2 = m1.ravel(), m2.ravel()
+    keep = (np.abs(m1) + np.abs(m2) <= order) & ((m1 > 0) | (m2 > 0))
+    return np.column_stack([m1[keep], m2[keep]])
+
+
+def term_labels(terms: np.ndarray) -> list[str]:
+    """
+    Readable labels such as "2f1-f2" for response term coefficients.
+
+    Parameters
+    ----------
+    terms : np.ndarray
+        (n_terms, 2) coefficients as from `response_terms`.
+
+    Returns
+    -------
+    list[str]
+        One label per term.
+    """
+
+    def part(m, name, first):
+        if m == 0:
+            return ""
+        sign = "-" if m < 0 else ("" if first else "+")
+        return f"{sign}{abs(m) if abs(m) != 1 else ''}{name}"
+
+    return [part(m1, "f1", True) + part(m2, "f2", m1 == 0) for m1, m2 in terms]
+
+
+def plan_tag_pairs(
+    framerate: float,
+    epoch_dur: float,
+    order: int = 4,
+    fmin: float = 3.0,
+    fmax: float = 30.0,
+    max_response: float | None = 100.0,
+    line_freq: float = LINE_FREQ,
+    tol: float | None = None,
+) -> pd.DataFrame:
+    """
+    Enumerate and rank every pair of tag frequencies a display can render exactly.
+
+    For each pair f1 < f2 the harmonic and intermodulation terms up to `order` are computed at
+    once for all pairs as a (pairs, terms) array, and scored on:
+
+    - `collisions`: the number of terms that land within `tol` of another term, so that their
+      responses cannot be told apart. Terms at 0 Hz count as collisions too.
+    - `min_gap`: the smallest distance in Hz between two distinct terms.
+    - `line_distance`: the smallest distance in Hz between a term and a mains harmonic
+      `k * line_freq`, k >= 1.
+    - `off_bin`: the number of terms that do not fall on a frequency bin of an epoch of
+      `epoch_dur` seconds.
+
+    Parameters
+    ----------
+    framerate : float
+        Display refresh rate in Hz.
+    epoch_dur : float
+        Duration of the analysis epoch in seconds, e.g. one miniblock.
+    order : int, optional
+        Largest order of the terms considered, by default 4.
+    fmin, fmax : float, optional
+        Range of the tag frequencies, by default 3 to 30 Hz.
+    max_response : float | None, optional
+        Terms above this frequency are ignored, by default 100 Hz. None keeps all of them.
+    line_freq : float, optional
+        Mains frequency, by default `LINE_FREQ`.
+    tol : float | None, optional
+        Distance below which two terms collide, by default the bin width 1 / `epoch_dur`.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per pair, best first, with columns `f1`, `f2`, `f1_frames`, `f2_frames`,
+        `collisions`, `min_gap`, `line_distance`, `off_bin` and `n_terms`. Pairs are ranked by
+        fewest collisions, then fewest off-bin terms, then largest line-noise distance, then
+        largest minimal gap.
+    """
+    if epoch_dur <= 0:
+        raise ValueError("Epoch duration must be positive.")
+    if tol is None:
+        tol = 1 / epoch_dur
+    freqs, frames = renderable_frequencies(framerate, fmin, fmax)
+    i, j = np.triu_indices(len(freqs), k=1)
+    # Frequencies come in decreasing order, so j indexes the lower frequency
+    f1, f2 = freqs[j], freqs[i]
+    terms = response_terms(order)
+    values = np.abs(f1[:, None] * terms[:, 0] + f2[:, None] * terms[:, 1])
+    considered = np.ones_like(values, dtype=bool)
+    if max_response is not None:
+        considered = values <= max_response + tol
+
+    # Ignored terms sort to the end as inf; gaps between two of them are nan and dropped below
+    ordered = np.sort(np.where(considered, values, np.inf), axis=1)
+    with np.errstate(invalid="ignore"):
+        gaps = np.diff(ordered, axis=1)
+    gaps[~np.isfinite(gaps)] = np.inf
+    close = gaps < tol
+    # A term collides if it is close to either neighbour in sorted order, or sits at 0 Hz
+    collided = np.zeros_like(ordered, dtype=bool)
+    collided[:, 1:] |= close
+    collided[:, :-1] |= close
+    collided |= ordered < tol
+    # Distance to the nearest mains harmonic k * line_freq with k >= 1; 0 Hz is not mains
+    line_dist = np.abs(values - line_freq * np.maximum(np.round(values / line_freq), 1))
+    line_dist = np.where(considered, line_dist, np.inf)
+    bins = values * epoch_dur
+    off_bin = considered & (np.abs(bins - np.round(bins)) > 1e-6 * np.maximum(bins, 1))
+
+    plan = pd.DataFrame(
+        {
+            "f1": f1,
+            "f2": f2,
+            "f1_frames": frames[j],
+            "f2_frames": frames[i],
+            "collisions": collided.sum(axis=1),
+            "min_gap": gaps.min(axis=1, initial=np.inf),
+            "line_distance": line_dist.min(axis=1),
+            "off_bin": off_bin.sum(axis=1),
+            "n_terms": considered.sum(axis=1),
+        }
+    )
+    plan = plan.sort_values(
+        ["collisions", "off_bin", "line_distance", "min_gap"],
+        ascending=[True, True, False, False],
+        kind="stable",
+    )
+    return plan.reset_index(drop=True)
+
+
+def _is_whole(x: np.ndarray, tol: float) -> np.ndarray:
+    return np.abs(x - np.round(x)) <= tol * np.maximum(np.abs(x), 1)
+
+
+def solve_word_durations(
+    framerate: float,
+    freqs: Sequence[float],
+    miniblock_len: int,
+    dur_bounds: tuple[float, float],
+    tol: float = 1e-6,
+) -> pd.DataFrame:
+    """
+    Every word duration with whole frames, whole tag cycles and IM terms on whole FFT bins.
+
+    Word durations are whole numbers of frames by construction. When a word also lasts a whole
+    number of cycles of every tag, every term m1 * f1 + m2 * f2 completes a whole number of
+    cycles per word, so all harmonics and intermodulation terms fall on bins of both the word and
+    the miniblock spectrum.
+
+    Parameters
+    ----------
+    framerate : float
+        Display refresh rate in Hz.
+    freqs : Sequence[float]
+        Tag frequencies in Hz. Each must have an even number of frames per cycle.
+    miniblock_len : int
+        Number of words per miniblock.
+    dur_bounds : tuple[float, float]
+        Inclusive bounds on the word duration in seconds.
+    tol : float, optional
+        Relative tolerance for a value to count as whole, by default 1e-6.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per feasible duration, shortest first, with columns `word_frames`, `word_dur`,
+        `miniblock_dur`, `bin_width` (frequency resolution of one miniblock in Hz) and
+        `cycles_f1`, `cycles_f2`, ... (tag cycles per word). Empty if nothing fits.
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    check_frame_timing(framerate, None, freqs, tol)
+    lo, hi = dur_bounds
+    word_frames = np.arange(
+        int(np.ceil(lo * framerate - tol)), int(np.floor(hi * framerate + tol)) + 1
+    )
+    word_dur = word_frames / framerate
+    cycles = word_dur[:, None] * freqs[None, :]
+    feasible = _is_whole(cycles, tol).all(axis=1)
+    miniblock_dur = miniblock_len * word_dur
+
+    solutions = pd.DataFrame(
+        {
+            "word_frames": word_frames,
+            "word_dur": word_dur,
+            "miniblock_dur": miniblock_dur,
+            "bin_width": 1 / miniblock_dur,
+        }
+    )
+    for k in range(len(freqs)):
+        solutions[f"cycles_f{k + 1}"] = np.round(cycles[:, k]).astype(int)
+    return solutions[feasible].reset_index(drop=True)
+
+
+def exact_windows(
+    sfreq: float, freqs: Sequence[float], max_dur: float, tol: float = 1e-6
+) -> np.ndarray:
+    """
+    Analysis window lengths that hold a whole number of cycles of every tag.
+
+    In such windows every tag, harmonic and IM term falls exactly on a bin of the window's
+    spectrum, so sliding-window spectra do not leak between bins at the tagged frequencies.
+
+    Parameters
+    ----------
+    sfreq : float
+        Sampling frequency in Hz.
+    freqs : Sequence[float]
+        Tag frequencies in Hz.
+    max_dur : float
+        Longest window in seconds.
+    tol : float, optional
+        Relative tolerance for a cycle count to count as whole, by default 1e-6.
+
+    Returns
+    -------
+    np.ndarray
+        Window lengths in samples, shortest first. Empty if none fits within `max_dur`.
+    """
+    n_samples = np.arange(1, int(np.floor(max_dur * sfreq + tol)) + 1)
+    cycles = n_samples[:, None] / sfreq * np.asarray(freqs, dtype=float)[None, :]
+    return n_samples[_is_whole(cycles, tol).all(axis=1)]
+
+
+def exact_sfreq(
+    window_dur: float, freqs: Sequence[float], max_sfreq: float, tol: float = 1e-6
+) -> float:
+    """
+    Highest sampling frequency at which a window is one of the `exact_windows`.
+
+    Whether a window holds whole tag cycles depends only on its duration, but it also has to be
+    a whole number of samples. One word of the experiment (680 / 240 s) is not at 1 or 2 kHz,
+    where the shortest exact window is three words, so recordings are resampled to this rate
+    to resolve single words.
+
+    Parameters
+    ----------
+    window_dur : float
+        Window length in seconds.
+    freqs : Sequence[float]
+        Tag frequencies in Hz.
+    max_sfreq : float
+        Highest allowed sampling frequency in Hz, e.g. that of the recording.
+    tol : float, optional
+        Relative tolerance for whole cycles and samples, by default 1e-6.
+
+    Returns
+    -------
+    float
+        Sampling frequency in Hz, at most `max_sfreq`.
+
+    Raises
+    ------
+    ValueError
+        If `window_dur` does not hold whole cycles of every tag at any sampling frequency.
+    """
+    if not _is_whole(window_dur * np.asarray(freqs, dtype=float), tol).all():
+        raise ValueError(f"A {window_dur} s window does not hold whole cycles of {freqs}.")
+    return float(np.floor(max_sfreq * window_dur * (1 + tol)) / window_dur)
+
+
+def check_frame_timing(
+    framerate: float, word_dur: float | None, freqs: Sequence[float], tol: float = 1e-6
+) -> None:
+    """
+    Check that tags and words can be rendered exactly at a refresh rate.
+
+    Parameters
+    ----------
+    framerate : float
+        Display refresh rate in Hz.
+    word_dur : float | None
+        Word duration in seconds, which must be a whole number of frames. None skips the check.
+    freqs : Sequence[float]
+        Tag frequencies in Hz, which must each have an even number of frames per cycle.
+    tol : float, optional
+        Relative tolerance for a value to count as whole, by default 1e-6.
+
+    Raises
+    ------
+    ValueError
+        If any of the timings cannot be rendered exactly.
+    """
+    problems = []
+    if word_dur is not None and not _is_whole(np.asarray(word_dur * framerate), tol):
+        problems.append(f"word duration {word_dur} s is {word_dur * framerate} frames")
+    for f in np.atleast_1d(np.asarray(freqs, dtype=float)):
+        frames = np.asarray(framerate / f)
+        if not (_is_whole(frames, tol) and int(np.round(frames)) % 2 == 0):
+            problems.append(f"{f} Hz tag has {framerate / f} frames per cycle, not an even number")
+    if problems:
+        raise ValueError(f"Timing cannot be rendered at {framerate} Hz: " + "; ".join(problems))
@@ -3,13 +3,23 @@ from types import SimpleNamespace
 
 from attridict import AttriDict
 
+from intermodulation.freqplan import solve_word_durations
+
 # Parameters for the experiment itself
 WORDSPATH = Path(__file__).parents[1]
+WORDCACHE_PATH = WORDSPATH / "prepared_words"  # content-addressed cache of prepared word lists
 MINIBLOCK_LEN = 10
+# Constraints on each subject's miniblock sequence, see `schedule.ScheduleConstraints`
+MINIBLOCK_CONSTRAINTS = dict(
+    max_word_repeats=1,  # No word twice within a miniblock
+    min_word_distance=2,  # No word in two consecutive miniblocks
+    max_condition_run=2,  # At most two miniblocks of the same condition in a row
+    tag_block_len=6,  # F1/F2 order balanced within every 6 miniblocks
+)
 N_BLOCKS = 3
 N_1W_BLOCKS = 2
 FREQUENCIES = [6, 7.05882353]
-WORD_DUR = 2.833333333333333333333333
+WORD_DUR_BOUNDS = (2.5, 3.0)  # seconds, WORD_DUR is derived from these below
 ITI_BOUNDS = [1.0, 3.0]
 FIXATION_DUR = 0.5
 QUERY_PAUSE_DUR = 1.0
@@ -71,6 +81,11 @@ debug = SimpleNamespace(
 TRIGGER = "/dev/parport0"
 FULLSCR = True
 FRAMERATE = 240
+# Shortest word duration within bounds that lasts whole frames and whole cycles of both tags
+# (680 frames, 2.8333 s at 240 Hz), so every IM term falls on an FFT bin of a miniblock
+WORD_DUR = float(
+    solve_word_durations(FRAMERATE, FREQUENCIES, MINIBLOCK_LEN, WORD_DUR_BOUNDS)["word_dur"].iloc[0]
+)
 WORD_SEP: float = 0.3  # word separation in degrees
 
 DISPLAY_RES = (1280, 720)
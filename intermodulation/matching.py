@@ -0,0 +1,233 @@
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from scipy.stats import ttest_ind, ttest_rel
+
+from intermodulation.ngrams import NgramIndex
+
+VOWELS = "aeiouy"
+# Default matching weights. Word frequencies and lengths matter most; the phrase frequency of the
+# reversed (non-phrase) order and letter make-up are secondary.
+FEATURE_WEIGHTS = {
+    "w1_logfreq": 1.0,
+    "w2_logfreq": 1.0,
+    "w1_len": 1.0,
+    "w2_len": 1.0,
+    "phrase_logfreq": 0.5,
+    "reversed_logfreq": 0.5,
+    "w1_vowel_frac": 0.25,
+    "w2_vowel_frac": 0.25,
+}
+
+
+def pair_features(pairs: pd.DataFrame, index: NgramIndex) -> pd.DataFrame:
+    """
+    Compute matching features for word pairs.
+
+    Parameters
+    ----------
+    pairs : pd.DataFrame
+        Word pairs with `w1` and `w2` columns.
+    index : NgramIndex
+        N-gram index used for word and bigram frequencies.
+
+    Returns
+    -------
+    pd.DataFrame
+        Features indexed like `pairs`: log10 frequencies of each word (`w1_logfreq`,
+        `w2_logfreq`), of the pair in order (`phrase_logfreq`) and reversed
+        (`reversed_logfreq`), word lengths (`w1_len`, `w2_len`) and the fraction of vowels in each
+        word (`w1_vowel_frac`, `w2_vowel_frac`).
+    """
+    w1 = pairs["w1"].to_numpy(dtype=str)
+    w2 = pairs["w2"].to_numpy(dtype=str)
+    features = {
+        "w1_logfreq": np.log10(index.word_freq(w1) + 1),
+        "w2_logfreq": np.log10(index.word_freq(w2) + 1),
+        "phrase_logfreq": np.log10(index.bigram_freq(w1, w2) + 1),
+        "reversed_logfreq": np.log10(index.bigram_freq(w2, w1) + 1),
+    }
+    for name, words in (("w1", pairs["w1"]), ("w2", pairs["w2"])):
+        lengths = words.str.len().to_numpy()
+        features[f"{name}_len"] = lengths
+        vowels = words.str.lower().str.count(f"[{VOWELS}]").to_numpy()
+        features[f"{name}_vowel_frac"] = vowels / np.maximum(lengths, 1)
+    return pd.DataFrame(features, index=pairs.index)
+
+
+def cost_matrix(
+    left: pd.DataFrame, right: pd.DataFrame, weights: Mapping[str, float] = FEATURE_WEIGHTS
+) -> np.ndarray:
+    """
+    Weighted squared distance between every left and every right item in standardized features.
+
+    Features are standardized with the mean and standard deviation of both sides pooled. The
+    distance is computed as |a|^2 + |b|^2 - 2 a.b, so memory use is O(n_left * n_right) regardless
+    of the number of features.
+
+    Parameters
+    ----------
+    left, right : pd.DataFrame
+        Features of the two sides, e.g. from `pair_features`.
+    weights : Mapping[str, float], optional
+        Weight of each feature used, by default `FEATURE_WEIGHTS`.
+
+    Returns
+    -------
+    np.ndarray
+        (n_left, n_right) cost matrix.
+    """
+    names = list(weights)
+    pooled = np.concatenate([left[names].to_numpy(float), right[names].to_numpy(float)])
+    scale = pooled.std(axis=0)
+    scale[scale == 0] = 1.0
+    sqrt_w = np.sqrt(np.array([weights[n] for n in names], dtype=float)) / scale
+    a = (left[names].to_numpy(float) - pooled.mean(axis=0)) * sqrt_w
+    b = (right[names].to_numpy(float) - pooled.mean(axis=0)) * sqrt_w
+    cost = (a**2).sum(axis=1)[:, None] + (b**2).sum(axis=1)[None, :] - 2 * a @ b.T
+    return np.maximum(cost, 0.0)
+
+
+def match_items(
+    left: pd.DataFrame,
+    right: pd.DataFrame,
+    weights: Mapping[str, float] = FEATURE_WEIGHTS,
+    n: int | None = None,
+) -> pd.DataFrame:
+    """
+    Optimal one-to-one matching of left and right items on their features.
+
+    Parameters
+    ----------
+    left, right : pd.DataFrame
+        Features of the two sides.
+    weights : Mapping[str, float], optional
+        Feature weights, by default `FEATURE_WEIGHTS`.
+    n : int | None, optional
+        Number of matched pairs to keep, by default all min(n_left, n_right) of them. The `n`
+        cheapest pairs of the optimal full matching are kept.
+
+    Returns
+    -------
+    pd.DataFrame
+        `left` and `right` index labels of each matched pair and its `cost`, cheapest first.
+    """
+    cost = cost_matrix(left, right, weights)
+    rows, cols = linear_sum_assignment(cost)
+    matched = pd.DataFrame(
+        {"left": left.index[rows], "right": right.index[cols], "cost": cost[rows, cols]}
+    )
+    matched = matched.sort_values("cost", kind="stable").reset_index(drop=True)
+    if n is not None:
+        if n > len(matched):
+            raise ValueError(f"Only {len(matched)} pairs can be matched, {n} were requested.")
+        matched = matched.iloc[:n]
+    return matched
+
+
+def balance_stats(
+    left: pd.DataFrame, right: pd.DataFrame, paired: bool = False
+) -> pd.DataFrame:
+    """
+    Report how well two sets of items are balanced on every feature.
+
+    Parameters
+    ----------
+    left, right : pd.DataFrame
+        Features of the two sets, with the same columns. Rows correspond if `paired`.
+    paired : bool, optional
+        Whether rows are matched pairs, in which case a paired t-test is used. By default False
+        (Welch's t-test).
+
+    Returns
+    -------
+    pd.DataFrame
+        Per feature: the mean and standard deviation of each set, the standardized mean difference
+        `smd` (difference over the pooled standard deviation), and the t-test `t` and `p` values.
+    """
+    stats = pd.DataFrame(
+        {
+            "left_mean": left.mean(),
+            "right_mean": right.mean(),
+            "left_std": left.std(),
+            "right_std": right.std(),
+        }
+    )
+    pooled_std = np.sqrt((stats["left_std"] ** 2 + stats["right_std"] ** 2) / 2)
+    stats["smd"] = (stats["left_mean"] - stats["right_mean"]) / pooled_std.replace(0, np.nan)
+    if paired:
+        test = ttest_rel(left.to_numpy(float), right.to_numpy(float), axis=0)
+    else:
+        test = ttest_ind(left.to_numpy(float), right.to_numpy(float), axis=0, equal_var=False)
+    stats["t"] = test.statistic
+    stats["p"] = test.pvalue
+    return stats
+
+
+def split_phrase_lists(
+    candidates: pd.DataFrame,
+    index: NgramIndex,
+    n: int,
+    rng: np.random.Generator,
+    weights: Mapping[str, float] = FEATURE_WEIGHTS,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Build matched phrase sets for the even and odd subject groups.
+
+    Each group sees one set of phrases as phrases and the other set, with its words swapped, as
+    non-phrases, as in `word_ngrams/final_P_NP_{even,odd}subs.csv`. The candidates are shuffled
+    and halved, the halves are optimally matched, the `n` best matched pairs are kept and each
+    pair is split between the sets at random, so neither set inherits a bias from the halving.
+
+    Parameters
+    ----------
+    candidates : pd.DataFrame
+        Candidate phrases with `w1` and `w2` columns, at least `2 * n` of them.
+    index : NgramIndex
+        N-gram index for the matching features.
+    n : int
+        Number of phrases per set.
+    rng : np.random.Generator
+        Random state for the halving and the split.
+    weights : Mapping[str, float], optional
+        Feature weights, by default `FEATURE_WEIGHTS`.
+
+    Returns
+    -------
+    even : pd.DataFrame
+        Even-group list: set "b" as phrases and set "a" swapped as non-phrases, with `w1`, `w2`,
+        `condition` and `subtype` columns and the set letter as index.
+    odd : pd.DataFrame
+        Odd-group list: set "a" as phrases and set "b" swapped as non-phrases.
+    stats : pd.DataFrame
+        Paired balance statistics between the phrases of set "a" and set "b".
+    """
+    if len(candidates) < 2 * n:
+        raise ValueError(f"At least {2 * n} candidates are needed, got {len(candidates)}.")
+    candidates = candidates.reset_index(drop=True)
+    features = pair_features(candidates, index)
+    order = rng.permutation(len(candidates))
+    half = len(order) // 2
+    matched = match_items(
+        features.iloc[order[:half]], features.iloc[order[half:]], weights, n
+    )
+    flip = rng.random(len(matched)) < 0.5
+    set_a = np.where(flip, matched["right"], matched["left"])
+    set_b = np.where(flip, matched["left"], matched["right"])
+
+    phrases = {"a": candidates.loc[set_a, ["w1", "w2"]], "b": candidates.loc[set_b, ["w1", "w2"]]}
+    lists = {}
+    for subtype, seen, other in (("even", "b", "a"), ("odd", "a", "b")):
+        phrase = phrases[seen].assign(condition="phrase")
+        nonphrase = phrases[other].rename(columns={"w1": "w2", "w2": "w1"})[["w1", "w2"]]
+        nonphrase = nonphrase.assign(condition="non-phrase")
+        group = pd.concat([phrase.set_axis([seen] * n), nonphrase.set_axis([other] * n)])
+        lists[subtype] = group.assign(subtype=subtype)
+    stats = balance_stats(
+        features.loc[set_a, list(weights)].reset_index(drop=True),
+        features.loc[set_b, list(weights)].reset_index(drop=True),
+        paired=True,
+    )
+    return lists["even"], lists["odd"], stats
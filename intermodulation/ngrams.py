@@ -0,0 +1,428 @@
+import json
+import tempfile
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# On-disk layout: a directory holding one raw binary file per array plus `index.json`, which
+# records the dtype and shape of every array. Arrays are opened with `np.memmap`, so opening an
+# index costs nothing and lookups only page in the parts of the arrays they touch.
+INDEX_VERSION = 1
+INDEX_HEADER = "index.json"
+_KEY_DTYPE = np.dtype("<i8")
+_FREQ_DTYPE = np.dtype("<i8")
+
+
+def iter_ngram_chunks(
+    path: str | Path, chunksize: int = 1_000_000, sep: str = ","
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream an n-gram table with `ngram` and `freq` columns in chunks of rows.
+
+    Parameters
+    ----------
+    path : str | Path
+        Table of n-grams, one per row, as in the `word_ngrams` directory.
+    chunksize : int, optional
+        Number of rows per chunk, by default 1_000_000.
+    sep : str, optional
+        Column separator, by default ",". Use "\\t" for tab-separated corpus dumps.
+
+    Yields
+    ------
+    pd.DataFrame
+        Chunk with `ngram` (str) and `freq` (int64) columns.
+    """
+    yield from pd.read_csv(
+        path,
+        sep=sep,
+        usecols=["ngram", "freq"],
+        dtype={"ngram": str, "freq": np.int64},
+        keep_default_na=False,
+        chunksize=chunksize,
+    )
+
+
+def split_pos(ngrams: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """
+    Split `word_POS` tokens on the last underscore. Tokens without a tag get an empty POS.
+    """
+    parts = ngrams.str.rsplit("_", n=1, expand=True)
+    if parts.shape[1] == 1:
+        return parts[0], pd.Series("", index=ngrams.index)
+    words = parts[0].where(parts[1].notna(), ngrams)
+    return words, parts[1].fillna("")
+
+
+def split_bigrams(ngrams: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """
+    Split space-separated bigrams into their first and second tokens.
+    """
+    parts = ngrams.str.split(" ", n=1, expand=True)
+    if parts.shape[1] == 1:
+        raise ValueError("Bigram table contains no space-separated bigrams.")
+    return parts[0], parts[1].fillna("")
+
+
+def _encode(values) -> np.ndarray:
+    # UTF-8 byte strings sort in code point order, so `searchsorted` on them matches str sorting
+    values = np.asarray(values, dtype=np.str_)
+    if values.size == 0:
+        return np.empty(values.shape, dtype="S1")
+    return np.char.encode(values, "utf-8")
+
+
+def _lookup(sorted_values: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """Position of each query in `sorted_values`, -1 where it is absent. O(log n) per query."""
+    if len(sorted_values) == 0:
+        return np.full(queries.shape, -1, dtype=np.int64)
+    idx = np.searchsorted(sorted_values, queries)
+    found = idx < len(sorted_values)
+    found[found] = sorted_values[idx[found]] == queries[found]
+    return np.where(found, idx, -1)
+
+
+def _external_sort(
+    chunks: Iterator[tuple[np.ndarray, np.ndarray]],
+    key_max: int,
+    n_rows: int,
+    bucket_rows: int,
+    outdir: Path,
+    name: str,
+) -> int:
+    """
+    Sort (key, freq) pairs by key and sum the frequencies of duplicate keys, with memory bounded
+    by `bucket_rows`. Pairs are first scattered into key-range buckets on disk, then each bucket is
+    sorted in memory and appended to `{name}_keys.bin` / `{name}_freq.bin`. Returns the number of
+    unique keys written.
+    """
+    n_buckets = max(1, -(-n_rows // bucket_rows))
+    width = -(-max(key_max, 1) // n_buckets)
+    pair = np.dtype([("key", _KEY_DTYPE), ("freq", _FREQ_DTYPE)])
+    n_unique = 0
+    with tempfile.TemporaryDirectory(dir=outdir) as tmpdir:
+        buckets = [open(Path(tmpdir) / f"{i}.bin", "wb") for i in range(n_buckets)]
+        try:
+            for keys, freqs in chunks:
+                bucket_idx = keys // width
+                order = np.argsort(bucket_idx, kind="stable")
+                bounds = np.searchsorted(bucket_idx[order], np.arange(n_buckets + 1))
+                rows = np.empty(len(keys), dtype=pair)
+                rows["key"] = keys[order]
+                rows["freq"] = freqs[order]
+                for i in np.flatnonzero(np.diff(bounds)):
+                    buckets[i].write(rows[bounds[i] : bounds[i + 1]].tobytes())
+        finally:
+            for f in buckets:
+                f.close()
+
+        with (
+            open(outdir / f"{name}_keys.bin", "wb") as fkeys,
+            open(outdir / f"{name}_freq.bin", "wb") as ffreq,
+        ):
+            for i in range(n_buckets):
+                rows = np.fromfile(Path(tmpdir) / f"{i}.bin", dtype=pair)
+                if len(rows) == 0:
+                    continue
+                rows.sort(order="key", kind="stable")
+                starts = np.flatnonzero(np.diff(rows["key"], prepend=rows["key"][0] - 1))
+                rows["key"][starts].astype(_KEY_DTYPE).tofile(fkeys)
+                np.add.reduceat(rows["freq"], starts).astype(_FREQ_DTYPE).tofile(ffreq)
+                n_unique += len(starts)
+    return n_unique
+
+
+def build_ngram_index(
+    unigram_path: str | Path,
+    bigram_path: str | Path,
+    outdir: str | Path,
+    chunksize: int = 1_000_000,
+    bucket_rows: int = 20_000_000,
+    sep: str = ",",
+) -> Path:
+    """
+    Build a memory-mapped, sorted index over a 1-gram (with POS) and a 2-gram frequency table.
+
+    Tokens and POS tags are dictionary-encoded against sorted vocabularies. A 1-gram is stored as
+    the key `word_id * n_pos + pos_id` and a bigram as `w1_id * n_words + w2_id`, each in a sorted
+    int64 array next to its frequencies, so every lookup is a binary search. Both tables are read
+    in chunks and sorted externally, so memory use is bounded by the vocabulary size, `chunksize`
+    and `bucket_rows` rather than by the size of the corpus files. Duplicate n-grams have their
+    frequencies summed.
+
+    Parameters
+    ----------
+    unigram_path : str | Path
+        Table of `word_POS` 1-grams with `ngram` and `freq` columns.
+    bigram_path : str | Path
+        Table of space-separated 2-grams with `ngram` and `freq` columns.
+    outdir : str | Path
+        Directory to write the index to. Created if needed; existing index files are replaced.
+    chunksize : int, optional
+        Rows read from the tables at a time, by default 1_000_000.
+    bucket_rows : int, optional
+        Approximate number of rows sorted in memory at a time, by default 20_000_000.
+    sep : str, optional
+        Column separator of both tables, by default ",".
+
+    Returns
+    -------
+    Path
+        The index directory, to be opened with `NgramIndex`.
+    """
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    (outdir / INDEX_HEADER).unlink(missing_ok=True)
+
+    # Pass 1: vocabularies and row counts
+    tokens, tags = set(), set()
+    n_uni = n_bi = 0
+    for chunk in iter_ngram_chunks(unigram_path, chunksize, sep):
+        words, pos = split_pos(chunk["ngram"])
+        tokens.update(words.unique())
+        tags.update(pos.unique())
+        n_uni += len(chunk)
+    for chunk in iter_ngram_chunks(bigram_path, chunksize, sep):
+        w1, w2 = split_bigrams(chunk["ngram"])
+        tokens.update(w1.unique())
+        tokens.update(w2.unique())
+        n_bi += len(chunk)
+    vocab = np.unique(_encode(sorted(tokens)))
+    pos_tags = np.unique(_encode(sorted(tags)))
+    n_words, n_pos = len(vocab), len(pos_tags)
+    vocab.tofile(outdir / "vocab.bin")
+    pos_tags.tofile(outdir / "pos_tags.bin")
+
+    # Pass 2: encode and sort both tables
+    def unigram_keys():
+        for chunk in iter_ngram_chunks(unigram_path, chunksize, sep):
+            words, pos = split_pos(chunk["ngram"])
+            keys = _lookup(vocab, _encode(words)) * n_pos + _lookup(pos_tags, _encode(pos))
+            yield keys, chunk["freq"].to_numpy(dtype=np.int64)
+
+    def bigram_keys():
+        for chunk in iter_ngram_chunks(bigram_path, chunksize, sep):
+            w1, w2 = split_bigrams(chunk["ngram"])
+            keys = _lookup(vocab, _encode(w1)) * n_words + _lookup(vocab, _encode(w2))
+            yield keys, chunk["freq"].to_numpy(dtype=np.int64)
+
+    n_unigrams = _external_sort(
+        unigram_keys(), n_words * n_pos, n_uni, bucket_rows, outdir, "unigram"
+    )
+    n_bigrams = _external_sort(
+        bigram_keys(), n_words * n_words, n_bi, bucket_rows, outdir, "bigram"
+    )
+
+    # Per-word totals over all POS tags, for untagged lookups
+    word_freq = np.zeros(n_words, dtype=_FREQ_DTYPE)
+    keys = np.memmap(outdir / "unigram_keys.bin", dtype=_KEY_DTYPE, mode="r", shape=(n_unigrams,))
+    freqs = np.memmap(
+        outdir / "unigram_freq.bin", dtype=_FREQ_DTYPE, mode="r", shape=(n_unigrams,)
+    )
+    for start in range(0, n_unigrams, chunksize):
+        chunk = slice(start, start + chunksize)
+        np.add.at(word_freq, keys[chunk] // n_pos, freqs[chunk])
+    total_unigram = int(word_freq.sum())
+    word_freq.tofile(outdir / "word_freq.bin")
+    bigram_freq = np.memmap(
+        outdir / "bigram_freq.bin", dtype=_FREQ_DTYPE, mode="r", shape=(n_bigrams,)
+    )
+    total_bigram = int(
+        sum(int(bigram_freq[s : s + chunksize].sum()) for s in range(0, n_bigrams, chunksize))
+    )
+    del keys, freqs, bigram_freq
+
+    header = {
+        "version": INDEX_VERSION,
+        "sources": {"unigram": str(unigram_path), "bigram": str(bigram_path)},
+        "total_unigram": total_unigram,
+        "total_bigram": total_bigram,
+        "arrays": {
+            "vocab": {"dtype": vocab.dtype.str, "shape": [n_words]},
+            "pos_tags": {"dtype": pos_tags.dtype.str, "shape": [n_pos]},
+            "word_freq": {"dtype": _FREQ_DTYPE.str, "shape": [n_words]},
+            "unigram_keys": {"dtype": _KEY_DTYPE.str, "shape": [n_unigrams]},
+            "unigram_freq": {"dtype": _FREQ_DTYPE.str, "shape": [n_unigrams]},
+            "bigram_keys": {"dtype": _KEY_DTYPE.str, "shape": [n_bigrams]},
+            "bigram_freq": {"dtype": _FREQ_DTYPE.str, "shape": [n_bigrams]},
+        },
+    }
+    # The header is written last, so an interrupted build never looks like a valid index
+    with open(outdir / INDEX_HEADER, "w") as f:
+        json.dump(header, f, indent=2)
+    return outdir
+
+
+class NgramIndex:
+    """
+    Read-only, memory-mapped view of an index built by `build_ngram_index`.
+
+    Every lookup accepts either a single string, returning a scalar, or a sequence of strings,
+    returning an array, and costs O(log n) per queried item. Missing words and n-grams have
+    frequency 0 and word id -1.
+
+    Parameters
+    ----------
+    path : str | Path
+        Index directory.
+
+    Attributes
+    ----------
+    total_unigram : int
+        Sum of all 1-gram frequencies.
+    total_bigram : int
+        Sum of all 2-gram frequencies.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        with open(self.path / INDEX_HEADER) as f:
+            header = json.load(f)
+        if header["version"] != INDEX_VERSION:
+            raise ValueError(
+                f"N-gram index {path} has version {header['version']}, expected {INDEX_VERSION}."
+            )
+        self.total_unigram = header["total_unigram"]
+        self.total_bigram = header["total_bigram"]
+        for name, spec in header["arrays"].items():
+            shape = tuple(spec["shape"])
+            if shape[0] == 0:  # np.memmap cannot map empty files
+                arr = np.empty(shape, dtype=spec["dtype"])
+            else:
+                arr = np.memmap(
+                    self.path / f"{name}.bin", dtype=spec["dtype"], mode="r", shape=shape
+                )
+            setattr(self, f"_{name}", arr)
+        self.n_words = len(self._vocab)
+        self.n_pos = len(self._pos_tags)
+
+    @staticmethod
+    def _queries(values) -> tuple[np.ndarray, bool]:
+        scalar = isinstance(values, str)
+        return _encode(np.atleast_1d(np.asarray(values, dtype=np.str_))), scalar
+
+    @staticmethod
+    def _result(values: np.ndarray, scalar: bool):
+        return values[0].item() if scalar else values
+
+    def _pos_ids(self, pos) -> np.ndarray:
+        pos = np.broadcast_to(np.asarray(pos, dtype=np.str_), np.shape(np.atleast_1d(pos)))
+        return _lookup(self._pos_tags, _encode(pos))
+
+    def word_ids(self, words: str | Sequence[str]) -> int | np.ndarray:
+        """
+        Integer ids of words in the sorted vocabulary, -1 for unknown words.
+        """
+        queries, scalar = self._queries(words)
+        return self._result(_lookup(self._vocab, queries), scalar)
+
+    def words(self, ids: int | Sequence[int]) -> str | np.ndarray:
+        """
+        Words for vocabulary ids, the inverse of `word_ids`.
+        """
+        ids = np.asarray(ids)
+        decoded = np.char.decode(np.asarray(self._vocab[np.atleast_1d(ids)]), "utf-8")
+        return decoded[0].item() if ids.ndim == 0 else decoded
+
+    def vocabulary(self) -> pd.DataFrame:
+        """
+        All words of the index with their frequency summed over POS tags, in vocabulary order.
+        """
+        return pd.DataFrame(
+            {
+                "word": np.char.decode(np.asarray(self._vocab), "utf-8"),
+                "freq": np.asarray(self._word_freq),
+            }
+        )
+
+    def word_freq(self, words: str | Sequence[str]) -> int | np.ndarray:
+        """
+        Frequency of words summed over all POS tags.
+        """
+        queries, scalar = self._queries(words)
+        ids = _lookup(self._vocab, queries)
+        freqs = np.where(ids >= 0, np.asarray(self._word_freq[np.maximum(ids, 0)]), 0)
+        return self._result(freqs, scalar)
+
+    def pos_freq(self, words: str | Sequence[str], pos: str | Sequence[str]) -> int | np.ndarray:
+        """
+        Frequency of words tagged with a given POS. `pos` is a single tag or one tag per word.
+        """
+        queries, scalar = self._queries(words)
+        ids = _lookup(self._vocab, queries)
+        pos_ids = np.broadcast_to(self._pos_ids(pos), ids.shape)
+        keys = ids * self.n_pos + pos_ids
+        idx = _lookup(self._unigram_keys, keys)
+        valid = (idx >= 0) & (ids >= 0) & (pos_ids >= 0)
+        freqs = np.where(valid, np.asarray(self._unigram_freq[np.maximum(idx, 0)]), 0)
+        return self._result(freqs, scalar)
+
+    def word_pos(self, word: str) -> pd.Series:
+        """
+        Frequency of a word under every POS tag it occurs with, most frequent first.
+        """
+        wid = self.word_ids(word)
+        if wid < 0:
+            return pd.Series(dtype=np.int64, name=word)
+        lo, hi = np.searchsorted(self._unigram_keys, [wid * self.n_pos, (wid + 1) * self.n_pos])
+        tags = np.char.decode(np.asarray(self._pos_tags[self._unigram_keys[lo:hi] % self.n_pos]))
+        freqs = pd.Series(np.asarray(self._unigram_freq[lo:hi]), index=tags, name=word)
+        return freqs.sort_values(ascending=False, kind="stable")
+
+    def pos_table(self, pos: str | Sequence[str], chunksize: int = 10_000_000) -> pd.DataFrame:
+        """
+        All words occurring with the given POS tag(s), with `word_id`, `word`, `pos` and `freq`
+        columns. The unigram keys are scanned in chunks, so memory use is bounded by the result.
+        """
+        pos_ids = self._pos_ids(np.atleast_1d(pos))
+        pos_ids = pos_ids[pos_ids >= 0]
+        found = []
+        for start in range(0, len(self._unigram_keys), chunksize):
+            keys = np.asarray(self._unigram_keys[start : start + chunksize])
+            idx = np.flatnonzero(np.isin(keys % self.n_pos, pos_ids))
+            freqs = np.asarray(self._unigram_freq[start : start + chunksize])[idx]
+            found.append((keys[idx], freqs))
+        keys = np.concatenate([k for k, _ in found]) if found else np.empty(0, dtype=np.int64)
+        freqs = np.concatenate([f for _, f in found]) if found else np.empty(0, dtype=np.int64)
+        word_ids = keys // self.n_pos
+        return pd.DataFrame(
+            {
+                "word_id": word_ids,
+                "word": np.char.decode(np.asarray(self._vocab[word_ids]), "utf-8"),
+                "pos": np.char.decode(np.asarray(self._pos_tags[keys % self.n_pos]), "utf-8"),
+                "freq": freqs,
+            }
+        )
+
+    def bigram_freq(
+        self, w1: str | Sequence[str], w2: str | Sequence[str]
+    ) -> int | np.ndarray:
+        """
+        Frequency of the bigrams `w1 w2`, element-wise for sequences.
+        """
+        q1, scalar = self._queries(w1)
+        q2, _ = self._queries(w2)
+        ids1, ids2 = np.broadcast_arrays(_lookup(self._vocab, q1), _lookup(self._vocab, q2))
+        return self._result(self.bigram_freq_ids(ids1, ids2), scalar)
+
+    def bigram_freq_ids(self, ids1: np.ndarray, ids2: np.ndarray) -> np.ndarray:
+        """
+        Frequency of bigrams given as vocabulary ids, 0 for missing bigrams or ids.
+        """
+        keys = ids1.astype(np.int64) * self.n_words + ids2
+        idx = _lookup(self._bigram_keys, keys)
+        valid = (idx >= 0) & (ids1 >= 0) & (ids2 >= 0)
+        return np.where(valid, np.asarray(self._bigram_freq[np.maximum(idx, 0)]), 0)
+
+    def iter_bigrams(
+        self, chunksize: int = 10_000_000
+    ) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Stream all bigrams in key order as `(w1_ids, w2_ids, freqs)` chunks.
+        """
+        for start in range(0, len(self._bigram_keys), chunksize):
+            keys = np.asarray(self._bigram_keys[start : start + chunksize])
+            freqs = np.asarray(self._bigram_freq[start : start + chunksize])
+            yield keys // self.n_words, keys % self.n_words, freqs
@@ -0,0 +1,389 @@
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from intermodulation.ngrams import NgramIndex, iter_ngram_chunks, split_pos
+
+ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+VOWELS = "aeiouy"
+CONSONANTS = "".join(c for c in ALPHABET if c not in VOWELS)
+# Letters are coded 1-26 with 0 as padding, and strings are packed into base-27 uint64 keys with
+# the first letter most significant. Packed keys sort like the strings themselves, so a sorted
+# key array works as a trie: all words starting with a prefix form one contiguous key range.
+MAX_LEN = 13  # 27 ** 13 < 2 ** 64
+# Words and prefixes up to this length are also kept in dense bitsets indexed by their base-27
+# key, which makes the short lookups that dominate screening O(1)
+DENSE_LEN = 5
+_POWERS = 27 ** np.arange(MAX_LEN - 1, -1, -1, dtype=np.uint64)
+
+
+def encode_strings(strings: Iterable[str], width: int | None = None) -> np.ndarray:
+    """
+    Encode lowercase a-z strings as rows of letter codes (1-26), zero-padded to `width`.
+    """
+    strings = np.asarray(list(strings), dtype=np.str_)
+    width = width if width is not None else max(strings.dtype.itemsize // 4, 1)
+    if width > MAX_LEN:
+        raise ValueError(f"Strings longer than {MAX_LEN} letters cannot be encoded.")
+    chars = strings.astype(f"<U{width}").view(np.uint32).reshape(len(strings), width)
+    codes = np.where(chars > 0, chars.astype(np.int64) - ord("a") + 1, 0)
+    if np.any((codes < 0) | (codes > 26)):
+        raise ValueError("Only lowercase a-z strings can be encoded.")
+    return codes.astype(np.uint8)
+
+
+def decode_strings(codes: np.ndarray) -> np.ndarray:
+    """
+    Decode rows of letter codes back into strings.
+    """
+    chars = np.where(codes > 0, codes.astype(np.uint32) + ord("a") - 1, 0).astype(np.uint32)
+    return np.ascontiguousarray(chars).view(f"<U{codes.shape[1]}").ravel()
+
+
+def pack_keys(codes: np.ndarray) -> np.ndarray:
+    """
+    Pack rows of letter codes into order-preserving base-27 uint64 keys.
+    """
+    return codes.astype(np.uint64) @ _POWERS[: codes.shape[1]]
+
+
+def _dense_keys(codes: np.ndarray) -> np.ndarray:
+    # Base-27 key of each row without left-alignment, for indexing the dense bitsets. Columns are
+    # copied to contiguous int32 first, which is much faster than strided int64 arithmetic.
+    cols = np.ascontiguousarray(codes.T, dtype=np.int32)
+    keys = np.zeros(len(codes), dtype=np.int32)
+    for col in cols:
+        keys *= 27
+        keys += col
+    return keys
+
+
+def _make_bitset(keys: np.ndarray, size: int) -> np.ndarray:
+    bits = np.zeros(size, dtype=bool)
+    bits[keys] = True
+    return np.packbits(bits, bitorder="little")
+
+
+def _test_bitset(bits: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    return (bits[keys >> 3] & (np.uint8(1) << (keys & 7).astype(np.uint8))) > 0
+
+
+def _row_lengths(codes: np.ndarray) -> np.ndarray:
+    return (codes > 0).sum(axis=1, dtype=np.int64)
+
+
+class Lexicon:
+    """
+    Screening index over a word list: sorted packed keys for word and prefix lookups, and a
+    letter-bigram frequency table.
+
+    Words are lowercased, and words with characters outside a-z are dropped. Words longer than
+    `MAX_LEN` letters only take part in prefix lookups, via their first `MAX_LEN` letters.
+
+    Parameters
+    ----------
+    words : Sequence[str]
+        Words of the lexicon.
+    freqs : Sequence[int] | None, optional
+        Frequency of each word, used to weight letter-bigram counts. By default every word has
+        frequency 1.
+    min_freq : int, optional
+        Words rarer than this are ignored, to keep corpus noise out of the lexicon. By default 0.
+
+    Attributes
+    ----------
+    word_keys : np.ndarray
+        Sorted keys of all words of at most `MAX_LEN` letters.
+    prefix_keys : np.ndarray
+        Sorted keys of the first `MAX_LEN` letters of all words.
+    bigram_pct : np.ndarray
+        (27, 27) share of each letter bigram among all frequency-weighted letter bigrams, indexed
+        by letter code. Row and column 0 (padding) are zero.
+    """
+
+    def __init__(
+        self,
+        words: Sequence[str],
+        freqs: Sequence[int] | None = None,
+        min_freq: int = 0,
+    ):
+        words = pd.Series(np.asarray(words, dtype=np.str_)).str.lower()
+        freqs = pd.Series(np.ones(len(words), dtype=np.int64) if freqs is None else freqs)
+        keep = words.str.fullmatch(f"[{ALPHABET}]+").to_numpy() & (freqs >= min_freq).to_numpy()
+        # Case variants of a word are merged into one entry
+        table = pd.DataFrame({"word": words[keep], "freq": freqs[keep].to_numpy()})
+        table = table.groupby("word", sort=False)["freq"].sum()
+        lengths = table.index.str.len().to_numpy()
+
+        codes = encode_strings(table.index.str.slice(0, MAX_LEN), MAX_LEN)
+        keys = pack_keys(codes)
+        self.prefix_keys = np.unique(keys)
+        self.word_keys = np.unique(keys[lengths <= MAX_LEN])
+        self._word_bits = {}
+        self._prefix_bits = {}
+        for n in range(1, DENSE_LEN + 1):
+            self._word_bits[n] = _make_bitset(_dense_keys(codes[lengths == n, :n]), 27**n)
+            self._prefix_bits[n] = _make_bitset(_dense_keys(codes[lengths >= n, :n]), 27**n)
+
+        bigram_counts = np.zeros((27, 27), dtype=np.float64)
+        first, second = codes[:, :-1].ravel(), codes[:, 1:].ravel()
+        weights = np.repeat(table.to_numpy(dtype=np.float64), MAX_LEN - 1)
+        valid = second > 0
+        np.add.at(bigram_counts, (first[valid], second[valid]), weights[valid])
+        self.bigram_pct = bigram_counts / max(bigram_counts.sum(), 1)
+
+    @classmethod
+    def from_unigrams(
+        cls,
+        path: str | Path,
+        min_freq: int = 0,
+        chunksize: int = 1_000_000,
+        sep: str = ",",
+    ) -> "Lexicon":
+        """
+        Build a lexicon from a `word_POS` 1-gram table, streamed in chunks.
+        """
+        totals = []
+        for chunk in iter_ngram_chunks(path, chunksize, sep):
+            words, _ = split_pos(chunk["ngram"])
+            totals.append(chunk["freq"].groupby(words.str.lower().to_numpy()).sum())
+        table = pd.concat(totals).groupby(level=0).sum()
+        return cls(table.index, table.to_numpy(), min_freq=min_freq)
+
+    @classmethod
+    def from_ngram_index(cls, index: NgramIndex, min_freq: int = 0) -> "Lexicon":
+        """
+        Build a lexicon from the vocabulary of an `NgramIndex`.
+        """
+        vocab = index.vocabulary()
+        return cls(vocab["word"], vocab["freq"], min_freq=min_freq)
+
+    def _is_word_block(self, block: np.ndarray) -> np.ndarray:
+        # Rows of exactly block.shape[1] letters; rows containing padding never match
+        n = block.shape[1]
+        if n <= DENSE_LEN:
+            return _test_bitset(self._word_bits[n], _dense_keys(block))
+        keys = pack_keys(block)
+        if len(self.word_keys) == 0:
+            return np.zeros(len(keys), dtype=bool)
+        idx = np.minimum(np.searchsorted(self.word_keys, keys), len(self.word_keys) - 1)
+        return (self.word_keys[idx] == keys) & np.all(block > 0, axis=1)
+
+    def _is_prefix_block(self, block: np.ndarray) -> np.ndarray:
+        # Rows of exactly block.shape[1] letters
+        n = block.shape[1]
+        hits = _test_bitset(self._prefix_bits[min(n, DENSE_LEN)], _dense_keys(block[:, :DENSE_LEN]))
+        if n <= DENSE_LEN:
+            return hits
+        # Only rows whose first DENSE_LEN letters start a word need the range search. All keys
+        # sharing an n-letter prefix lie in [lo, lo + 27 ** (MAX_LEN - n) - 1].
+        rows = np.flatnonzero(hits)
+        lo = pack_keys(block[rows])
+        hi = lo + np.uint64(27 ** (MAX_LEN - n) - 1)
+        start = np.searchsorted(self.prefix_keys, lo, side="left")
+        stop = np.searchsorted(self.prefix_keys, hi, side="right")
+        hits[rows] = stop > start
+        return hits
+
+    def _by_length(self, codes: np.ndarray, func) -> np.ndarray:
+        lengths = _row_lengths(codes)
+        uniq = np.unique(lengths)
+        if len(uniq) == 1:
+            return func(codes[:, : uniq[0]])
+        out = np.zeros(len(codes), dtype=bool)
+        for n in uniq:
+            rows = np.flatnonzero(lengths == n)
+            out[rows] = func(codes[rows, :n])
+        return out
+
+    def is_word(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Mask of rows of letter codes that are words of the lexicon.
+        """
+        return self._by_length(codes, self._is_word_block)
+
+    def is_prefix(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Mask of rows of letter codes that are a word or the start of a word of the lexicon.
+        """
+        return self._by_length(codes, self._is_prefix_block)
+
+    def bigram_bitset(self, max_pct: float) -> np.ndarray:
+        """
+        Bitset of letter bigrams more common than `max_pct` (a fraction): bit `b` of element `a`
+        is set if the bigram with letter codes (a, b) is suspicious.
+        """
+        suspicious = self.bigram_pct > max_pct
+        return (suspicious.astype(np.uint32) << np.arange(27, dtype=np.uint32)).sum(
+            axis=1, dtype=np.uint32
+        )
+
+
+def enumerate_candidates(
+    onsets: Sequence[str], alphabet: str = CONSONANTS, lengths: Iterable[int] = (4,)
+) -> np.ndarray:
+    """
+    Enumerate every string made of an onset followed by letters from `alphabet`.
+
+    Parameters
+    ----------
+    onsets : Sequence[str]
+        Allowed string starts, e.g. consonant clusters like the `clus1` column of
+        `cons_clust_final_candidates.csv`. Onsets may differ in length.
+    alphabet : str, optional
+        Letters that may follow the onset, by default all consonants.
+    lengths : Iterable[int], optional
+        Total string lengths to generate, by default (4,).
+
+    Returns
+    -------
+    np.ndarray
+        (n_candidates, max(lengths)) letter codes, zero-padded, one candidate per row.
+    """
+    lengths = sorted(set(lengths))
+    width = max(lengths)
+    letters = encode_strings(list(alphabet), 1)[:, 0]
+    onsets = pd.Series(list(onsets), dtype=str)
+    blocks = []
+    for onset_len, group in onsets.groupby(onsets.str.len()):
+        onset_codes = encode_strings(group.unique(), onset_len)
+        for length in lengths:
+            n_free = length - onset_len
+            if n_free < 0:
+                continue
+            n = len(onset_codes) * len(letters) ** n_free
+            block = np.zeros((n, width), dtype=np.uint8)
+            # Mixed-radix expansion of the candidate number into onset and letter digits
+            flat = np.arange(n, dtype=np.int64)
+            for pos in range(length - 1, onset_len - 1, -1):
+                flat, digit = np.divmod(flat, len(letters))
+                block[:, pos] = letters[digit]
+            block[:, :onset_len] = onset_codes[flat]
+            blocks.append(block)
+    if not blocks:
+        return np.zeros((0, width), dtype=np.uint8)
+    return np.concatenate(blocks)
+
+
+def screen_candidates(
+    codes: np.ndarray,
+    lexicon: Lexicon,
+    max_bigram_pct: float | None = 0.001,
+    min_embedded_len: int | None = 3,
+    max_letter_repeats: int | None = 1,
+) -> np.ndarray:
+    """
+    Mask of candidate strings that do not look like words of the lexicon.
+
+    A candidate is rejected if it is a word or the start of a word, if it contains a letter
+    bigram more common than `max_bigram_pct` in the lexicon, if it contains a word of at least
+    `min_embedded_len` letters, or if any letter occurs more than `max_letter_repeats` times.
+
+    Parameters
+    ----------
+    codes : np.ndarray
+        (n_candidates, width) letter codes, as from `enumerate_candidates`.
+    lexicon : Lexicon
+        Lexicon to screen against.
+    max_bigram_pct : float | None, optional
+        Largest allowed share of a letter bigram in the lexicon, by default 0.001 (0.1%).
+        None to skip the check.
+    min_embedded_len : int | None, optional
+        Shortest embedded word that rejects a candidate, by default 3. None to skip the check.
+    max_letter_repeats : int | None, optional
+        Largest number of times a letter may occur, by default 1. None to skip the check.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean mask, True for candidates that pass.
+    """
+    keep = ~lexicon.is_prefix(codes)
+    lengths = _row_lengths(codes)
+    if max_bigram_pct is not None:
+        bits = lexicon.bigram_bitset(max_bigram_pct)
+        first, second = codes[:, :-1], codes[:, 1:]
+        flagged = (bits[first] >> second.astype(np.uint32)) & 1
+        keep &= ~np.any(flagged.astype(bool) & (second > 0), axis=1)
+    if min_embedded_len is not None:
+        width = codes.shape[1]
+        cols = np.ascontiguousarray(codes.T, dtype=np.int32)
+        for start in range(1, width - min_embedded_len + 1):  # Words at the start are prefixes
+            # Grow the substring one letter at a time. Substrings running into the padding
+            # contain a zero digit and never match a word bitset, so every row is checked.
+            key = np.zeros(len(codes), dtype=np.int32)
+            for sub_len in range(1, min(DENSE_LEN, width - start) + 1):
+                key *= 27
+                key += cols[start + sub_len - 1]
+                if sub_len >= min_embedded_len:
+                    keep &= ~_test_bitset(lexicon._word_bits[sub_len], key)
+            for sub_len in range(max(DENSE_LEN + 1, min_embedded_len), width - start + 1):
+                rows = np.flatnonzero(keep & (start + sub_len <= lengths))
+                sub = codes[rows, start : start + sub_len]
+                keep[rows[lexicon._is_word_block(sub)]] = False
+    if max_letter_repeats is not None:
+        # In row-sorted codes a letter repeated k + 1 times spans k + 1 equal neighbours
+        k = max_letter_repeats
+        ordered = np.sort(codes, axis=1)
+        keep &= ~np.any((ordered[:, k:] == ordered[:, :-k]) & (ordered[:, k:] > 0), axis=1)
+    return keep
+
+
+def generate_nonwords(
+    lexicon: Lexicon,
+    onsets: Sequence[str],
+    alphabet: str = CONSONANTS,
+    lengths: Iterable[int] = (4,),
+    n_per_onset: int | None = None,
+    rng: np.random.Generator | None = None,
+    **screen_kwargs,
+) -> pd.DataFrame:
+    """
+    Enumerate and screen non-word candidates, optionally sampling an equal number per onset and
+    length.
+
+    Parameters
+    ----------
+    lexicon : Lexicon
+        Lexicon to screen against.
+    onsets : Sequence[str]
+        Allowed string starts, see `enumerate_candidates`.
+    alphabet : str, optional
+        Letters that may follow the onset, by default all consonants.
+    lengths : Iterable[int], optional
+        Total string lengths, by default (4,).
+    n_per_onset : int | None, optional
+        Number of non-words to sample per onset and length, by default None (keep all). Onsets
+        with fewer valid candidates of a length keep all of theirs.
+    rng : np.random.Generator | None, optional
+        Random state for sampling, by default a fresh `np.random.default_rng()`.
+    **screen_kwargs
+        Passed on to `screen_candidates`.
+
+    Returns
+    -------
+    pd.DataFrame
+        `non_word`, `onset` and `length` columns, one row per accepted candidate.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    onsets = list(dict.fromkeys(onsets))
+    codes = enumerate_candidates(onsets, alphabet, lengths)
+    codes = codes[screen_candidates(codes, lexicon, **screen_kwargs)]
+    nonwords = pd.Series(decode_strings(codes))
+    # Longest matching onset, so that overlapping onsets like "s" and "sk" stay distinct
+    onset_col = pd.Series(pd.NA, index=nonwords.index, dtype="string")
+    onset_lens = pd.Series(onsets, dtype=str).str.len()
+    for onset_len in sorted(onset_lens.unique()):
+        starts = nonwords.str.slice(0, onset_len)
+        matches = starts.isin([o for o in onsets if len(o) == onset_len]).to_numpy()
+        onset_col[matches] = starts[matches]
+    out = pd.DataFrame(
+        {"non_word": nonwords, "onset": onset_col, "length": nonwords.str.len()}
+    )
+    if n_per_onset is not None:
+        order = rng.permutation(len(out))
+        out = out.iloc[order]
+        out = out[out.groupby(["onset", "length"]).cumcount() < n_per_onset].sort_index()
+    return out.reset_index(drop=True)
@@ -0,0 +1,222 @@
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from intermodulation.ngrams import iter_ngram_chunks, split_bigrams, split_pos
+
+CHARACTER_BOUNDS = (3, 5)
+RANKLIMIT = 20_000
+W1_POS = ("ADJ", "DET")
+CANDIDATE_COLUMNS = [
+    "word1",
+    "word2",
+    "freq",
+    "pct",
+    "w2_noun_rank",
+    "word1_POS",
+    "w1_adjdet_rank",
+]
+FINAL_COLUMNS = [
+    "ngram_rank",
+    "pct",
+    "w1",
+    "w2",
+    "w1_POS",
+    "w2_POS",
+    "w1_adjdet_rank",
+    "w2_noun_rank",
+]
+
+
+@dataclass
+class UnigramTables:
+    """
+    Per-word POS information gathered from a 1-gram table.
+
+    Attributes
+    ----------
+    dominant_pos : pd.Series
+        Most frequent POS tag of every word, indexed by word. Ties go to the tag listed first.
+    pos_ranks : dict[str, pd.Series]
+        For each requested POS tag, the 0-based frequency rank of every word with that tag,
+        indexed by word. Ties keep file order.
+    """
+
+    dominant_pos: pd.Series
+    pos_ranks: dict[str, pd.Series]
+
+
+def _best_pos(frame: pd.DataFrame) -> pd.DataFrame:
+    # Highest-frequency row per word; the stable sort keeps the earliest row on ties
+    frame = frame.sort_values("freq", ascending=False, kind="stable")
+    return frame.drop_duplicates(subset="word")
+
+
+def read_unigram_tables(
+    path: str | Path,
+    pos_tags: Sequence[str] = ("NOUN", *W1_POS),
+    chunksize: int = 1_000_000,
+    sep: str = ",",
+) -> UnigramTables:
+    """
+    Stream a `word_POS` 1-gram table and collect dominant POS tags and within-POS ranks.
+
+    Memory use is bounded by the vocabulary, not the file size: each chunk is reduced to one row
+    per word before it is merged with what has been seen so far.
+
+    Parameters
+    ----------
+    path : str | Path
+        1-gram table with `ngram` and `freq` columns, e.g. `1grams_english_1b_with_pos.csv`.
+    pos_tags : Sequence[str], optional
+        Tags to compute ranks for, by default ("NOUN", "ADJ", "DET").
+    chunksize : int, optional
+        Rows read at a time, by default 1_000_000.
+    sep : str, optional
+        Column separator, by default ",".
+
+    Returns
+    -------
+    UnigramTables
+        Dominant POS per word and word ranks within each of `pos_tags`.
+    """
+    best = pd.DataFrame({"word": pd.Series(dtype=str), "pos": pd.Series(dtype=str), "freq": []})
+    tagged = {tag: [] for tag in pos_tags}
+    for chunk in iter_ngram_chunks(path, chunksize, sep):
+        words, pos = split_pos(chunk["ngram"])
+        frame = pd.DataFrame({"word": words, "pos": pos, "freq": chunk["freq"]})
+        best = _best_pos(pd.concat([best, _best_pos(frame)], ignore_index=True))
+        for tag, rows in tagged.items():
+            rows.append(frame.loc[frame["pos"] == tag, ["word", "freq"]])
+
+    pos_ranks = {}
+    for tag, rows in tagged.items():
+        table = pd.concat(rows, ignore_index=True).sort_values(
+            "freq", ascending=False, kind="stable"
+        )
+        table = table.drop_duplicates(subset="word")
+        pos_ranks[tag] = pd.Series(np.arange(len(table)), index=pd.Index(table["word"]))
+    return UnigramTables(dominant_pos=best.set_index("word")["pos"], pos_ranks=pos_ranks)
+
+
+def build_phrase_candidates(
+    unigram_path: str | Path,
+    bigram_path: str | Path,
+    character_bounds: tuple[int, int] = CHARACTER_BOUNDS,
+    chunksize: int = 1_000_000,
+    sep: str = ",",
+) -> pd.DataFrame:
+    """
+    Build the table of adjective/determiner + noun phrase candidates from n-gram frequency tables.
+
+    A bigram is a candidate if its second word occurs as a noun, its first word's most frequent
+    POS is ADJ or DET, and both words have a length within `character_bounds`. The bigram table is
+    streamed once, so memory use is bounded by the vocabulary and the number of candidates. This
+    reproduces `word_ngrams/phrases_candidates.csv` up to the order of rows of equal frequency,
+    which are sorted by their words here.
+
+    Parameters
+    ----------
+    unigram_path : str | Path
+        1-gram table with `word_POS` tokens.
+    bigram_path : str | Path
+        2-gram table with space-separated tokens, sorted by descending frequency.
+    character_bounds : tuple[int, int], optional
+        Inclusive bounds on the length of both words, by default (3, 5).
+    chunksize : int, optional
+        Rows read at a time, by default 1_000_000.
+    sep : str, optional
+        Column separator, by default ",".
+
+    Returns
+    -------
+    pd.DataFrame
+        Candidates sorted by descending frequency and indexed by `ngram_rank`, the row of the
+        bigram in `bigram_path`. Columns are `word1`, `word2`, `freq`, `pct` (share of the total
+        bigram frequency), `w2_noun_rank`, `word1_POS` and `w1_adjdet_rank` (rank of the first
+        word among adjectives, or among determiners if it never occurs as an adjective).
+    """
+    unigrams = read_unigram_tables(unigram_path, ("NOUN", *W1_POS), chunksize, sep)
+    nouns = unigrams.pos_ranks["NOUN"]
+    w1_pos = unigrams.dominant_pos[unigrams.dominant_pos.isin(W1_POS)]
+    lo, hi = character_bounds
+
+    total = 0
+    offset = 0
+    found = []
+    for chunk in iter_ngram_chunks(bigram_path, chunksize, sep):
+        total += int(chunk["freq"].sum())
+        word1, word2 = split_bigrams(chunk["ngram"])
+        noun_idx = nouns.index.get_indexer(word2)
+        pos_idx = w1_pos.index.get_indexer(word1)
+        keep = (
+            (noun_idx >= 0)
+            & (pos_idx >= 0)
+            & word1.str.len().between(lo, hi).to_numpy()
+            & word2.str.len().between(lo, hi).to_numpy()
+        )
+        found.append(
+            pd.DataFrame(
+                {
+                    "word1": word1[keep].to_numpy(),
+                    "word2": word2[keep].to_numpy(),
+                    "freq": chunk["freq"].to_numpy()[keep],
+                    "w2_noun_rank": nouns.to_numpy()[noun_idx[keep]],
+                    "word1_POS": w1_pos.to_numpy()[pos_idx[keep]],
+                },
+                index=pd.Index(offset + np.flatnonzero(keep), name="ngram_rank"),
+            )
+        )
+        offset += len(chunk)
+
+    candidates = pd.concat(found) if found else pd.DataFrame(columns=CANDIDATE_COLUMNS)
+    candidates["pct"] = candidates["freq"] / total
+    adj, det = unigrams.pos_ranks["ADJ"], unigrams.pos_ranks["DET"]
+    adj_rank = adj.reindex(candidates["word1"]).to_numpy()
+    det_rank = det.reindex(candidates["word1"]).to_numpy()
+    candidates["w1_adjdet_rank"] = np.where(np.isnan(adj_rank), det_rank, adj_rank).astype(
+        np.int64
+    )
+    # Break frequency ties by the words so that rebuilt tables are identical between runs
+    candidates = candidates.sort_values(
+        ["freq", "word1", "word2"], ascending=[False, True, True], kind="stable"
+    )
+    return candidates[CANDIDATE_COLUMNS]
+
+
+def final_phrase_candidates(
+    candidates: pd.DataFrame, rank_limit: int = RANKLIMIT
+) -> pd.DataFrame:
+    """
+    Lowercase phrase candidates and drop reversible and overly common ones.
+
+    A candidate is reversible if, after lowercasing, its words in swapped order are also a
+    candidate. Candidates whose bigram rank is below `rank_limit` are dropped. This reproduces
+    `word_ngrams/phrases_final_candidates.csv` up to the order of rows with the same noun.
+
+    Parameters
+    ----------
+    candidates : pd.DataFrame
+        Output of `build_phrase_candidates`.
+    rank_limit : int, optional
+        Smallest bigram rank to keep, by default 20_000.
+
+    Returns
+    -------
+    pd.DataFrame
+        Final candidates sorted by noun, with the columns of `phrases_final_candidates.csv`.
+    """
+    lower = candidates.reset_index()
+    lower["word1"] = lower["word1"].str.lower()
+    lower["word2"] = lower["word2"].str.lower()
+    pairs = pd.MultiIndex.from_frame(lower[["word1", "word2"]])
+    reversed_pairs = pd.MultiIndex.from_frame(lower[["word2", "word1"]])
+    final = lower[~pairs.isin(reversed_pairs) & (lower["ngram_rank"] >= rank_limit)]
+    final = final.sort_values(["word2", "word1"], kind="stable").rename(
+        columns={"word1": "w1", "word2": "w2", "word1_POS": "w1_POS"}
+    )
+    final["w2_POS"] = "NOUN"
+    return final[FINAL_COLUMNS].reset_index(drop=True)
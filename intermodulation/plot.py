@@ -1,16 +1,173 @@
-from functools import partial
+import hashlib
+from pathlib import Path
 
 import matplotlib
 import mne
 import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+
+from intermodulation.spectra import SpectrumSummary
+
+
+_TOPO_BOXES: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _info_key(info: mne.Info) -> str:
+    # Everything `find_layout` looks at: channel names, types, coils and locations
+    digest = hashlib.sha256("\0".join(info["ch_names"]).encode())
+    for ch in info["chs"]:
+        digest.update(np.array([int(ch["kind"]), int(ch["coil_type"])]).tobytes())
+        digest.update(np.asarray(ch["loc"], dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def _clean_names(names: list[str]) -> list[str]:
+    # Match info channel names to layout names as MNE does (CTF suffixes, "_v" virtual channels),
+    # unless that makes them ambiguous
+    cleaned = [name.split("-")[0].removesuffix("_v") for name in names]
+    return cleaned if len(set(cleaned)) == len(names) else list(names)
+
+
+def _topo_boxes(info: mne.Info) -> tuple[np.ndarray, np.ndarray]:
+    # Channel indices into `info` and their (x, y, width, height) boxes in figure coordinates,
+    # laid out exactly as `mne.viz.iter_topography` places its axes. Cached per channel setup,
+    # since finding the layout costs far more than drawing one topography
+    key = _info_key(info)
+    if key not in _TOPO_BOXES:
+        layout = mne.channels.find_layout(info)
+        ch_names = _clean_names(info["ch_names"])
+        shown = [(i, name) for i, name in enumerate(layout.names) if name in ch_names]
+        ch_idx = np.array([ch_names.index(name) for _, name in shown], dtype=int)
+        boxes = layout.pos[[i for i, _ in shown]]
+        _TOPO_BOXES[key] = (ch_idx, boxes)
+    return _TOPO_BOXES[key]
+
+
+def topo_lines(
+    data: np.ndarray,
+    x: np.ndarray,
+    info: mne.Info,
+    xlim: tuple[float, float],
+    ylim: tuple[float, float],
+    vlines: list | None = None,
+    ch_mask: np.ndarray | None = None,
+    color: str = "w",
+    lw: float = 0.25,
+    vline_kwargs: dict | None = None,
+    show_axes: bool = False,
+    annot_max: bool = False,
+    rasterized: bool = False,
+    fig: plt.Figure | None = None,
+    fig_kwargs: dict | None = None,
+) -> plt.Figure:
+    """
+    Draw one trace per channel at its sensor layout position, all in a single axes.
+
+    This produces the same picture as plotting into the axes of `mne.viz.iter_topography`, but
+    draws every trace as one `LineCollection` (and every vertical line and axis line as another),
+    so rendering and saving cost a few artists instead of hundreds of axes. The data are cropped
+    to `xlim` before drawing and values outside `ylim` are clipped to the edge of their box.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        (n_channels, n_x) traces, in the channel order of `info`.
+    x : np.ndarray
+        (n_x,) x values, e.g. frequencies.
+    info : mne.Info
+        Measurement info used to find the layout.
+    xlim, ylim : tuple[float, float]
+        Data limits of every channel box.
+    vlines : list | None, optional
+        x values at which to draw dashed vertical lines in every box, by default None.
+    ch_mask : np.ndarray | None, optional
+        Boolean mask over the channels of `info` to draw, by default all.
+    color : str, optional
+        Trace color, by default "w".
+    lw : float, optional
+        Trace line width, by default 0.25.
+    vline_kwargs : dict | None, optional
+        Style of the vertical lines, by default white, dashed, lw 0.3 and alpha 0.75.
+    show_axes : bool, optional
+        Whether to draw the left and bottom axis lines of every box, by default False.
+    annot_max : bool, optional
+        Whether to annotate every box with the maximum of its whole trace and where it occurs,
+        by default False.
+    rasterized : bool, optional
+        Whether to rasterize the traces when saving to a vector format, by default False.
+    fig : plt.Figure | None, optional
+        Figure to draw into, by default a new one.
+    fig_kwargs : dict | None, optional
+        Arguments for `plt.figure` if a new figure is made, by default `figsize=(16, 16)` and
+        `dpi=600`.
+
+    Returns
+    -------
+    plt.Figure
+        The figure.
+    """
+    if fig_kwargs is None:
+        fig_kwargs = {"figsize": (16, 16), "dpi": 600}
+    if vline_kwargs is None:
+        vline_kwargs = {"color": "w", "linestyle": "--", "lw": 0.3, "alpha": 0.75}
+    if fig is None:
+        fig = plt.figure(**fig_kwargs)
+    fig.set_facecolor("k")
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.axis("off")
+    ax.set(xlim=[0, 1], ylim=[0, 1])
+
+    ch_idx, boxes = _topo_boxes(info)
+    if ch_mask is not None:
+        keep = np.asarray(ch_mask, dtype=bool)[ch_idx]
+        ch_idx, boxes = ch_idx[keep], boxes[keep]
+    (xmin, xmax), (ymin, ymax) = xlim, ylim
+    inrange = (x >= xmin) & (x <= xmax)
+    xs = (x[inrange] - xmin) / (xmax - xmin)
+    ys = (np.clip(data[ch_idx][:, inrange], ymin, ymax) - ymin) / (ymax - ymin)
+    bx, by, bw, bh = (boxes[:, k, None] for k in range(4))
+    traces = np.stack([bx + xs[None, :] * bw, by + ys * bh], axis=-1)
+    ax.add_collection(
+        matplotlib.collections.LineCollection(
+            traces, colors=color, linewidths=lw, rasterized=rasterized
+        )
+    )
+
+    if vlines is not None:
+        vx = (np.asarray(vlines, dtype=float) - xmin) / (xmax - xmin)
+        vx = vx[(vx >= 0) & (vx <= 1)]
+        starts = np.stack(np.broadcast_arrays(bx + vx[None, :] * bw, by), axis=-1)
+        ends = np.stack(np.broadcast_arrays(bx + vx[None, :] * bw, by + bh), axis=-1)
+        segments = np.stack([starts, ends], axis=-2).reshape(-1, 2, 2)
+        ax.add_collection(matplotlib.collections.LineCollection(segments, **vline_kwargs))
+    if show_axes:
+        corners = boxes[:, :2]
+        bottom = np.stack([corners, corners + boxes[:, 2:] * [1, 0]], axis=1)
+        left = np.stack([corners, corners + boxes[:, 2:] * [0, 1]], axis=1)
+        ax.add_collection(
+            matplotlib.collections.LineCollection(
+                np.concatenate([bottom, left]), colors="w", linewidths=0.5, alpha=0.5
+            )
+        )
+    if annot_max:
+        for box, idx in zip(boxes, ch_idx):
+            maxidx = np.nanargmax(data[idx])
+            ax.text(
+                box[0],
+                box[1] + 0.8 * box[3],
+                f"{data[idx][maxidx]:.2f}, {x[maxidx]:.2f}",
+                color="w",
+                fontsize=3,
+            )
+    return fig
 
 
 def snr_topo(
-    snrs: np.ndarray,
-    epochs: mne.Epochs,
-    freqs: np.ndarray,
+    snrs: np.ndarray | SpectrumSummary,
+    epochs: mne.Epochs | mne.Info,
+    freqs: np.ndarray | None = None,
     fmin: float | None = None,
     fmax: float | None = None,
     ymin: float | None = None,
@@ -19,7 +176,12 @@ def snr_topo(
     fig_kwargs: dict | None = None,
     show_axes=False,
     annot_max=False,
+    interactive=False,
+    rasterized=False,
 ):
+    if isinstance(snrs, SpectrumSummary):
+        # Epoch-averaged channel SNRs, only computed (once) for the plotted band
+        freqs, snrs = snrs.channel_snr(fmin, fmax)
     if ymin is None:
         ymin = snrs.min()
     if ymax is None:
@@ -30,6 +192,23 @@ def snr_topo(
         fmax = freqs.max()
     if fig_kwargs is None:
         fig_kwargs = {"figsize": (16, 16), "dpi": 600}
+    info = epochs if isinstance(epochs, mne.Info) else epochs.info
+    if not interactive:
+        # Single-axes rendering; the per-channel axes below are only needed for click-to-zoom
+        fig = topo_lines(
+            snrs,
+            freqs,
+            info,
+            (fmin, fmax),
+            (ymin, ymax),
+            vlines=vlines,
+            show_axes=show_axes,
+            annot_max=annot_max,
+            rasterized=rasterized,
+            fig_kwargs=fig_kwargs,
+        )
+        # Used for batch rendering, so the figure is returned without being shown
+        return fig
 
     def plotcallback(ax, ch_idx):
         ax.plot(freqs, snrs[ch_idx], color="w")
@@ -47,7 +226,7 @@ def snr_topo(
     else:
         spinecolor = "k"
     itertopo = mne.viz.iter_topography(
-        epochs.info, on_pick=plotcallback, fig=fig, axis_spinecolor=spinecolor
+        info, on_pick=plotcallback, fig=fig, axis_spinecolor=spinecolor
     )
 
     for ax, idx in itertopo:
@@ -93,6 +272,8 @@ def itc_wholetrial_topo(
     vlines: list | None = None,
     picks: list[str] | None = None,
     fig_kwargs: dict | None = None,
+    interactive: bool = False,
+    rasterized: bool = False,
 ):
     if picks is None:
         picks = info.ch_names
@@ -102,6 +283,20 @@ def itc_wholetrial_topo(
         ymax = 1.0
     if fig_kwargs is None:
         fig_kwargs = {"figsize": (16, 16), "dpi": 600}
+    if not interactive:
+        freqs = itcs.columns.to_numpy(dtype=float)
+        return topo_lines(
+            itcs.to_numpy(),
+            freqs,
+            info,
+            (freqs.min() if fmin is None else fmin, freqs.max() if fmax is None else fmax),
+            (ymin, ymax),
+            vlines=vlines,
+            ch_mask=np.isin(itcs.index, picks),
+            lw=0.5,
+            rasterized=rasterized,
+            fig_kwargs=fig_kwargs,
+        )
 
     def plotcallback(ax, ch_idx):
         ax.plot(itcs.columns.to_numpy(), itcs.iloc[ch_idx], color="w")
@@ -129,7 +324,7 @@ def itc_wholetrial_topo(
 
 
 def itc_singlefreq_topo(
-    itc: mne.time_frequency.AverageTFR,
+    itc: mne.time_frequency.AverageTFR | mne.Info,
     data: np.ndarray,
     times: np.ndarray,
     freqs: np.ndarray,
@@ -140,9 +335,49 @@ def itc_singlefreq_topo(
     ymin: float | None = None,
     ymax: float | None = None,
     vlines: list | None = None,
-):
+    fig: plt.Figure | None = None,
+    fig_kwargs: dict | None = None,
+    rasterized: bool = False,
+) -> plt.Figure:
+    """
+    Topography of the ITC time course of every channel at the frequency closest to `freq`.
+
+    Parameters
+    ----------
+    itc : mne.time_frequency.AverageTFR | mne.Info
+        ITC, or just the measurement info of its channels.
+    data : np.ndarray
+        (n_channels, n_freqs, n_times) ITC values.
+    times, freqs : np.ndarray
+        Times and frequencies of `data`.
+    freq : float
+        Frequency to plot.
+    picks : list[str] | None, optional
+        Channels to draw, by default all MEG channels.
+    tmin, tmax : float | None, optional
+        Time limits, by default those of `times`.
+    ymin, ymax : float | None, optional
+        ITC limits, by default those of the data at `freq`.
+    vlines : list | None, optional
+        Times at which to draw vertical lines, by default None.
+    fig : plt.Figure | None, optional
+        Figure to draw into, by default a new one.
+    fig_kwargs : dict | None, optional
+        Arguments for a new figure, see `topo_lines`.
+    rasterized : bool, optional
+        Whether to rasterize the traces when saving to a vector format, by default False.
+
+    Returns
+    -------
+    plt.Figure
+        The figure.
+    """
+    info = itc if isinstance(itc, mne.Info) else itc.info
     if picks is None:
-        picks = mne.pick_types(itc.info, meg=True)
+        ch_mask = np.zeros(info["nchan"], dtype=bool)
+        ch_mask[mne.pick_types(info, meg=True)] = True
+    else:
+        ch_mask = np.isin(info["ch_names"], picks)
     if tmin is None:
         tmin = times.min()
     if tmax is None:
@@ -156,41 +391,83 @@ def itc_singlefreq_topo(
     if ymax is None:
         ymax = fdata.max()
 
-    pick_fun = partial(
-        mne.viz.topo._plot_timeseries_unified,
-        data=[fdata],
-        times=[times],
-        color="w",
-        vline=vlines,
-        ylim=(ymin, ymax),
+    fig = topo_lines(
+        fdata,
+        times,
+        info,
+        (tmin, tmax),
+        (ymin, ymax),
+        vlines=vlines,
+        ch_mask=ch_mask,
+        lw=0.5,
+        rasterized=rasterized,
+        fig=fig,
+        fig_kwargs=fig_kwargs,
     )
+    fig.suptitle(f"ITC at {freqs[fidx]:.2f} Hz", color="w")
+    return fig
 
-    click_fun = partial(
-        mne.viz.topo._plot_timeseries,
-        data=[fdata],
-        times=[times],
-        color="w",
-        vline=vlines,
-        ylim=(ymin, ymax),
-    )
 
-    fig = mne.viz.topo._plot_topo(
-        itc.info,
-        times=(tmin, tmax),
-        show_func=pick_fun,
-        click_func=click_fun,
-        layout=mne.channels.find_layout(itc.info),
-        unified=True,
-        x_label="Time (s)",
-        y_label="ITC",
-    )
+def itc_singlefreq_pdf(
+    path: str | Path,
+    itc: mne.time_frequency.AverageTFR | mne.Info,
+    data: np.ndarray,
+    times: np.ndarray,
+    freqs: np.ndarray,
+    plot_freqs: list[float] | None = None,
+    fig_kwargs: dict | None = None,
+    **kwargs,
+) -> Path:
+    """
+    Save single-frequency ITC topographies for many frequencies as pages of one PDF.
 
-    fig.suptitle(f"ITC at {freq:.2f} Hz")
-    return fig
+    One figure is reused for every page and the channel layout is only found once, so the cost
+    per page is drawing two line collections.
+
+    Parameters
+    ----------
+    path : str | Path
+        PDF file to write.
+    itc, data, times, freqs
+        As for `itc_singlefreq_topo`.
+    plot_freqs : list[float] | None, optional
+        Frequencies to plot, one page each, by default all of `freqs`.
+    fig_kwargs : dict | None, optional
+        Arguments for the figure, by default 16 x 16 inches.
+    **kwargs
+        Passed on to `itc_singlefreq_topo`, e.g. `ymin`, `ymax` or `vlines`.
+
+    Returns
+    -------
+    Path
+        The PDF file.
+    """
+    path = Path(path)
+    if plot_freqs is None:
+        plot_freqs = freqs
+    if fig_kwargs is None:
+        fig_kwargs = {"figsize": (16, 16)}
+    fig = plt.figure(**fig_kwargs)
+    with PdfPages(path) as pdf:
+        for freq in plot_freqs:
+            fig.clear()
+            itc_singlefreq_topo(itc, data, times, freqs, freq, fig=fig, **kwargs)
+            pdf.savefig(fig, facecolor=fig.get_facecolor())
+    plt.close(fig)
+    return path
 
 
 def plot_snr(
-    psds, snrs, freqs, fmin, fmax, titleannot="", fig=None, axes=None, tagfreq=None, plotpsd=False
+    psds: np.ndarray | SpectrumSummary,
+    snrs: np.ndarray | None = None,
+    freqs: np.ndarray | None = None,
+    fmin: float | None = None,
+    fmax: float | None = None,
+    titleannot="",
+    fig=None,
+    axes=None,
+    tagfreq=None,
+    plotpsd=False,
 ):
     if len(titleannot) > 0:
         titleannot = ": " + titleannot
@@ -205,28 +482,28 @@ def plot_snr(
             raise ValueError("If not plotting PSD, axes must be a single axes object.")
         axes = [axes]
 
-    freq_range = range(
-        np.flatnonzero(np.floor(freqs) >= fmin)[0], np.flatnonzero(np.ceil(freqs) <= fmax)[-1]
-    )
+    # Pass a SpectrumSummary to reuse band statistics across plots of the same spectrum
+    summary = psds if isinstance(psds, SpectrumSummary) else SpectrumSummary(psds, snrs, freqs)
+    if fmin is None:
+        fmin = summary.freqs.min()
+    if fmax is None:
+        fmax = summary.freqs.max()
     axidx = 0
     if plotpsd:
-        psds_plot = 10 * np.log10(psds)
-        psds_mean = psds_plot.mean(axis=(0, 1))[freq_range]
-        psds_std = psds_plot.std(axis=(0, 1))[freq_range]
-        axes[axidx].plot(freqs[freq_range], psds_mean, color="b")
+        psd = summary.psd_db(fmin, fmax)
+        axes[axidx].plot(psd.freqs, psd.mean, color="b")
         axes[axidx].fill_between(
-            freqs[freq_range], psds_mean - psds_std, psds_mean + psds_std, color="b", alpha=0.2
+            psd.freqs, psd.mean - psd.std, psd.mean + psd.std, color="b", alpha=0.2
         )
         axes[axidx].set(title="PSD " + titleannot, ylabel="Power Spectral Density [dB]")
         axidx += 1
 
     # SNR spectrum
-    snr_mean = snrs.mean(axis=(0, 1))[freq_range]
-    snr_std = snrs.std(axis=(0, 1))[freq_range]
+    snr = summary.snr(fmin, fmax)
 
-    axes[axidx].plot(freqs[freq_range], snr_mean, color="r")
+    axes[axidx].plot(snr.freqs, snr.mean, color="r")
     axes[axidx].fill_between(
-        freqs[freq_range], snr_mean - snr_std, snr_mean + snr_std, color="r", alpha=0.2
+        snr.freqs, snr.mean - snr.std, snr.mean + snr.std, color="r", alpha=0.2
     )
     axes[axidx].set(
         title="SNR " + titleannot,
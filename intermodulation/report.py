@@ -0,0 +1,375 @@
+import base64
+import html
+import json
+import warnings
+import zlib
+from collections.abc import Mapping
+from pathlib import Path
+
+import mne
+import numpy as np
+
+from intermodulation.plot import _topo_boxes
+from intermodulation.spectra import SpectrumSummary
+
+NAN_CODE = 255  # uint8 code of missing values, e.g. the edges of SNR spectra
+
+
+def downsample_spectrum(
+    freqs: np.ndarray,
+    data: np.ndarray,
+    fmin: float | None = None,
+    fmax: float | None = None,
+    max_points: int = 1000,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Crop spectra to a band and reduce them to at most `max_points` bins, keeping peaks.
+
+    Bins are merged in groups of consecutive frequencies, each taking the maximum of its group
+    so that narrow tag and IM peaks survive, at the mean frequency of the group.
+
+    Parameters
+    ----------
+    freqs : np.ndarray
+        (n_freqs,) frequencies.
+    data : np.ndarray
+        (..., n_freqs) spectra.
+    fmin, fmax : float | None, optional
+        Band limits, by default all frequencies.
+    max_points : int, optional
+        Largest number of bins to keep, by default 1000.
+
+    Returns
+    -------
+    freqs : np.ndarray
+        Frequencies of the kept bins.
+    data : np.ndarray
+        (..., n_bins) downsampled spectra.
+    """
+    fmin = freqs.min() if fmin is None else fmin
+    fmax = freqs.max() if fmax is None else fmax
+    band = (freqs >= fmin) & (freqs <= fmax)
+    freqs, data = freqs[band], np.asarray(data[..., band], dtype=float)
+    factor = int(np.ceil(len(freqs) / max_points))
+    if factor <= 1:
+        return freqs, data
+    pad = -len(freqs) % factor
+    freqs = np.pad(freqs, (0, pad), constant_values=np.nan).reshape(-1, factor)
+    padding = [(0, 0)] * (data.ndim - 1) + [(0, pad)]
+    data = np.pad(data, padding, constant_values=np.nan)
+    data = data.reshape(*data.shape[:-1], -1, factor)
+    with warnings.catch_warnings():
+        # Groups of only NaNs, e.g. at the edges of SNR spectra, stay NaN
+        warnings.filterwarnings("ignore", "All-NaN slice", RuntimeWarning)
+        return np.nanmean(freqs, axis=1), np.nanmax(data, axis=-1)
+
+
+def quantize(data: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Quantize each row of `data` to uint8 between its own minimum and maximum.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        (n_rows, n) values, possibly with NaNs.
+
+    Returns
+    -------
+    codes : np.ndarray
+        (n_rows, n) uint8 codes, 0-254 for values and `NAN_CODE` for NaNs.
+    lo, hi : np.ndarray
+        (n_rows,) minimum and maximum of each row, with `value = lo + code / 254 * (hi - lo)`.
+    """
+    valid = np.isfinite(data)
+    lo = np.where(valid, data, np.inf).min(axis=1)
+    hi = np.where(valid, data, -np.inf).max(axis=1)
+    lo[~np.isfinite(lo)], hi[~np.isfinite(hi)] = 0.0, 0.0
+    scale = np.where(hi > lo, hi - lo, 1.0)
+    codes = np.rint((np.where(valid, data, lo[:, None]) - lo[:, None]) / scale[:, None] * 254)
+    codes = np.where(valid, codes, NAN_CODE).astype(np.uint8)
+    return codes, lo, hi
+
+
+def _encode(codes: np.ndarray) -> str:
+    return base64.b64encode(zlib.compress(codes.tobytes(), 9)).decode("ascii")
+
+
+def write_spectrum_report(
+    path: str | Path,
+    spectra: Mapping[str, SpectrumSummary | Mapping[str, np.ndarray]],
+    info: mne.Info,
+    overview_freqs: list[float],
+    fmin: float | None = None,
+    fmax: float | None = None,
+    max_points: int = 600,
+    markers: list[float] | None = None,
+    title: str = "SNR report",
+) -> Path:
+    """
+    Write a single, self-contained HTML report of channel SNR spectra.
+
+    The report shows the sensor layout colored by the epoch-averaged SNR of each channel at one
+    of `overview_freqs`, for a chosen condition, and plots the spectrum of a channel when it is
+    clicked. Channel spectra are embedded per condition as compressed uint8 chunks which the page
+    only decodes when first shown, so it opens at once and needs no server.
+
+    Parameters
+    ----------
+    path : str | Path
+        HTML file to write.
+    spectra : Mapping[str, SpectrumSummary | Mapping[str, np.ndarray]]
+        Spectra keyed by condition name, as summaries or dictionaries of `psds`, `freqs` and
+        `snrs` with channels in the order of `info`.
+    info : mne.Info
+        Measurement info of the channels, used for the layout.
+    overview_freqs : list[float]
+        Frequencies selectable for the layout overview. The nearest bin is used.
+    fmin, fmax : float | None, optional
+        Band of the embedded spectra, by default all frequencies.
+    max_points : int, optional
+        Largest number of frequency bins per embedded spectrum, by default 600. Spectra with
+        more bins are downsampled with `downsample_spectrum`.
+    markers : list[float] | None, optional
+        Frequencies marked with dashed lines in channel spectra, by default `overview_freqs`.
+    title : str, optional
+        Report title, by default "SNR report".
+
+    Returns
+    -------
+    Path
+        The HTML file.
+    """
+    path = Path(path)
+    if markers is None:
+        markers = list(overview_freqs)
+    ch_idx, boxes = _topo_boxes(info)
+    meta = dict(
+        title=title,
+        channels=[info["ch_names"][i] for i in ch_idx],
+        boxes=np.round(boxes, 5).tolist(),
+        overview_freqs=[float(f) for f in overview_freqs],
+        markers=[float(f) for f in markers],
+        conditions=[],
+    )
+    chunks = []
+    for name, spectrum in spectra.items():
+        if not isinstance(spectrum, SpectrumSummary):
+            spectrum = SpectrumSummary.from_spectrum(spectrum)
+        if spectrum.snrs.shape[1] != info["nchan"]:
+            raise ValueError(
+                f"Spectrum {name!r} has {spectrum.snrs.shape[1]} channels, info has "
+                f"{info['nchan']}."
+            )
+        freqs, snrs = spectrum.channel_snr()
+        overview = snrs[ch_idx][:, np.abs(freqs[:, None] - overview_freqs).argmin(axis=0)]
+        dsfreqs, dssnrs = downsample_spectrum(freqs, snrs[ch_idx], fmin, fmax, max_points)
+        codes, lo, hi = quantize(dssnrs)
+        meta["conditions"].append(
+            dict(
+                name=name,
+                freqs=np.round(dsfreqs, 4).tolist(),
+                lo=np.round(lo, 4).tolist(),
+                hi=np.round(hi, 4).tolist(),
+                # (n_freqs, n_channels), NaN-free for JSON
+                overview=np.round(np.nan_to_num(overview.T), 3).tolist(),
+            )
+        )
+        chunks.append(_encode(codes))
+
+    chunk_tags = "\n".join(
+        f'<script id="chunk-{i}" type="application/octet-stream">{chunk}</script>'
+        for i, chunk in enumerate(chunks)
+    )
+    page = (
+        _TEMPLATE.replace("__TITLE__", html.escape(title))
+        .replace("__META__", json.dumps(meta, separators=(",", ":")).replace("</", "<\\/"))
+        .replace("__CHUNKS__", chunk_tags)
+    )
+    path.write_text(page, encoding="utf-8")
+    return path
+
+
+_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<style>
+body { background: #111; color: #eee; font-family: sans-serif; margin: 1em; }
+#controls { margin-bottom: 0.5em; }
+#controls select { margin-right: 1em; }
+#main { display: flex; gap: 1em; flex-wrap: wrap; }
+#layout { width: 640px; height: 640px; background: #000; }
+#layout rect { stroke: #444; stroke-width: 0.001; cursor: pointer; }
+#layout rect.selected { stroke: #fff; stroke-width: 0.004; }
+#colorbar { font-size: 0.8em; }
+</style>
+</head>
+<body>
+<h1>__TITLE__</h1>
+<div id="controls">
+Condition <select id="cond"></select>
+Overview frequency <select id="freq"></select>
+<span id="colorbar"></span>
+</div>
+<div id="main">
+<svg id="layout" viewBox="0 0 1 1" preserveAspectRatio="xMidYMid meet"></svg>
+<div>
+<h2 id="chname">Click a sensor to show its spectrum</h2>
+<canvas id="spectrum" width="800" height="420"></canvas>
+</div>
+</div>
+<script id="meta" type="application/json">__META__</script>
+__CHUNKS__
+<script>
+"use strict";
+const meta = JSON.parse(document.getElementById("meta").textContent);
+const NAN_CODE = 255;
+const VIRIDIS = [[68, 1, 84], [59, 82, 139], [33, 145, 140], [94, 201, 98], [253, 231, 37]];
+const chunks = new Map();
+const state = { cond: 0, freq: 0, channel: null };
+
+function loadChunk(i) {
+  // Decoded on first use only, then kept
+  if (!chunks.has(i)) {
+    const text = document.getElementById("chunk-" + i).textContent.trim();
+    const bytes = Uint8Array.from(atob(text), (c) => c.charCodeAt(0));
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("deflate"));
+    chunks.set(i, new Response(stream).arrayBuffer().then((buf) => new Uint8Array(buf)));
+  }
+  return chunks.get(i);
+}
+
+function color(v, vmax) {
+  const t = Math.min(Math.max(v / vmax, 0), 1) * (VIRIDIS.length - 1);
+  const k = Math.min(Math.floor(t), VIRIDIS.length - 2);
+  const f = t - k;
+  const rgb = VIRIDIS[k].map((c, j) => Math.round(c + f * (VIRIDIS[k + 1][j] - c)));
+  return "rgb(" + rgb.join(",") + ")";
+}
+
+function drawLayout() {
+  const svg = document.getElementById("layout");
+  const values = meta.conditions[state.cond].overview[state.freq];
+  // Common color scale across conditions at this frequency
+  let vmax = 0;
+  for (const cond of meta.conditions) vmax = Math.max(vmax, ...cond.overview[state.freq]);
+  if (!svg.childElementCount) {
+    meta.boxes.forEach((box, i) => {
+      const rect = document.createElementNS("http://www.w3.org/2000/svg", "rect");
+      rect.setAttribute("x", box[0]);
+      rect.setAttribute("y", 1 - box[1] - box[3]);
+      rect.setAttribute("width", box[2]);
+      rect.setAttribute("height", box[3]);
+      rect.appendChild(document.createElementNS("http://www.w3.org/2000/svg", "title"));
+      rect.addEventListener("click", () => selectChannel(i));
+      svg.appendChild(rect);
+    });
+  }
+  Array.from(svg.children).forEach((rect, i) => {
+    rect.setAttribute("fill", color(values[i], vmax));
+    rect.firstChild.textContent = meta.channels[i] + ": SNR " + values[i].toFixed(2);
+    rect.classList.toggle("selected", i === state.channel);
+  });
+  const freq = meta.overview_freqs[state.freq].toFixed(2);
+  document.getElementById("colorbar").textContent = "SNR at " + freq + " Hz, 0 - " + vmax.toFixed(2);
+}
+
+function niceStep(range, n) {
+  const raw = range / n;
+  const mag = Math.pow(10, Math.floor(Math.log10(raw)));
+  return [1, 2, 5, 10].map((m) => m * mag).find((s) => s >= raw);
+}
+
+async function drawSpectrum() {
+  if (state.channel === null) return;
+  const cond = meta.conditions[state.cond];
+  const codes = await loadChunk(state.cond);
+  const nf = cond.freqs.length;
+  const ch = state.channel;
+  const lo = cond.lo[ch];
+  const scale = (cond.hi[ch] - lo) / 254;
+  const values = Array.from(codes.subarray(ch * nf, (ch + 1) * nf), (c) =>
+    c === NAN_CODE ? NaN : lo + c * scale);
+  document.getElementById("chname").textContent = meta.channels[ch] + " - " + cond.name;
+
+  const canvas = document.getElementById("spectrum");
+  const ctx = canvas.getContext("2d");
+  const m = { left: 50, right: 10, top: 10, bottom: 40 };
+  const w = canvas.width - m.left - m.right;
+  const h = canvas.height - m.top - m.bottom;
+  const fmin = cond.freqs[0];
+  const fmax = cond.freqs[nf - 1];
+  const finite = values.filter(Number.isFinite);
+  const ymin = Math.min(0, ...finite);
+  const ymax = Math.max(...finite) * 1.05 || 1;
+  const px = (f) => m.left + ((f - fmin) / (fmax - fmin)) * w;
+  const py = (v) => m.top + h - ((v - ymin) / (ymax - ymin)) * h;
+
+  ctx.fillStyle = "#000";
+  ctx.fillRect(0, 0, canvas.width, canvas.height);
+  ctx.strokeStyle = "#888";
+  ctx.fillStyle = "#ccc";
+  ctx.font = "12px sans-serif";
+  ctx.beginPath();
+  ctx.moveTo(m.left, m.top);
+  ctx.lineTo(m.left, m.top + h);
+  ctx.lineTo(m.left + w, m.top + h);
+  ctx.stroke();
+  const xstep = niceStep(fmax - fmin, 10);
+  ctx.textAlign = "center";
+  for (let f = Math.ceil(fmin / xstep) * xstep; f <= fmax; f += xstep) {
+    ctx.fillText(+f.toFixed(6), px(f), m.top + h + 15);
+  }
+  ctx.fillText("Frequency (Hz)", m.left + w / 2, m.top + h + 32);
+  const ystep = niceStep(ymax - ymin, 6);
+  ctx.textAlign = "right";
+  for (let v = Math.ceil(ymin / ystep) * ystep; v <= ymax; v += ystep) {
+    ctx.fillText(+v.toFixed(6), m.left - 5, py(v) + 4);
+  }
+
+  ctx.setLineDash([4, 4]);
+  ctx.strokeStyle = "#a0a";
+  for (const f of meta.markers) {
+    if (f < fmin || f > fmax) continue;
+    ctx.beginPath();
+    ctx.moveTo(px(f), m.top);
+    ctx.lineTo(px(f), m.top + h);
+    ctx.stroke();
+  }
+  ctx.setLineDash([]);
+  ctx.strokeStyle = "#f44";
+  ctx.beginPath();
+  let pen = false;
+  values.forEach((v, i) => {
+    if (!Number.isFinite(v)) { pen = false; return; }
+    if (pen) ctx.lineTo(px(cond.freqs[i]), py(v));
+    else ctx.moveTo(px(cond.freqs[i]), py(v));
+    pen = true;
+  });
+  ctx.stroke();
+}
+
+function selectChannel(i) {
+  state.channel = i;
+  drawLayout();
+  drawSpectrum();
+}
+
+function fillSelect(id, labels, key) {
+  const select = document.getElementById(id);
+  labels.forEach((label, i) => select.add(new Option(label, i)));
+  select.addEventListener("change", () => {
+    state[key] = +select.value;
+    drawLayout();
+    drawSpectrum();
+  });
+}
+
+fillSelect("cond", meta.conditions.map((c) => c.name), "cond");
+fillSelect("freq", meta.overview_freqs.map((f) => f.toFixed(2) + " Hz"), "freq");
+drawLayout();
+</script>
+</body>
+</html>
+"""
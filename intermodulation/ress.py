@@ -0,0 +1,406 @@
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import mne
+import numpy as np
+import pandas as pd
+from scipy import linalg
+
+from intermodulation.analysis import data_channels, epoch_window, snr_spectrum, tagged_bins
+
+
+def gaussian_gain(freqs: np.ndarray, center: float, fwhm: float) -> np.ndarray:
+    """
+    Gain of a Gaussian narrowband filter in the frequency domain.
+
+    Parameters
+    ----------
+    freqs : np.ndarray
+        (n_freqs,) frequencies of the spectrum.
+    center : float
+        Peak frequency in Hz.
+    fwhm : float
+        Full width at half maximum in Hz.
+
+    Returns
+    -------
+    np.ndarray
+        (n_freqs,) gain, 1 at `center`.
+    """
+    sigma = fwhm / (2 * np.sqrt(2 * np.log(2)))
+    return np.exp(-0.5 * ((freqs - center) / sigma) ** 2)
+
+
+@dataclass
+class RESSCovariances:
+    """
+    Per-epoch covariances and Fourier coefficients for RESS at every target frequency.
+
+    Attributes
+    ----------
+    targets : pd.DataFrame
+        Terms as from `analysis.tagged_bins`. The `col` column indexes the term's bin in `freqs`.
+    freqs : np.ndarray
+        (n_bins,) frequencies of the kept bins, targets and their noise bins.
+    noise_cols : np.ndarray
+        (n_targets, n_noise) indices into `freqs` of the noise bins of every target.
+    coefs : np.ndarray
+        (n_epochs, n_channels, n_bins) Fourier coefficients of the kept bins.
+    signal : np.ndarray
+        (n_epochs, n_targets, n_channels, n_channels) covariance of every epoch filtered at
+        every target.
+    reference : np.ndarray
+        (n_epochs, n_targets, n_channels, n_channels) mean covariance of every epoch filtered
+        at the two neighbors of every target, without the other targets and 0 Hz.
+    ch_names : list[str]
+        Channels.
+    """
+
+    targets: pd.DataFrame
+    freqs: np.ndarray
+    noise_cols: np.ndarray
+    coefs: np.ndarray
+    signal: np.ndarray
+    reference: np.ndarray
+    ch_names: list[str]
+
+
+def ress_covariances(
+    epochs: mne.BaseEpochs,
+    tagfreqs: Sequence[float],
+    order: int = 2,
+    peak_fwhm: float = 0.5,
+    neighbor_distance: float = 1.0,
+    neighbor_fwhm: float = 1.0,
+    neighbor_skip: float = 0.25,
+    noise_n_neighbor_freqs: int = 1,
+    noise_skip_neighbor_freqs: int = 1,
+    tmin: float | None = None,
+    tmax: float | None = None,
+    picks: list[str] | None = None,
+    batch_size: int = 4,
+) -> RESSCovariances:
+    """
+    Narrowband and neighbor covariances of every epoch at the tags, harmonics and IM terms.
+
+    Every epoch is Fourier transformed once. The covariance of the epoch filtered with a
+    Gaussian gain `g` is then `Re(X diag(c g**2) X^H) / n_times**2` over the bins `X` of its
+    one-sided spectrum (`c` = 2 except at 0 Hz and Nyquist), by Parseval, so no filter is run in
+    the time domain and only the bins where a filter passes are used.
+
+    The tags are only about 1 Hz apart, so the reference filters of a target would pass other
+    targets, and the filter would treat their responses as noise and suppress them. The
+    reference gain is therefore zero within `neighbor_skip` of every other target and of 0 Hz.
+
+    Parameters
+    ----------
+    epochs : mne.BaseEpochs
+        Epochs, e.g. the miniblocks of one condition.
+    tagfreqs : Sequence[float]
+        Tag frequencies f1 and f2.
+    order : int, optional
+        Largest harmonic and IM order, by default 2.
+    peak_fwhm : float, optional
+        Width in Hz of the filter at each target, by default 0.5.
+    neighbor_distance : float, optional
+        Distance in Hz of the reference filters below and above each target, by default 1.
+    neighbor_fwhm : float, optional
+        Width in Hz of the reference filters, by default 1.
+    neighbor_skip : float, optional
+        Distance in Hz from every other target and from 0 Hz below which the reference filters
+        are zero, by default 0.25.
+    noise_n_neighbor_freqs, noise_skip_neighbor_freqs : int, optional
+        Noise bins of the component SNR, as in `analysis.snr_spectrum`, by default 1 and 1.
+    tmin, tmax : float | None, optional
+        Window, by default the whole epoch.
+    picks : list[str] | None, optional
+        Channels, by default `analysis.data_channels`.
+    batch_size : int, optional
+        Epochs transformed at once, by default 4.
+
+    Returns
+    -------
+    RESSCovariances
+        Covariances of every epoch, to fit on any subset of epochs with `fit_ress`.
+    """
+    start, n_times = epoch_window(epochs, tmin, tmax)
+    spec_freqs = np.fft.rfftfreq(n_times, 1.0 / epochs.info["sfreq"])
+    targets, bins, noise_cols = tagged_bins(
+        spec_freqs, tagfreqs, order, noise_n_neighbor_freqs, noise_skip_neighbor_freqs
+    )
+    if picks is None:
+        picks = data_channels(epochs.info)
+
+    # One-sided spectrum weights of the squared gains, restricted to the passband of each filter
+    counts = np.full(len(spec_freqs), 2.0)
+    counts[0] = 1.0
+    if n_times % 2 == 0:
+        counts[-1] = 1.0
+    term_freqs = targets["term_freq"].to_numpy()
+    weights = []
+    for i, freq in enumerate(term_freqs):
+        signal = gaussian_gain(spec_freqs, freq, peak_fwhm) ** 2
+        reference = (
+            gaussian_gain(spec_freqs, freq - neighbor_distance, neighbor_fwhm) ** 2
+            + gaussian_gain(spec_freqs, freq + neighbor_distance, neighbor_fwhm) ** 2
+        ) / 2
+        # Other responses are not noise: keep the other targets and 0 Hz out of the reference
+        others = np.append(np.delete(term_freqs, i), 0.0)
+        reference[(np.abs(spec_freqs[:, None] - others) < neighbor_skip).any(axis=1)] = 0.0
+        passband = np.nonzero((signal > 1e-8) | (reference > 1e-8))[0]
+        scale = counts[passband] / n_times**2
+        weights.append((passband, signal[passband] * scale, reference[passband] * scale))
+
+    n_ch = len(picks)
+    coefs = np.empty((len(epochs), n_ch, len(bins)), dtype=complex)
+    signal = np.empty((len(epochs), len(targets), n_ch, n_ch))
+    reference = np.empty_like(signal)
+    for first in range(0, len(epochs), batch_size):
+        items = np.arange(first, min(first + batch_size, len(epochs)))
+        data = epochs.get_data(picks=picks, item=items)[..., start : start + n_times]
+        spectra = np.fft.rfft(data, axis=-1)
+        coefs[items] = spectra[..., bins] / n_times
+        for i, (passband, sig_w, ref_w) in enumerate(weights):
+            band = spectra[..., passband]
+            signal[items, i] = np.real((band * sig_w) @ band.conj().transpose(0, 2, 1))
+            reference[items, i] = np.real((band * ref_w) @ band.conj().transpose(0, 2, 1))
+    return RESSCovariances(
+        targets=targets,
+        freqs=spec_freqs[bins],
+        noise_cols=noise_cols,
+        coefs=coefs,
+        signal=signal,
+        reference=reference,
+        ch_names=list(picks),
+    )
+
+
+@dataclass
+class RESS:
+    """
+    RESS spatial filters, one per target frequency.
+
+    Attributes
+    ----------
+    targets : pd.DataFrame
+        Terms the filters were fit at, as in `RESSCovariances`.
+    filters : np.ndarray
+        (n_targets, n_channels) filter of the largest generalized eigenvalue at every target.
+    patterns : np.ndarray
+        (n_targets, n_channels) topography of every component, signed so that its largest
+        absolute value is positive.
+    eigvals : np.ndarray
+        (n_targets,) ratio of narrowband to neighbor power of every component.
+    ch_names : list[str]
+        Channels the filters apply to.
+    """
+
+    targets: pd.DataFrame
+    filters: np.ndarray
+    patterns: np.ndarray
+    eigvals: np.ndarray
+    ch_names: list[str]
+
+    def transform(
+        self,
+        epochs: mne.BaseEpochs,
+        tmin: float | None = None,
+        tmax: float | None = None,
+    ) -> np.ndarray:
+        """
+        Component time series of every epoch.
+
+        Parameters
+        ----------
+        epochs : mne.BaseEpochs
+            Epochs with the channels of the filters.
+        tmin, tmax : float | None, optional
+            Window, by default the whole epoch.
+
+        Returns
+        -------
+        np.ndarray
+            (n_epochs, n_targets, n_times) components.
+        """
+        start, n_times = epoch_window(epochs, tmin, tmax)
+        data = epochs.get_data(picks=self.ch_names)[..., start : start + n_times]
+        return self.filters @ data
+
+    def spectrum(
+        self,
+        epochs: mne.BaseEpochs,
+        tmin: float | None = None,
+        tmax: float | None = None,
+        noise_n_neighbor_freqs: int = 1,
+        noise_skip_neighbor_freqs: int = 1,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Power and SNR spectra of every component, averaged over epochs.
+
+        Parameters
+        ----------
+        epochs : mne.BaseEpochs
+            Epochs with the channels of the filters.
+        tmin, tmax : float | None, optional
+            Window, by default the whole epoch.
+        noise_n_neighbor_freqs, noise_skip_neighbor_freqs : int, optional
+            Noise bins of the SNR, see `analysis.snr_spectrum`, by default 1 and 1.
+
+        Returns
+        -------
+        freqs : np.ndarray
+            (n_freqs,) frequencies.
+        power : np.ndarray
+            (n_targets, n_freqs) power of every component.
+        snr : np.ndarray
+            (n_targets, n_freqs) SNR of every component.
+        """
+        components = self.transform(epochs, tmin, tmax)
+        n_times = components.shape[-1]
+        freqs = np.fft.rfftfreq(n_times, 1.0 / epochs.info["sfreq"])
+        power = (np.abs(np.fft.rfft(components, axis=-1) / n_times) ** 2).mean(axis=0)
+        snr = snr_spectrum(power, noise_n_neighbor_freqs, noise_skip_neighbor_freqs)
+        return freqs, power, snr
+
+    def topographies(self, info: mne.Info) -> mne.EvokedArray:
+        """
+        Component patterns as an evoked object, e.g. for `plot_topomap`.
+
+        Parameters
+        ----------
+        info : mne.Info
+            Measurement info containing the channels of the filters.
+
+        Returns
+        -------
+        mne.EvokedArray
+            Evoked with one "time" per target, in order of `targets` (see
+            `analysis.tagged_bins`).
+        """
+        info = mne.pick_info(info, mne.pick_channels(info["ch_names"], self.ch_names, ordered=True))
+        return mne.EvokedArray(self.patterns.T, info, tmin=0.0, verbose=False)
+
+    def target_power(self, covs: RESSCovariances, items: np.ndarray | None = None) -> np.ndarray:
+        """
+        Component power at every target and noise bin, from the stored Fourier coefficients.
+
+        Parameters
+        ----------
+        covs : RESSCovariances
+            Covariances the filters were fit on, or others with the same targets and channels.
+        items : np.ndarray | None, optional
+            Epochs to average, by default all.
+
+        Returns
+        -------
+        np.ndarray
+            (n_targets, n_bins) power of the component of each target in every bin of
+            `covs.freqs`.
+        """
+        coefs = covs.coefs if items is None else covs.coefs[items]
+        return (np.abs(np.einsum("tc,ecb->etb", self.filters, coefs)) ** 2).mean(axis=0)
+
+
+def _solve(signal: np.ndarray, reference: np.ndarray, reg: float) -> tuple[np.ndarray, ...]:
+    # Largest generalized eigenvector of every target, with the reference shrunk to its diagonal
+    n_targets, n_ch, _ = signal.shape
+    filters, patterns, eigvals = np.empty((n_targets, n_ch)), np.empty((n_targets, n_ch)), []
+    for i in range(n_targets):
+        ref = (1 - reg) * reference[i] + reg * np.diag(np.diag(reference[i]))
+        vals, vecs = linalg.eigh(signal[i], ref, subset_by_index=[n_ch - 1, n_ch - 1])
+        w = vecs[:, 0]
+        pattern = signal[i] @ w / (w @ signal[i] @ w)
+        sign = np.sign(pattern[np.abs(pattern).argmax()])
+        filters[i], patterns[i] = sign * w, sign * pattern
+        eigvals.append(vals[0])
+    return filters, patterns, np.asarray(eigvals)
+
+
+def fit_ress(covs: RESSCovariances, items: np.ndarray | None = None, reg: float = 0.01) -> RESS:
+    """
+    Fit RESS filters on some epochs by solving the generalized eigenproblem at every target.
+
+    Parameters
+    ----------
+    covs : RESSCovariances
+        Covariances from `ress_covariances`.
+    items : np.ndarray | None, optional
+        Epochs to fit on, by default all.
+    reg : float, optional
+        Shrinkage of the reference covariance towards its diagonal, by default 0.01. Needed for
+        rank-deficient (e.g. SSS-processed) data; shrinking to the diagonal rather than the
+        identity keeps magnetometers and gradiometers on an equal footing.
+
+    Returns
+    -------
+    RESS
+        Filters and patterns of every target.
+    """
+    signal = covs.signal if items is None else covs.signal[items]
+    reference = covs.reference if items is None else covs.reference[items]
+    filters, patterns, eigvals = _solve(signal.sum(axis=0), reference.sum(axis=0), reg)
+    return RESS(
+        targets=covs.targets,
+        filters=filters,
+        patterns=patterns,
+        eigvals=eigvals,
+        ch_names=covs.ch_names,
+    )
+
+
+def cross_validate_ress(
+    covs: RESSCovariances, n_splits: int = 5, reg: float = 0.01
+) -> pd.DataFrame:
+    """
+    Held-out SNR and ITC of RESS components fit on the other epochs.
+
+    Epochs are split into `n_splits` contiguous folds. The filters of each fold are fit on the
+    covariance sums of all epochs minus those of the fold, so covariances are summed only once.
+
+    Parameters
+    ----------
+    covs : RESSCovariances
+        Covariances from `ress_covariances`.
+    n_splits : int, optional
+        Number of folds, by default 5.
+    reg : float, optional
+        Reference shrinkage, see `fit_ress`, by default 0.01.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per fold and target with the `fold`, `term`, `term_freq`, and the held-out
+        `snr` (power at the target over the mean of its noise bins) and `itc` of the component.
+    """
+    n_epochs = len(covs.coefs)
+    if not 2 <= n_splits <= n_epochs:
+        raise ValueError(f"n_splits must be between 2 and the {n_epochs} epochs.")
+    signal, reference = covs.signal.sum(axis=0), covs.reference.sum(axis=0)
+    target_idx = np.arange(len(covs.targets))
+    rows = []
+    for fold, test in enumerate(np.array_split(np.arange(n_epochs), n_splits)):
+        filters, _, _ = _solve(
+            signal - covs.signal[test].sum(axis=0),
+            reference - covs.reference[test].sum(axis=0),
+            reg,
+        )
+        # (n_test, n_targets, n_bins) coefficients of every target's own component
+        coefs = np.einsum("tc,ecb->etb", filters, covs.coefs[test])
+        power = (np.abs(coefs) ** 2).mean(axis=0)
+        target = coefs[:, target_idx, covs.targets["col"]]
+        snr = power[target_idx, covs.targets["col"]] / np.take_along_axis(
+            power, covs.noise_cols, axis=1
+        ).mean(axis=1)
+        itc = np.abs((target / np.abs(target)).mean(axis=0))
+        rows.append(
+            pd.DataFrame(
+                dict(
+                    fold=fold,
+                    term=covs.targets["term"],
+                    term_freq=covs.targets["term_freq"],
+                    snr=snr,
+                    itc=itc,
+                )
+            )
+        )
+    return pd.concat(rows, ignore_index=True)
@@ -0,0 +1,364 @@
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+WORD_COLS = ("w1", "w2")
+_FAR = np.iinfo(np.int64).max // 4  # Sentinel position for "never used"
+
+
+@dataclass(frozen=True)
+class ScheduleConstraints:
+    """
+    Declarative constraints on a session's miniblock sequence.
+
+    Attributes
+    ----------
+    max_word_repeats : int
+        Maximum number of stimuli within one miniblock that may contain the same word. Default 1.
+    min_word_distance : int
+        Minimum distance, in miniblock positions, between two miniblocks that share a word. 1 puts
+        no restriction, 2 forbids a word in consecutive miniblocks, and so on. Default 2.
+    max_condition_run : int | None
+        Maximum number of consecutive miniblocks of the same condition. None for no limit.
+        Default None.
+    tag_block_len : int | None
+        Length, in miniblocks, of the windows within which tag arrangements (F1/F2 order) are
+        balanced. None to only balance arrangements within each condition. Default None.
+    max_tag_imbalance : int
+        Largest allowed difference between the most and least used tag arrangement in any prefix
+        of a `tag_block_len` window. Default 1.
+    cyclic : bool
+        Whether the sequence is presented repeatedly (as over `N_BLOCKS`), in which case word
+        distances also apply across the wrap from the last to the first miniblock. Default True.
+    """
+
+    max_word_repeats: int = 1
+    min_word_distance: int = 2
+    max_condition_run: int | None = None
+    tag_block_len: int | None = None
+    max_tag_imbalance: int = 1
+    cyclic: bool = True
+
+    def __post_init__(self):
+        if self.max_word_repeats < 1:
+            raise ValueError("max_word_repeats must be at least 1.")
+        if self.min_word_distance < 1:
+            raise ValueError("min_word_distance must be at least 1.")
+        if self.max_condition_run is not None and self.max_condition_run < 1:
+            raise ValueError("max_condition_run must be at least 1 or None.")
+        if self.tag_block_len is not None and self.tag_block_len < 1:
+            raise ValueError("tag_block_len must be at least 1 or None.")
+        if self.max_tag_imbalance < 1:
+            raise ValueError("max_tag_imbalance must be at least 1.")
+
+
+def _encode_words(df: pd.DataFrame) -> np.ndarray:
+    cols = [c for c in WORD_COLS if c in df.columns]
+    codes, _ = pd.factorize(df[cols].to_numpy().ravel())
+    return codes.reshape(len(df), len(cols))
+
+
+def _chunk_conflicts(chunks: np.ndarray, words: np.ndarray, max_repeats: int) -> np.ndarray:
+    """Mask of stimuli sharing a word with more than `max_repeats` stimuli in their chunk."""
+    n_words = words.max() + 1
+    keys = chunks[:, None].astype(np.int64) * n_words + words
+    uniq, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return (counts[inverse.reshape(keys.shape)] > max_repeats).any(axis=1)
+
+
+def _form_miniblocks(
+    words: np.ndarray,
+    miniblock_len: int,
+    max_repeats: int,
+    rng: np.random.Generator,
+    max_rounds: int = 100,
+) -> np.ndarray | None:
+    """
+    Shuffle the stimuli of one condition into miniblocks without repeated words, repairing any
+    conflicts by swapping stimuli between miniblocks. Returns the stimulus order (consecutive
+    runs of `miniblock_len` form a miniblock) or None if the repair budget ran out.
+    """
+    order = rng.permutation(len(words))
+    chunks = np.arange(len(words)) // miniblock_len
+    for _ in range(max_rounds):
+        conflicts = np.flatnonzero(_chunk_conflicts(chunks, words[order], max_repeats))
+        if len(conflicts) == 0:
+            return order
+        # Swap every conflicting stimulus with a random stimulus, then re-check all miniblocks
+        for i, j in zip(conflicts, rng.integers(0, len(order), len(conflicts))):
+            order[[i, j]] = order[[j, i]]
+    return None
+
+
+def _arrangement_quotas(mini_conds: np.ndarray, n_arrangements: int) -> np.ndarray:
+    # Balanced arrangement counts per condition. Leftovers are dealt out in rotation across
+    # conditions so that the session as a whole stays balanced too.
+    n_per_cond = np.bincount(mini_conds)
+    quotas = np.repeat((n_per_cond // n_arrangements)[:, None], n_arrangements, axis=1)
+    offset = 0
+    for cond, rem in enumerate(n_per_cond % n_arrangements):
+        quotas[cond, (offset + np.arange(rem)) % n_arrangements] += 1
+        offset += rem
+    return quotas
+
+
+def _order_miniblocks(
+    mini_words: np.ndarray,
+    mini_conds: np.ndarray,
+    n_arrangements: int,
+    constraints: ScheduleConstraints,
+    rng: np.random.Generator,
+    max_backtracks: int,
+) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    Randomized greedy search with backtracking for a miniblock order and tag arrangement per
+    miniblock. All checks are vectorized over the remaining candidate (miniblock, arrangement)
+    pairs. Returns (order, arrangements) or None if the backtracking budget ran out.
+    """
+    n_minis = len(mini_words)
+    n_words = mini_words.max() + 1
+    min_dist = constraints.min_word_distance
+    max_run = constraints.max_condition_run
+    block_len = constraints.tag_block_len
+
+    last_pos = np.full(n_words, -_FAR, dtype=np.int64)
+    first_pos = np.full(n_words, _FAR, dtype=np.int64)
+    quotas = _arrangement_quotas(mini_conds, n_arrangements)
+    remaining = np.ones(n_minis, dtype=bool)
+    tried = [[] for _ in range(n_minis)]  # Flat (miniblock, arrangement) indices per position
+    block_counts = np.zeros(n_arrangements, dtype=int)
+    order = np.empty(n_minis, dtype=np.int64)
+    arrangements = np.empty(n_minis, dtype=np.int64)
+    undo = []
+    n_backtracks = 0
+
+    pos = 0
+    while pos < n_minis:
+        valid_mini = remaining.copy()
+        if min_dist > 1:
+            valid_mini &= pos - last_pos[mini_words].max(axis=1) >= min_dist
+            if constraints.cyclic:
+                valid_mini &= n_minis - pos + first_pos[mini_words].min(axis=1) >= min_dist
+        if max_run is not None and pos >= max_run:
+            run = mini_conds[order[pos - max_run : pos]]
+            if np.all(run == run[0]):
+                valid_mini &= mini_conds != run[0]
+        valid_arr = quotas[mini_conds] > 0
+        if block_len is not None:
+            block_ok = block_counts + 1 - block_counts.min() <= constraints.max_tag_imbalance
+            valid_arr &= block_ok[None, :]
+        valid = (valid_mini[:, None] & valid_arr).ravel()
+        valid[tried[pos]] = False
+
+        candidates = np.flatnonzero(valid)
+        if len(candidates) == 0:
+            if pos == 0 or n_backtracks >= max_backtracks:
+                return None
+            # Undo the previous placement and forbid it at that position
+            n_backtracks += 1
+            tried[pos] = []
+            pos -= 1
+            mini, arr, old_last, old_first = undo.pop()
+            words = mini_words[mini]
+            last_pos[words] = old_last
+            first_pos[words] = old_first
+            remaining[mini] = True
+            quotas[mini_conds[mini], arr] += 1
+            if block_len is not None:
+                block_counts = np.bincount(
+                    arrangements[pos - pos % block_len : pos], minlength=n_arrangements
+                )
+            tried[pos].append(mini * n_arrangements + arr)
+            continue
+
+        mini, arr = divmod(rng.choice(candidates), n_arrangements)
+        words = mini_words[mini]
+        undo.append((mini, arr, last_pos[words].copy(), first_pos[words].copy()))
+        last_pos[words] = pos
+        first_pos[words] = np.minimum(first_pos[words], pos)
+        remaining[mini] = False
+        quotas[mini_conds[mini], arr] -= 1
+        order[pos] = mini
+        arrangements[pos] = arr
+        pos += 1
+        if block_len is not None:
+            if pos % block_len == 0:
+                block_counts[:] = 0
+            else:
+                block_counts[arr] += 1
+    return order, arrangements
+
+
+def generate_schedule(
+    df: pd.DataFrame,
+    miniblock_len: int,
+    freqs: Sequence[float],
+    rng: np.random.Generator,
+    constraints: ScheduleConstraints | None = None,
+    max_backtracks: int = 50,
+    max_restarts: int = 200,
+) -> pd.DataFrame:
+    """
+    Build a miniblock schedule for one subject that satisfies a set of constraints.
+
+    Stimuli are first shuffled into single-condition miniblocks with no word repeated more than
+    `max_word_repeats` times within a miniblock. The miniblocks are then ordered, and each given a
+    tag arrangement (a rotation of `freqs`, see `assign_miniblock_freqs`), by a randomized greedy
+    search with backtracking. If the search gets stuck it restarts from a new random draw.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Stimuli with a 'condition' column and 'w1' (and optionally 'w2') word columns. The number
+        of stimuli per condition must be divisible by `miniblock_len`.
+    miniblock_len : int
+        Number of stimuli per miniblock.
+    freqs : Sequence[float]
+        Tagging frequencies.
+    rng : np.random.Generator
+        Random state. The same state always produces the same schedule.
+    constraints : ScheduleConstraints | None, optional
+        Constraints to satisfy, by default `ScheduleConstraints()`.
+    max_backtracks : int, optional
+        Backtracking budget per attempt at ordering the miniblocks, by default 50. Restarting from a
+        fresh draw is usually cheaper than backtracking deep into a bad partial order.
+    max_restarts : int, optional
+        Number of fresh random draws before giving up, by default 200.
+
+    Returns
+    -------
+    pd.DataFrame
+        Copy of `df` in presentation order, with `miniblock` numbered in presentation order and
+        `w1_freq` (and `w2_freq` if there is a `w2` column) added, as from `prep_miniblocks`.
+
+    Raises
+    ------
+    ValueError
+        If a condition cannot be split into whole miniblocks, or no valid schedule was found.
+    """
+    if constraints is None:
+        constraints = ScheduleConstraints()
+    freqs = np.asarray(freqs, dtype=float)
+    n_arrangements = len(freqs)
+    cond_codes, _ = pd.factorize(df["condition"], sort=True)
+    counts = np.bincount(cond_codes)
+    if np.any(counts % miniblock_len):
+        raise ValueError(
+            "The miniblock length does not evenly divide the number of stimuli in each condition."
+        )
+    words = _encode_words(df)
+
+    for _ in range(max_restarts):
+        # Stage 1: form the miniblocks of each condition
+        stim_order = []
+        for cond in range(len(counts)):
+            cond_rows = np.flatnonzero(cond_codes == cond)
+            cond_order = _form_miniblocks(
+                words[cond_rows],
+                miniblock_len,
+                constraints.max_word_repeats,
+                rng,
+            )
+            if cond_order is None:
+                break
+            stim_order.append(cond_rows[cond_order])
+        else:
+            stim_order = np.concatenate(stim_order).reshape(-1, miniblock_len)
+            mini_words = words[stim_order].reshape(len(stim_order), -1)
+            mini_conds = cond_codes[stim_order[:, 0]]
+            # Stage 2: order the miniblocks and pick their tag arrangements
+            result = _order_miniblocks(
+                mini_words, mini_conds, n_arrangements, constraints, rng, max_backtracks
+            )
+            if result is not None:
+                order, arrangements = result
+                break
+    else:
+        raise ValueError(
+            f"Could not find a schedule satisfying {constraints} in {max_restarts} attempts."
+        )
+
+    rows = stim_order[order].ravel()
+    outdf = df.iloc[rows].copy()
+    outdf["miniblock"] = np.arange(len(rows)) // miniblock_len
+    row_arrangement = np.repeat(arrangements, miniblock_len)
+    outdf["w1_freq"] = freqs[row_arrangement]
+    if "w2" in outdf.columns:
+        outdf["w2_freq"] = freqs[(row_arrangement + 1) % n_arrangements]
+    return outdf
+
+
+def schedule_violations(
+    schedule: pd.DataFrame, constraints: ScheduleConstraints, freqs: Sequence[float]
+) -> list[str]:
+    """
+    List every constraint a schedule violates, e.g. to audit schedules produced elsewhere.
+
+    Parameters
+    ----------
+    schedule : pd.DataFrame
+        Schedule with 'condition', 'miniblock', 'w1_freq' and word columns, with miniblocks
+        numbered in presentation order.
+    constraints : ScheduleConstraints
+        Constraints to check.
+    freqs : Sequence[float]
+        Tagging frequencies used to build the schedule.
+
+    Returns
+    -------
+    list[str]
+        Human-readable descriptions of the violations. Empty if the schedule is valid.
+    """
+    violations = []
+    schedule = schedule.sort_values("miniblock", kind="stable")
+    words = _encode_words(schedule)
+    mini_codes, minis = pd.factorize(schedule["miniblock"])
+    n_minis = len(minis)
+
+    if (schedule.groupby("miniblock")["condition"].nunique() > 1).any():
+        violations.append("Some miniblocks mix conditions.")
+    if _chunk_conflicts(mini_codes, words, constraints.max_word_repeats).any():
+        violations.append("A word is repeated within a miniblock too often.")
+
+    # Word distances, from the sorted (word, miniblock) pairs
+    pairs = np.unique(np.stack([words.ravel(), np.repeat(mini_codes, words.shape[1])]), axis=1)
+    same_word = pairs[0, 1:] == pairs[0, :-1]
+    gaps = (pairs[1, 1:] - pairs[1, :-1])[same_word]
+    if len(gaps) and gaps.min() < constraints.min_word_distance:
+        violations.append(f"A word reappears after {gaps.min()} miniblocks.")
+    if constraints.cyclic and n_minis > 0:
+        starts = np.flatnonzero(np.concatenate(([True], ~same_word)))
+        ends = np.concatenate((starts[1:], [pairs.shape[1]])) - 1
+        wrap = n_minis - pairs[1, ends] + pairs[1, starts]
+        multi = ends > starts
+        if np.any(multi) and wrap[multi].min() < constraints.min_word_distance:
+            violations.append("A word reappears too soon across the wrap to the first miniblock.")
+
+    mini_info = schedule.groupby("miniblock")[["condition", "w1_freq"]].first()
+    conds = mini_info["condition"].to_numpy()
+    if constraints.max_condition_run is not None:
+        run_breaks = np.flatnonzero(np.concatenate(([True], conds[1:] != conds[:-1], [True])))
+        if np.diff(run_breaks).max(initial=0) > constraints.max_condition_run:
+            violations.append(f"A condition runs for {np.diff(run_breaks).max()} miniblocks.")
+
+    # Arrangement k tags the first word with freqs[k]
+    freqs = np.asarray(freqs, dtype=float)
+    w1_freqs = mini_info["w1_freq"].to_numpy(dtype=float)
+    arrangements = np.argmax(np.isclose(w1_freqs[:, None], freqs[None, :]), axis=1)
+    cond_codes, _ = pd.factorize(conds)
+    percond = np.zeros((cond_codes.max(initial=-1) + 1, len(freqs)), dtype=int)
+    np.add.at(percond, (cond_codes, arrangements), 1)
+    if np.any(percond.max(axis=1) - percond.min(axis=1) > 1):
+        violations.append("Tag arrangements are not balanced within a condition.")
+    if constraints.tag_block_len is not None:
+        for start in range(0, n_minis, constraints.tag_block_len):
+            block = arrangements[start : start + constraints.tag_block_len]
+            counts = np.zeros((len(block), len(freqs)), dtype=int)
+            counts[np.arange(len(block)), block] = 1
+            prefix = np.cumsum(counts, axis=0)
+            if np.any(prefix.max(axis=1) - prefix.min(axis=1) > constraints.max_tag_imbalance):
+                violations.append(f"Tag arrangements are unbalanced in the block at {start}.")
+                break
+    return violations
@@ -0,0 +1,315 @@
+from collections.abc import Mapping, Sequence
+
+import mne
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter, lfilter_zi
+
+from intermodulation.freqplan import LINE_FREQ, response_terms, term_labels
+from intermodulation.freqtag_spec import (
+    FIXATION_DUR,
+    FREQUENCIES,
+    ITI_BOUNDS,
+    MINIBLOCK_LEN,
+    TRIGGERS,
+    WORD_DUR,
+)
+
+LAYOUT = "Vectorview-all"
+STIM_CHANNEL = "STI101"
+MAX_ORDER = 6  # Highest order of response terms that can be simulated
+# Broadband noise standard deviation per channel type, in SI units
+NOISE_STD = {"mag": 100e-15, "grad": 2e-12}
+# Peak amplitude of each response term at its most responsive sensor, relative to NOISE_STD
+RESPONSE_AMPLITUDES = {
+    "f1": 0.2,
+    "f2": 0.2,
+    "2f1": 0.1,
+    "2f2": 0.1,
+    "f1-f2": 0.05,
+    "f1+f2": 0.05,
+}
+# Multiplier of the intermodulation terms per two-word condition, the effect to recover
+IM_GAIN = {"PHRASE": 2.0, "NONPHRASE": 1.0, "NONWORD": 1.0}
+# Paul Kellet's economy filter: white noise in, approximately 1/f noise out
+PINK_B = np.array([0.049922035, -0.095993537, 0.050612699, -0.004408786])
+PINK_A = np.array([1.0, -2.494956002, 2.017265875, -0.522189400])
+
+
+def miniblock_conditions() -> list[tuple[str, ...]]:
+    """
+    Every miniblock condition of the experiment as (task, condition, tag) name tuples.
+
+    Returns
+    -------
+    list[tuple[str, ...]]
+        E.g. ("TWOWORD", "PHRASE", "F1LEFT") or ("ONEWORD", "WORD", "F1"), in `TRIGGERS` order.
+    """
+    return [
+        (task, cond, tag)
+        for task in ("TWOWORD", "ONEWORD")
+        for cond, tags in TRIGGERS[task].items()
+        for tag in tags
+    ]
+
+
+def simulation_info(sfreq: float, layout: str = LAYOUT) -> mne.Info:
+    """
+    Measurement info with the MEG channels of a layout and a trigger channel.
+
+    Parameters
+    ----------
+    sfreq : float
+        Sampling frequency in Hz.
+    layout : str, optional
+        Name of an MNE layout, by default "Vectorview-all" (306 channels, in which names ending
+        in 1 are magnetometers and the others gradiometers).
+
+    Returns
+    -------
+    mne.Info
+        Info with the layout's MEG channels and `STIM_CHANNEL`.
+    """
+    names = list(mne.channels.read_layout(layout).names)
+    types = ["mag" if name.endswith("1") else "grad" for name in names]
+    return mne.create_info([*names, STIM_CHANNEL], sfreq, [*types, "stim"])
+
+
+def response_patterns(
+    info: mne.Info, labels: Sequence[str], rng: np.random.Generator, width: float = 0.15
+) -> np.ndarray:
+    """
+    Smooth random sensor pattern for each response term.
+
+    Each pattern is a Gaussian bump on the 2D sensor layout, centered on a random sensor and
+    normalized to a peak of 1, so that every term has its own topography.
+
+    Parameters
+    ----------
+    info : mne.Info
+        Measurement info; only MEG channels get non-zero weights.
+    labels : Sequence[str]
+        Term labels, one pattern each.
+    rng : np.random.Generator
+        Random state for the centers.
+    width : float, optional
+        Standard deviation of the bump in layout units, by default 0.15.
+
+    Returns
+    -------
+    np.ndarray
+        (n_channels, n_terms) weights.
+    """
+    picks = mne.pick_types(info, meg=True, exclude=[])
+    layout = mne.channels.find_layout(info)
+    pos = layout.pos[:, :2][[layout.names.index(info.ch_names[p]) for p in picks]]
+    centers = pos[rng.integers(len(pos), size=len(labels))]
+    dist2 = ((pos[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1)
+    patterns = np.zeros((info["nchan"], len(labels)))
+    patterns[picks] = np.exp(-dist2 / (2 * width**2))
+    return patterns
+
+
+def _design(
+    n_miniblocks: int,
+    conditions: Sequence[tuple[str, ...]],
+    word_dur: float,
+    miniblock_len: int,
+    iti_bounds: Sequence[float],
+    fixation_dur: float,
+    rng: np.random.Generator,
+) -> pd.DataFrame:
+    # One row per miniblock: condition and onset in seconds, with conditions cycled in shuffled
+    # rounds so they stay balanced however many miniblocks are asked for
+    rounds = -(-n_miniblocks // len(conditions))
+    order = np.concatenate([rng.permutation(len(conditions)) for _ in range(rounds)])
+    order = order[:n_miniblocks]
+    gaps = rng.uniform(*iti_bounds, size=n_miniblocks) + fixation_dur
+    duration = miniblock_len * word_dur
+    onsets = np.cumsum(gaps) + np.arange(n_miniblocks) * duration
+    return pd.DataFrame(
+        {
+            "task": [conditions[i][0] for i in order],
+            "condition": [conditions[i][1] for i in order],
+            "tag": [conditions[i][2] for i in order],
+            "onset": onsets,
+        }
+    )
+
+
+def simulate_raw(
+    n_miniblocks: int = 50,
+    sfreq: float = 2000.0,
+    rng: np.random.Generator | None = None,
+    freqs: Sequence[float] = FREQUENCIES,
+    word_dur: float = WORD_DUR,
+    miniblock_len: int = MINIBLOCK_LEN,
+    amplitudes: Mapping[str, float] = RESPONSE_AMPLITUDES,
+    im_gain: Mapping[str, float] = IM_GAIN,
+    line_amplitude: float = 0.5,
+    line_freq: float = LINE_FREQ,
+    n_line_harmonics: int = 3,
+    iti_bounds: Sequence[float] = ITI_BOUNDS,
+    fixation_dur: float = FIXATION_DUR,
+    info: mne.Info | None = None,
+    chunk_dur: float = 60.0,
+) -> tuple[mne.io.RawArray, pd.DataFrame]:
+    """
+    Simulate a frequency-tagged MEG recording of the miniblock task.
+
+    The recording has pink sensor noise, line noise with harmonics, and during every miniblock
+    phase-locked sinusoidal responses at the tags, their harmonics and intermodulation terms, each
+    with its own sensor pattern. One-word miniblocks only respond at harmonics of their tag;
+    two-word miniblocks respond at every term, with the intermodulation terms scaled by the
+    condition's `im_gain`. For F1RIGHT miniblocks f1 and f2 swap sides, so the patterns of f1 and
+    f2 terms are swapped too; one-word F2 miniblocks likewise use the f1 patterns, as the word is
+    always in the same place.
+
+    Every word onset is written to the trigger channel and annotated like a recording converted
+    from triggers ("TWOWORD_PHRASE_F1LEFT", ...), along with FIXATION and TRIALEND around each
+    miniblock, so `analysis.miniblock_events` can be run on the result. Noise is generated and
+    filtered chunk by chunk into one preallocated array, so hours at 2 kHz only cost the memory of
+    the data itself.
+
+    Parameters
+    ----------
+    n_miniblocks : int, optional
+        Number of miniblocks, by default 50. Conditions are balanced in shuffled rounds.
+    sfreq : float, optional
+        Sampling frequency in Hz, by default 2000.
+    rng : np.random.Generator | None, optional
+        Random state, by default a fresh `np.random.default_rng()`.
+    freqs : Sequence[float], optional
+        Tag frequencies f1 and f2, by default `FREQUENCIES`.
+    word_dur : float, optional
+        Word duration in seconds, by default `WORD_DUR`.
+    miniblock_len : int, optional
+        Words per miniblock, by default `MINIBLOCK_LEN`.
+    amplitudes : Mapping[str, float], optional
+        Peak amplitude of each term, keyed by labels such as "f1", "2f2" or "f1+f2" (see
+        `freqplan.term_labels`), in units of the channel type's noise standard deviation. By
+        default `RESPONSE_AMPLITUDES`.
+    im_gain : Mapping[str, float], optional
+        Gain of intermodulation terms per two-word condition, by default `IM_GAIN`.
+    line_amplitude : float, optional
+        Line noise amplitude relative to the noise standard deviation, by default 0.5.
+    line_freq : float, optional
+        Line frequency in Hz, by default `LINE_FREQ`.
+    n_line_harmonics : int, optional
+        Number of line frequency harmonics, including the fundamental, by default 3.
+    iti_bounds : Sequence[float], optional
+        Bounds of the uniform inter-trial interval in seconds, by default `ITI_BOUNDS`.
+    fixation_dur : float, optional
+        Fixation period before each miniblock in seconds, by default `FIXATION_DUR`.
+    info : mne.Info | None, optional
+        Measurement info to simulate, by default `simulation_info(sfreq)`. Must have a stim
+        channel named `STIM_CHANNEL`.
+    chunk_dur : float, optional
+        Duration of the chunks noise is generated in, by default 60 s.
+
+    Returns
+    -------
+    raw : mne.io.RawArray
+        Simulated recording.
+    design : pd.DataFrame
+        One row per miniblock with its `task`, `condition`, `tag` and `onset` in seconds.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    if info is None:
+        info = simulation_info(sfreq)
+    sfreq = info["sfreq"]
+    terms = response_terms(MAX_ORDER)
+    labels = term_labels(terms)
+    unknown = set(amplitudes) - set(labels)
+    if unknown:
+        raise ValueError(f"Unknown response terms: {sorted(unknown)}.")
+    terms = np.array([terms[labels.index(label)] for label in amplitudes])
+    labels = list(amplitudes)
+
+    design = _design(
+        n_miniblocks,
+        miniblock_conditions(),
+        word_dur,
+        miniblock_len,
+        iti_bounds,
+        fixation_dur,
+        rng,
+    )
+    mb_dur = miniblock_len * word_dur
+    n_times = int(np.ceil((design["onset"].iloc[-1] + mb_dur + iti_bounds[1]) * sfreq))
+
+    # Scale of every channel: noise std for MEG channels, 0 for the rest
+    types = np.array(info.get_channel_types())
+    scale = np.array([NOISE_STD.get(t, 0.0) for t in types])
+    meg = np.flatnonzero(scale > 0)
+    if len(meg) and (np.diff(meg) == 1).all():
+        meg = slice(meg[0], meg[-1] + 1)  # Writing to a slice is much faster than fancy indexing
+    n_meg = len(scale[meg])
+    data = np.zeros((info["nchan"], n_times))
+
+    # Pink noise, filtered in chunks with the filter state carried over
+    zi = lfilter_zi(PINK_B, PINK_A)[None, :] * rng.standard_normal((n_meg, 1))
+    chunk = max(int(chunk_dur * sfreq), 1)
+    # Unit-variance white noise comes out of the filter with the energy of its impulse response
+    impulse = lfilter(PINK_B, PINK_A, np.r_[1.0, np.zeros(int(10 * sfreq))])
+    pink_norm = 1 / np.sqrt((impulse**2).sum())
+    # Line noise per channel as a mix of one sine and one cosine per harmonic, so it costs one
+    # matrix product per chunk instead of a sine per channel and sample
+    line_phase = rng.uniform(0, 2 * np.pi, size=(n_meg, n_line_harmonics))
+    line_gain = rng.uniform(0.5, 1.5, size=(n_meg, n_line_harmonics)) * line_amplitude
+    line_mix = np.concatenate(
+        [line_gain * np.cos(line_phase), line_gain * np.sin(line_phase)], axis=1
+    )
+    line_freqs = line_freq * np.arange(1, n_line_harmonics + 1)
+    for start in range(0, n_times, chunk):
+        stop = min(start + chunk, n_times)
+        white = rng.standard_normal((n_meg, stop - start), dtype=np.float32)
+        pink, zi = lfilter(PINK_B, PINK_A, white, axis=-1, zi=zi)
+        pink *= pink_norm
+        arg = 2 * np.pi * line_freqs[:, None] * (np.arange(start, stop) / sfreq)[None, :]
+        pink += line_mix @ np.concatenate([np.sin(arg), np.cos(arg)])
+        pink *= scale[meg, None]
+        data[meg, start:stop] = pink
+
+    # Responses: one phase-locked template per term, shared by all miniblocks
+    patterns = response_patterns(info, labels, rng) * scale[:, None]
+    # Pattern of each term when f1 and f2 swap sides; terms without a mirror keep their own
+    mirrored = term_labels(terms[:, ::-1])
+    swapped = [labels.index(m) if m in labels else i for i, m in enumerate(mirrored)]
+    t = np.arange(int(round(mb_dur * sfreq))) / sfreq
+    term_freqs = np.abs(terms @ np.asarray(freqs, dtype=float))
+    phases = rng.uniform(0, 2 * np.pi, size=len(terms))
+    templates = np.sin(2 * np.pi * term_freqs[:, None] * t[None, :] + phases[:, None])
+    templates *= np.array([amplitudes[label] for label in labels])[:, None]
+    is_im = (terms != 0).all(axis=1)
+
+    stim = np.zeros(n_times)
+    onsets = []
+    descriptions = []
+    for row in design.itertuples():
+        start = int(round(row.onset * sfreq))
+        gains = np.ones(len(terms))
+        if row.task == "ONEWORD":
+            tag_col = 0 if row.tag == "F1" else 1
+            gains[terms[:, 1 - tag_col] != 0] = 0.0
+        else:
+            gains[is_im] = im_gain.get(row.condition, 1.0)
+        mb_patterns = patterns[:, swapped] if row.tag in ("F1RIGHT", "F2") else patterns
+        data[:, start : start + len(t)] += (mb_patterns * gains) @ templates
+
+        code = TRIGGERS[row.task][row.condition][row.tag]
+        desc = f"{row.task}_{row.condition}_{row.tag}"
+        word_onsets = row.onset + np.arange(miniblock_len) * word_dur
+        stim[np.round(word_onsets * sfreq).astype(int)] = code
+        fix_onset = row.onset - fixation_dur
+        end_onset = row.onset + mb_dur
+        stim[int(round(fix_onset * sfreq))] = TRIGGERS.FIXATION
+        stim[min(int(round(end_onset * sfreq)), n_times - 1)] = TRIGGERS.TRIALEND
+        onsets.extend([fix_onset, *word_onsets, end_onset])
+        descriptions.extend(["FIXATION", *[desc] * miniblock_len, "TRIALEND"])
+
+    data[info.ch_names.index(STIM_CHANNEL)] = stim
+    raw = mne.io.RawArray(data, info, copy="auto", verbose=False)
+    raw.set_annotations(mne.Annotations(onsets, 0.0, descriptions))
+    return raw, design
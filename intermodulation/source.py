@@ -0,0 +1,244 @@
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import mne
+import numpy as np
+import pandas as pd
+from mne.minimum_norm import apply_inverse_raw
+
+from intermodulation.analysis import data_channels, epoch_window, tagged_bins
+
+
+def inverse_kernel(
+    inverse_operator: mne.minimum_norm.InverseOperator,
+    info: mne.Info,
+    lambda2: float = 1.0 / 9.0,
+    method: str = "dSPM",
+    pick_ori: str | None = "normal",
+) -> tuple[np.ndarray, list[str], mne.SourceEstimate]:
+    """
+    Linear map from sensor data to source activity of an inverse operator.
+
+    The kernel is found by applying the operator to an identity matrix, so it includes the
+    projections, whitening and noise normalization of `method` and can be applied to any linear
+    transform of the sensor data, such as Fourier coefficients. Noise normalization assumes
+    single epochs (nave = 1); SNR and ITC do not depend on it.
+
+    Parameters
+    ----------
+    inverse_operator : mne.minimum_norm.InverseOperator
+        Inverse operator.
+    info : mne.Info
+        Measurement info containing at least the channels of the operator.
+    lambda2 : float, optional
+        Regularization, by default 1 / 9 (SNR of 3).
+    method : str, optional
+        "MNE", "dSPM", "sLORETA" or "eLORETA", by default "dSPM".
+    pick_ori : str | None, optional
+        "normal" for the component normal to the cortex, "vector" for all three orientations,
+        or None for operators with fixed orientations, by default "normal".
+
+    Returns
+    -------
+    kernel : np.ndarray
+        (n_sources, n_orientations, n_channels) kernel, with one orientation unless
+        `pick_ori` is "vector".
+    ch_names : list[str]
+        Channels of the kernel columns.
+    template : mne.SourceEstimate
+        Single-sample scalar source estimate (surface, volume or mixed) of the operator's
+        sources, to build results from.
+    """
+    fixed = inverse_operator["source_ori"] == mne.io.constants.FIFF.FIFFV_MNE_FIXED_ORI
+    if pick_ori is None and not fixed:
+        raise ValueError(
+            "Free orientation operators combine orientations non-linearly without pick_ori, "
+            "use 'normal' or 'vector'."
+        )
+    ch_names = [name for name in inverse_operator["info"]["ch_names"] if name in info["ch_names"]]
+    info = mne.pick_info(info, mne.pick_channels(info["ch_names"], ch_names, ordered=True))
+    identity = mne.io.RawArray(np.eye(len(ch_names)), info, verbose=False)
+    stc = apply_inverse_raw(
+        identity, inverse_operator, lambda2, method, pick_ori=pick_ori, verbose=False
+    )
+    kernel = stc.data if stc.data.ndim == 3 else stc.data[:, None, :]
+    template = (stc.magnitude() if stc.data.ndim == 3 else stc).crop(0.0, 0.0)
+    return kernel, ch_names, template
+
+
+def fourier_coefficients(
+    epochs: mne.BaseEpochs,
+    bins: np.ndarray,
+    picks: list[str] | None = None,
+    tmin: float | None = None,
+    tmax: float | None = None,
+    batch_size: int = 10,
+) -> np.ndarray:
+    """
+    Complex Fourier coefficients of every epoch at some frequency bins only.
+
+    The window from `tmin` lasts `sfreq * (tmax - tmin)` samples and is not tapered, as for the
+    boxcar PSDs of `02_subject_sensor_snr.py`, so bin `k` is at `k / (tmax - tmin)` Hz.
+
+    Parameters
+    ----------
+    epochs : mne.BaseEpochs
+        Epochs.
+    bins : np.ndarray
+        Indices of the bins to keep.
+    picks : list[str] | None, optional
+        Channels, by default `analysis.data_channels`.
+    tmin, tmax : float | None, optional
+        Window, by default the whole epoch.
+    batch_size : int, optional
+        Epochs transformed at once, by default 10.
+
+    Returns
+    -------
+    np.ndarray
+        (n_epochs, n_channels, n_bins) coefficients, normalized by the window length.
+    """
+    start, n_times = epoch_window(epochs, tmin, tmax)
+    picks = data_channels(epochs.info) if picks is None else picks
+    coefs = []
+    for first in range(0, len(epochs), batch_size):
+        items = np.arange(first, min(first + batch_size, len(epochs)))
+        data = epochs.get_data(picks=picks, item=items)[..., start : start + n_times]
+        coefs.append(np.fft.rfft(data, axis=-1)[..., bins] / n_times)
+    return np.concatenate(coefs)
+
+
+@dataclass
+class SourceSpectra:
+    """
+    Source power, SNR and ITC at the tagged frequencies.
+
+    Attributes
+    ----------
+    targets : pd.DataFrame
+        Terms as from `analysis.tagged_bins`.
+    freqs : np.ndarray
+        (n_bins,) frequencies of every computed bin, targets and noise.
+    power : np.ndarray
+        (n_sources, n_bins) power averaged over epochs, summed over orientations.
+    itc : np.ndarray
+        (n_sources, n_bins) inter-trial phase coherence.
+    snr : np.ndarray
+        (n_sources, n_targets) power at every target over the mean power of its noise bins.
+    template : mne.SourceEstimate
+        Source estimate of the operator's sources, see `inverse_kernel`.
+    """
+
+    targets: pd.DataFrame
+    freqs: np.ndarray
+    power: np.ndarray
+    itc: np.ndarray
+    snr: np.ndarray
+    template: mne.SourceEstimate
+
+    def stc(self, kind: str = "snr") -> mne.SourceEstimate:
+        """
+        Target SNR or ITC as a source estimate, with term frequencies in place of times.
+
+        Parameters
+        ----------
+        kind : str, optional
+            "snr" or "itc", by default "snr".
+
+        Returns
+        -------
+        mne.SourceEstimate
+            Source estimate with one "time" per target, in order of `targets` (see
+            `analysis.tagged_bins`).
+        """
+        if kind == "snr":
+            data = self.snr
+        elif kind == "itc":
+            data = self.itc[:, self.targets["col"]]
+        else:
+            raise ValueError(f"Unknown kind {kind!r}, use 'snr' or 'itc'.")
+        return type(self.template)(
+            data, self.template.vertices, tmin=0.0, tstep=1.0, subject=self.template.subject
+        )
+
+
+def source_spectra(
+    epochs: mne.BaseEpochs,
+    inverse_operator: mne.minimum_norm.InverseOperator,
+    tagfreqs: Sequence[float],
+    tmin: float | None = None,
+    tmax: float | None = None,
+    order: int = 2,
+    noise_n_neighbor_freqs: int = 1,
+    noise_skip_neighbor_freqs: int = 1,
+    lambda2: float = 1.0 / 9.0,
+    method: str = "dSPM",
+    pick_ori: str | None = "normal",
+    batch_size: int = 4,
+) -> SourceSpectra:
+    """
+    Source SNR and ITC at the tags, harmonics and IM terms from sensor Fourier coefficients.
+
+    Only the coefficients of the target and noise bins are computed and projected through the
+    inverse kernel, instead of the whole time series of every epoch.
+
+    Parameters
+    ----------
+    epochs : mne.BaseEpochs
+        Epochs, e.g. the miniblocks of one condition.
+    inverse_operator : mne.minimum_norm.InverseOperator
+        Inverse operator of the recording.
+    tagfreqs : Sequence[float]
+        Tag frequencies f1 and f2.
+    tmin, tmax : float | None, optional
+        Analysis window, by default the whole epoch.
+    order : int, optional
+        Largest harmonic and IM order, by default 2.
+    noise_n_neighbor_freqs, noise_skip_neighbor_freqs : int, optional
+        Noise bins for the SNR, as in `analysis.snr_spectrum`, by default 1 and 1.
+    lambda2, method, pick_ori
+        Inverse parameters, see `inverse_kernel`.
+    batch_size : int, optional
+        Epochs projected at once, by default 4. Memory grows with sources x bins x batch size.
+
+    Returns
+    -------
+    SourceSpectra
+        Power and ITC of every computed bin and the SNR of every target. The `col` column of
+        `targets` indexes its bin in `freqs`.
+    """
+    _, n_times = epoch_window(epochs, tmin, tmax)
+    freqs = np.fft.rfftfreq(n_times, 1.0 / epochs.info["sfreq"])
+    targets, bins, noise_cols = tagged_bins(
+        freqs, tagfreqs, order, noise_n_neighbor_freqs, noise_skip_neighbor_freqs
+    )
+
+    kernel, ch_names, template = inverse_kernel(
+        inverse_operator, epochs.info, lambda2, method, pick_ori
+    )
+    coefs = fourier_coefficients(epochs, bins, ch_names, tmin, tmax)
+    n_src, n_ori, _ = kernel.shape
+    kernel = kernel.reshape(n_src * n_ori, -1)
+    power = np.zeros((n_src, len(bins)))
+    phases = np.zeros((n_src, n_ori, len(bins)), dtype=complex)
+    for first in range(0, len(coefs), batch_size):
+        batch = coefs[first : first + batch_size]
+        # (n_src * n_ori, n_ch) @ (n_ch, batch * n_bins)
+        sources = kernel @ batch.transpose(1, 0, 2).reshape(batch.shape[1], -1)
+        sources = sources.reshape(n_src, n_ori, len(batch), len(bins))
+        epoch_power = (np.abs(sources) ** 2).sum(axis=1)
+        power += epoch_power.sum(axis=1)
+        # Unit vectors over orientations; their mean length is the ITC (usual ITC for n_ori = 1)
+        norm = np.sqrt(epoch_power)[:, None]
+        phases += np.divide(sources, norm, out=np.zeros_like(sources), where=norm > 0).sum(axis=2)
+    power /= len(coefs)
+    itc = np.sqrt((np.abs(phases / len(coefs)) ** 2).sum(axis=1))
+    snr = power[:, targets["col"]] / power[:, noise_cols].mean(axis=-1)
+    return SourceSpectra(
+        targets=targets,
+        freqs=freqs[bins],
+        power=power,
+        itc=itc,
+        snr=snr,
+        template=template,
+    )
@@ -0,0 +1,164 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class BandStats:
+    """
+    Statistics of a spectrum over epochs and channels within a frequency band.
+
+    Attributes
+    ----------
+    freqs : np.ndarray
+        Frequencies of the band.
+    mean, std, sem : np.ndarray
+        Mean, standard deviation and standard error of the mean over all epochs and channels,
+        per frequency.
+    """
+
+    freqs: np.ndarray
+    mean: np.ndarray
+    std: np.ndarray
+    sem: np.ndarray
+
+
+class SpectrumSummary:
+    """
+    Lazily computed, cached summaries of an epochs x channels x frequencies PSD and SNR spectrum.
+
+    Summaries are computed the first time a band is asked for and only read that band of the
+    arrays, so the full arrays (which may be memory-mapped) are never reduced as a whole and
+    repeated plots of the same band cost nothing.
+
+    Parameters
+    ----------
+    psds : np.ndarray
+        (n_epochs, n_channels, n_freqs) power spectral densities.
+    snrs : np.ndarray
+        SNR spectra with the same shape, e.g. from `analysis.snr_spectrum`.
+    freqs : np.ndarray
+        (n_freqs,) frequencies.
+    """
+
+    def __init__(self, psds: np.ndarray, snrs: np.ndarray, freqs: np.ndarray):
+        if psds.shape != snrs.shape or psds.shape[-1] != len(freqs):
+            raise ValueError("PSD and SNR arrays must have the same shape, matching freqs.")
+        self.psds = psds
+        self.snrs = snrs
+        self.freqs = np.asarray(freqs)
+        self._cache = {}
+
+    @classmethod
+    def from_spectrum(cls, spectrum: Mapping[str, np.ndarray]) -> "SpectrumSummary":
+        """
+        Summarize a spectrum dictionary with `psds`, `snrs` and `freqs` entries.
+
+        Parameters
+        ----------
+        spectrum : Mapping[str, np.ndarray]
+            Spectrum as stored by `02_subject_sensor_snr.py` or `figures.load_spectrum`.
+
+        Returns
+        -------
+        SpectrumSummary
+            Summary of the spectrum.
+        """
+        return cls(spectrum["psds"], spectrum["snrs"], spectrum["freqs"])
+
+    def band(self, fmin: float | None = None, fmax: float | None = None) -> slice:
+        """
+        Frequency bins of a band, selected as `plot.plot_snr` always has.
+
+        Parameters
+        ----------
+        fmin, fmax : float | None, optional
+            Band limits, by default the lowest and highest frequency.
+
+        Returns
+        -------
+        slice
+            Bins from the first whose floor is at least `fmin` up to, but excluding, the last
+            whose ceiling is at most `fmax`.
+        """
+        fmin = self.freqs.min() if fmin is None else fmin
+        fmax = self.freqs.max() if fmax is None else fmax
+        start = np.flatnonzero(np.floor(self.freqs) >= fmin)[0]
+        stop = np.flatnonzero(np.ceil(self.freqs) <= fmax)[-1]
+        return slice(int(start), int(stop))
+
+    def _stats(self, name: str, band: slice) -> BandStats:
+        key = (name, band.start, band.stop)
+        if key not in self._cache:
+            data = np.asarray(getattr(self, name)[..., band])
+            if name == "psds":
+                data = 10 * np.log10(data)
+            n = data.shape[0] * data.shape[1]
+            std = data.std(axis=(0, 1))
+            self._cache[key] = BandStats(
+                freqs=self.freqs[band],
+                mean=data.mean(axis=(0, 1)),
+                std=std,
+                sem=std / np.sqrt(n),
+            )
+        return self._cache[key]
+
+    def psd_db(self, fmin: float | None = None, fmax: float | None = None) -> BandStats:
+        """
+        Statistics of the PSD in dB over epochs and channels within a band.
+
+        Parameters
+        ----------
+        fmin, fmax : float | None, optional
+            Band limits, see `band`.
+
+        Returns
+        -------
+        BandStats
+            Mean, standard deviation and SEM of 10 * log10(psds).
+        """
+        return self._stats("psds", self.band(fmin, fmax))
+
+    def snr(self, fmin: float | None = None, fmax: float | None = None) -> BandStats:
+        """
+        Statistics of the SNR over epochs and channels within a band.
+
+        Parameters
+        ----------
+        fmin, fmax : float | None, optional
+            Band limits, see `band`.
+
+        Returns
+        -------
+        BandStats
+            Mean, standard deviation and SEM of the SNR.
+        """
+        return self._stats("snrs", self.band(fmin, fmax))
+
+    def channel_snr(
+        self, fmin: float | None = None, fmax: float | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        SNR of every channel averaged over epochs within a band, as used for topographies.
+
+        Parameters
+        ----------
+        fmin, fmax : float | None, optional
+            Band limits. Unlike `band`, every bin within [fmin, fmax] is kept, by default all.
+
+        Returns
+        -------
+        freqs : np.ndarray
+            Frequencies of the band.
+        snrs : np.ndarray
+            (n_channels, n_band_freqs) epoch-averaged SNR.
+        """
+        fmin = self.freqs.min() if fmin is None else fmin
+        fmax = self.freqs.max() if fmax is None else fmax
+        inband = np.flatnonzero((self.freqs >= fmin) & (self.freqs <= fmax))
+        band = slice(int(inband[0]), int(inband[-1]) + 1)
+        key = ("channel_snr", band.start, band.stop)
+        if key not in self._cache:
+            self._cache[key] = np.asarray(self.snrs[..., band]).mean(axis=0)
+        return self.freqs[band], self._cache[key]
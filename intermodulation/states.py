@@ -7,6 +7,7 @@ import pandas as pd
 import psystate.events as pe
 import psystate.states as ps
 from byte_triggers._base import BaseTrigger
+from psychopy.colors import Color
 
 import intermodulation.stimuli as ims
 
@@ -59,8 +60,34 @@ class StartStopTriggerLogMixin:
         self.loggables = mergelog
 
 
+class ReportPixMixin:
+    """
+    Drive the reporting pixel from the visibility of (word1, word2), touching the psychopy stim
+    only when that visibility changes. Color objects are built once, so psychopy neither
+    reconverts the color nor rebuilds the shape on frames where nothing changed.
+    """
+
+    def attach_pixreport(self):
+        self._pix_colors = {
+            states: Color(value, "rgb") for states, value in REPORT_PIX_VALS.items()
+        }
+        self._pix_state = None
+        self.start_calls.append(self._reset_pixreport)
+        self.update_calls.append(self._set_pixreport)
+
+    def _reset_pixreport(self):
+        # The reporting pixel is re-created on every stimulus start, so its color is unknown
+        self._pix_state = None
+
+    def _update_pixreport(self, word_states: tuple[bool, bool]):
+        if word_states == self._pix_state:
+            return
+        self.stim.stim["reporting_pix"].fillColor = self._pix_colors[word_states]
+        self._pix_state = word_states
+
+
 @dataclass
-class TwoWordState(ps.FrameFlickerStimState, StartStopTriggerLogMixin):
+class TwoWordState(ps.FrameFlickerStimState, StartStopTriggerLogMixin, ReportPixMixin):
     stim: ims.TwoWordStim = field(kw_only=True)
     word_list: pd.DataFrame = field(kw_only=True)
 
@@ -77,7 +104,7 @@ class TwoWordState(ps.FrameFlickerStimState, StartStopTriggerLogMixin):
         self.frequencies["word1"] = words["w1_freq"]
         self.frequencies["word2"] = words["w2_freq"]
         if self.stim.reporting_pix:
-            self.update_calls.append(self._set_pixreport)
+            self.attach_pixreport()
 
     def update_words(self):
         if self.pair_idx == (len(self.word_list) - 1):
@@ -96,12 +123,11 @@ class TwoWordState(ps.FrameFlickerStimState, StartStopTriggerLogMixin):
         return
 
     def _set_pixreport(self, *args, **kwargs):
-        word_states = (self.stim.states["word1"], self.stim.states["word2"])
-        self.stim.stim["reporting_pix"].fillColor = REPORT_PIX_VALS[word_states]
+        self._update_pixreport((self.stim.states["word1"], self.stim.states["word2"]))
 
 
 @dataclass
-class TwoWordMiniblockState(ps.FrameFlickerStimState, StartStopTriggerLogMixin):
+class TwoWordMiniblockState(ps.FrameFlickerStimState, StartStopTriggerLogMixin, ReportPixMixin):
     stim: ims.TwoWordStim = field(kw_only=True)
     stim_dur: float = field(kw_only=True)
     word_list: pd.DataFrame = field(kw_only=True)
@@ -119,7 +145,7 @@ class TwoWordMiniblockState(ps.FrameFlickerStimState, StartStopTriggerLogMixin):
         self.update_calls.insert(1, self.check_word_update)
         self.end_calls.append(self._inc_miniblock)
         if self.stim.reporting_pix:
-            self.update_calls.append(self._set_pixreport)
+            self.attach_pixreport()
 
     def check_word_update(self):
         if self.frame_num % self.wordframes == 0 and self.frame_num > 0:
@@ -171,11 +197,12 @@ class TwoWordMiniblockState(ps.FrameFlickerStimState, StartStopTriggerLogMixin):
         self.condition = initial["condition"]
 
     def _set_pixreport(self, *args, **kwargs):
-        word_states = (
-            bool(self.stim.stim["word1"].opacity),
-            bool(self.stim.stim["word2"].opacity),
+        self._update_pixreport(
+            (
+                bool(self.stim.stim["word1"].opacity),
+                bool(self.stim.stim["word2"].opacity),
+            )
         )
-        self.stim.stim["reporting_pix"].fillColor = REPORT_PIX_VALS[word_states]
 
 
 @dataclass
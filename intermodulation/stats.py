@@ -0,0 +1,318 @@
+import os
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+from scipy.sparse.csgraph import connected_components
+
+from intermodulation.freqplan import response_terms, term_labels
+
+
+def target_bins(
+    freqs: np.ndarray,
+    tagfreqs: Sequence[float],
+    order: int = 2,
+    half_width: float = 0.1,
+) -> pd.DataFrame:
+    """
+    Frequency bins around the tags, their harmonics and intermodulation terms.
+
+    Parameters
+    ----------
+    freqs : np.ndarray
+        (n_freqs,) frequencies of the spectra.
+    tagfreqs : Sequence[float]
+        Tag frequencies f1 and f2.
+    order : int, optional
+        Largest order |m1| + |m2| of the terms, by default 2.
+    half_width : float, optional
+        Bins within this many Hz of a term are kept, by default 0.1. The nearest bin is always
+        kept.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per kept bin in increasing frequency, with the index `bin` into `freqs`, its
+        frequency `freq`, and the `term` label and absolute frequency `term_freq` of the
+        closest term. Terms outside `freqs` are dropped.
+    """
+    terms = response_terms(order)
+    # Difference terms such as f1-f2 respond at the absolute frequency
+    term_freqs = np.abs(terms @ np.asarray(tagfreqs, dtype=float))
+    labels = np.array(term_labels(terms))
+    inrange = (term_freqs > 0) & (term_freqs >= freqs.min()) & (term_freqs <= freqs.max())
+    term_freqs, labels = term_freqs[inrange], labels[inrange]
+    dist = np.abs(freqs[:, None] - term_freqs[None, :])
+    keep = (dist <= half_width).any(axis=1)
+    keep[dist.argmin(axis=0)] = True
+    bins = np.flatnonzero(keep)
+    closest = dist[bins].argmin(axis=1)
+    return pd.DataFrame(
+        dict(
+            bin=bins,
+            freq=freqs[bins],
+            term=labels[closest],
+            term_freq=term_freqs[closest],
+        )
+    )
+
+
+def feature_adjacency(ch_adjacency: sparse.spmatrix, bins: np.ndarray) -> sparse.csr_matrix:
+    """
+    Adjacency of channel x frequency-bin features.
+
+    Features are ordered channel-major, as in a flattened (n_channels, n_bins) array. Two
+    features are adjacent if they are at adjacent channels and the same bin, or at the same
+    channel and consecutive bins. Bins are only consecutive if their indices in the spectrum
+    differ by one, so clusters never jump between the bands of different terms.
+
+    Parameters
+    ----------
+    ch_adjacency : sparse.spmatrix
+        (n_channels, n_channels) channel adjacency, e.g. from `mne.channels.find_ch_adjacency`.
+    bins : np.ndarray
+        (n_bins,) indices of the bins into the spectrum, e.g. `target_bins(...)["bin"]`.
+
+    Returns
+    -------
+    sparse.csr_matrix
+        (n_channels * n_bins, n_channels * n_bins) feature adjacency.
+    """
+    bins = np.asarray(bins)
+    n_ch, n_bins = ch_adjacency.shape[0], len(bins)
+    chained = np.flatnonzero(np.diff(bins) == 1)
+    bin_adjacency = sparse.coo_matrix(
+        (np.ones(len(chained)), (chained, chained + 1)), shape=(n_bins, n_bins)
+    )
+    bin_adjacency = bin_adjacency + bin_adjacency.T
+    adjacency = sparse.kron(sparse.csr_matrix(ch_adjacency), sparse.eye(n_bins)) + sparse.kron(
+        sparse.eye(n_ch), bin_adjacency
+    )
+    return sparse.csr_matrix(adjacency)
+
+
+@dataclass
+class ClusterResult:
+    """
+    Result of a cluster-based permutation test.
+
+    Attributes
+    ----------
+    t_obs : np.ndarray
+        Observed t statistics, shaped like one observation.
+    clusters : list[np.ndarray]
+        Boolean mask of every observed cluster, shaped like `t_obs`.
+    cluster_stats : np.ndarray
+        Cluster mass (sum of t) of every cluster.
+    p_values : np.ndarray
+        Permutation p-value of every cluster.
+    h0 : np.ndarray
+        (n_permutations,) largest cluster mass of every permutation, the null distribution.
+    """
+
+    t_obs: np.ndarray
+    clusters: list[np.ndarray]
+    cluster_stats: np.ndarray
+    p_values: np.ndarray
+    h0: np.ndarray
+
+
+def _onesample_t(X: np.ndarray, sumsq: np.ndarray, signs: np.ndarray) -> np.ndarray:
+    # t statistics of every row of signs flipping X at once; the sum of squares is flip-invariant
+    n = X.shape[0]
+    mean = signs @ X / n
+    var = (sumsq - n * mean**2) / (n - 1)
+    return mean / np.sqrt(var / n)
+
+
+def _welch_t(
+    Z: np.ndarray, total: np.ndarray, sumsq: np.ndarray, members: np.ndarray, n1: int
+) -> np.ndarray:
+    # Welch t statistics of every row of group-1 membership at once, from sums over all of Z
+    n2 = Z.shape[0] - n1
+    sum1, sumsq1 = members @ Z, members @ Z**2
+    mean1, mean2 = sum1 / n1, (total - sum1) / n2
+    var1 = (sumsq1 - n1 * mean1**2) / (n1 - 1)
+    var2 = (sumsq - sumsq1 - n2 * mean2**2) / (n2 - 1)
+    return (mean1 - mean2) / np.sqrt(var1 / n1 + var2 / n2)
+
+
+def _clusters(
+    t: np.ndarray, adjacency: sparse.csr_matrix, threshold: float, sign: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Supra-threshold features of one sign, their cluster labels and every cluster's mass
+    idx = np.flatnonzero(sign * t > threshold)
+    if len(idx) == 0:
+        return idx, idx, np.empty(0)
+    _, labels = connected_components(adjacency[idx][:, idx], directed=False)
+    return idx, labels, np.bincount(labels, weights=t[idx])
+
+
+def _signs(tail: int) -> tuple[int, ...]:
+    return {0: (1, -1), 1: (1,), -1: (-1,)}[tail]
+
+
+def _max_mass(t: np.ndarray, adjacency: sparse.csr_matrix, threshold: float, tail: int) -> float:
+    masses = [np.abs(_clusters(t, adjacency, threshold, sign)[2]) for sign in _signs(tail)]
+    masses = np.concatenate(masses)
+    return masses.max() if len(masses) else 0.0
+
+
+_WORKER_STATE = {}
+
+
+def _init_worker(
+    X: np.ndarray,
+    n1: int | None,
+    adjacency: sparse.csr_matrix,
+    threshold: float,
+    tail: int,
+) -> None:
+    # Runs once per worker, so the data are only sent once rather than with every batch
+    _WORKER_STATE.update(
+        X=X,
+        n1=n1,
+        total=X.sum(axis=0),
+        sumsq=(X**2).sum(axis=0),
+        adjacency=adjacency,
+        threshold=threshold,
+        tail=tail,
+    )
+
+
+def _null_batch(seed: np.random.SeedSequence, n: int) -> np.ndarray:
+    state = _WORKER_STATE
+    X, n1 = state["X"], state["n1"]
+    rng = np.random.default_rng(seed)
+    if n1 is None:
+        signs = rng.choice([-1.0, 1.0], size=(n, X.shape[0]))
+        tstats = _onesample_t(X, state["sumsq"], signs)
+    else:
+        labels = np.zeros(X.shape[0])
+        labels[:n1] = 1.0
+        members = rng.permuted(np.tile(labels, (n, 1)), axis=1)
+        tstats = _welch_t(X, state["total"], state["sumsq"], members, n1)
+    return np.array(
+        [_max_mass(t, state["adjacency"], state["threshold"], state["tail"]) for t in tstats]
+    )
+
+
+def cluster_test(
+    X: np.ndarray,
+    adjacency: sparse.spmatrix,
+    Y: np.ndarray | None = None,
+    threshold: float | None = None,
+    tail: int = 0,
+    n_permutations: int = 10000,
+    seed: int = 0,
+    batch_size: int = 256,
+    n_jobs: int | None = 1,
+) -> ClusterResult:
+    """
+    Cluster-based permutation test of a contrast over adjacent features.
+
+    With only `X`, tests whether its mean is zero with one-sample t statistics and random sign
+    flips of the observations, e.g. for paired condition differences of every subject. With `Y`,
+    tests whether `X` and `Y` differ with Welch t statistics and random relabelling of the
+    observations, e.g. for the epochs of two conditions. Clusters are connected components of
+    adjacent features whose t exceeds the threshold, and their mass is the sum of their t.
+
+    The statistics of a whole batch of permutations come from a few matrix products. Batches
+    run in a process pool, each seeded with its own child of `np.random.SeedSequence(seed)`, so
+    the result only depends on `seed` and `batch_size`, not on `n_jobs`.
+
+    Parameters
+    ----------
+    X : np.ndarray
+        (n_observations, ...) data, e.g. (n_subjects, n_channels, n_bins) SNR differences.
+    adjacency : sparse.spmatrix
+        (n_features, n_features) adjacency of the flattened features of one observation, e.g.
+        from `feature_adjacency`.
+    Y : np.ndarray | None, optional
+        Second group of observations, shaped like `X` except for the first axis, by default
+        None (one-sample test of `X`).
+    threshold : float | None, optional
+        Cluster-forming threshold on |t|, by default the t quantile of p = 0.05 for `tail`.
+    tail : int, optional
+        0 for two-sided, 1 for positive and -1 for negative clusters only, by default 0.
+    n_permutations : int, optional
+        Number of random permutations, by default 10000.
+    seed : int, optional
+        Seed of the permutations, by default 0.
+    batch_size : int, optional
+        Permutations per batch, by default 256.
+    n_jobs : int | None, optional
+        Number of worker processes, by default 1 (run in the calling process). None uses one
+        per CPU.
+
+    Returns
+    -------
+    ClusterResult
+        Observed statistics, clusters sorted by decreasing |mass|, and their p-values.
+    """
+    if tail not in (-1, 0, 1):
+        raise ValueError("Tail must be -1, 0 or 1.")
+    shape = X.shape[1:]
+    X = X.reshape(len(X), -1).astype(float)
+    adjacency = sparse.csr_matrix(adjacency)
+    if adjacency.shape != (X.shape[1], X.shape[1]):
+        raise ValueError(
+            f"Adjacency of shape {adjacency.shape} does not match {X.shape[1]} features."
+        )
+    if Y is None:
+        n1, df = None, len(X) - 1
+        if len(X) < 2:
+            raise ValueError("A one-sample test needs at least two observations.")
+        t_obs = _onesample_t(X, (X**2).sum(axis=0), np.ones((1, len(X))))[0]
+    else:
+        if Y.shape[1:] != shape:
+            raise ValueError("X and Y must have the same shape apart from the first axis.")
+        n1, df = len(X), len(X) + len(Y) - 2
+        if min(len(X), len(Y)) < 2:
+            raise ValueError("A two-sample test needs at least two observations per group.")
+        X = np.concatenate([X, Y.reshape(len(Y), -1).astype(float)])
+        members = np.zeros((1, len(X)))
+        members[0, :n1] = 1.0
+        t_obs = _welch_t(X, X.sum(axis=0), (X**2).sum(axis=0), members, n1)[0]
+    if threshold is None:
+        threshold = stats.t.ppf(1 - 0.05 / (2 if tail == 0 else 1), df)
+
+    sizes = np.diff(np.r_[np.arange(0, n_permutations, batch_size), n_permutations])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    initargs = (X, n1, adjacency, threshold, tail)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = max(1, min(n_jobs, len(sizes)))
+    if n_jobs == 1:
+        _init_worker(*initargs)
+        h0 = [_null_batch(s, n) for s, n in zip(seeds, sizes)]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_init_worker, initargs=initargs
+        ) as pool:
+            h0 = list(pool.map(_null_batch, seeds, sizes))
+    h0 = np.concatenate(h0)
+
+    clusters, masses = [], []
+    for sign in _signs(tail):
+        idx, labels, signmasses = _clusters(t_obs, adjacency, threshold, sign)
+        for label, mass in enumerate(signmasses):
+            mask = np.zeros(t_obs.shape, dtype=bool)
+            mask[idx[labels == label]] = True
+            clusters.append(mask.reshape(shape))
+            masses.append(mass)
+    masses = np.asarray(masses)
+    order = np.argsort(-np.abs(masses))
+    p_values = (1 + (h0[None, :] >= np.abs(masses[order])[:, None]).sum(axis=1)) / (
+        1 + n_permutations
+    )
+    return ClusterResult(
+        t_obs=t_obs.reshape(shape),
+        clusters=[clusters[i] for i in order],
+        cluster_stats=masses[order],
+        p_values=p_values,
+        h0=h0,
+    )
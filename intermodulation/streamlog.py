@@ -0,0 +1,250 @@
+import io
+import json
+import os
+import struct
+from collections import defaultdict
+from numbers import Integral, Real
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import psystate.events as pe
+
+# File layout: an 8-byte file magic, followed by any number of frames. Each frame is a 4-byte
+# frame magic, the payload length as a little-endian uint64, and the payload itself, which is an
+# uncompressed `.npz` archive holding one batch of columnar records. A crash can at worst leave a
+# truncated final frame, which the reader drops.
+FILE_MAGIC = b"IMLOG001"
+FRAME_MAGIC = b"IMLF"
+_FRAME_HEAD = struct.Struct("<4sQ")
+
+
+def _encode_column(values: list) -> tuple[dict[str, np.ndarray], str]:
+    """Encode a list of python values (None for missing) as a typed array plus a validity mask."""
+    mask = np.array([v is not None for v in values], dtype=bool)
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, (bool, np.bool_)) for v in present):
+        kind, dtype, fill = "bool", bool, False
+    elif all(isinstance(v, Integral) and not isinstance(v, (bool, np.bool_)) for v in present):
+        kind, dtype, fill = "int", np.int64, 0
+    elif all(isinstance(v, Real) and not isinstance(v, (bool, np.bool_)) for v in present):
+        kind, dtype, fill = "float", np.float64, np.nan
+    else:
+        kind, dtype, fill = "str", np.str_, ""
+        values = [str(v) if v is not None else None for v in values]
+    data = np.array([v if v is not None else fill for v in values], dtype=dtype)
+    return {"data": data, "mask": mask}, kind
+
+
+def _decode_column(data: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    if mask.all():
+        return data
+    out = data.astype(object)
+    out[~mask] = None
+    return out
+
+
+class StreamingExperimentLog(pe.ExperimentLog):
+    """
+    `ExperimentLog` that streams finished records to an append-only columnar file.
+
+    Logging works exactly as for `psystate.events.ExperimentLog`. Calling `flush` writes every
+    buffered per-state and continuous record to disk as one frame and drops it from memory, so the
+    memory footprint is bounded by what is logged between two flushes (one trial when flushing on
+    every ITI). Since every flush is its own frame, a crash loses at most the records logged since
+    the last flush.
+
+    Parameters
+    ----------
+    clock : psychopy.core.Clock
+        Clock used for timely log items, as in `ExperimentLog`.
+    path : str | Path
+        File to append records to. Created if it does not exist.
+
+    Notes
+    -----
+    `flush` does a small amount of file I/O, so it should be called from a non-critical point
+    such as the start of the inter-trial interval, e.g. `iti.start_calls.append(logger.flush)`.
+    Use `read_log` to rebuild `statesdf`/`contdf` tables from the file.
+    """
+
+    def __init__(self, clock, path: str | Path):
+        super().__init__(clock)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        new = not self.path.exists() or self.path.stat().st_size == 0
+        self._file = open(self.path, "ab")
+        if new:
+            self._file.write(FILE_MAGIC)
+            self._file.flush()
+        self.n_frames = 0
+
+    def flush(self):
+        """
+        Write all buffered records to disk and release them from memory.
+        """
+        if self._file.closed:
+            raise ValueError("Cannot flush a closed log.")
+        if len(self.states) == 0 and len(self.continuous) == 0:
+            return
+        arrays = {}
+        columns = {}
+        if len(self.states) > 0:
+            state_nums = sorted(self.states.keys())
+            keys = list(dict.fromkeys(k for sn in state_nums for k in self.states[sn]))
+            columns["states"] = []
+            for i, key in enumerate(keys):
+                col, kind = _encode_column([self.states[sn].get(key) for sn in state_nums])
+                arrays[f"states.{i}.data"] = col["data"]
+                arrays[f"states.{i}.mask"] = col["mask"]
+                columns["states"].append({"name": key, "kind": kind})
+        if len(self.continuous) > 0:
+            state_number, key, value, tag = [], [], [], []
+            for sn, statelogs in self.continuous.items():
+                for k, values in statelogs.items():
+                    if k.endswith("_tag"):
+                        continue
+                    tags = statelogs[f"{k}_tag"]
+                    state_number.extend([sn] * len(values))
+                    key.extend([k] * len(values))
+                    value.extend(values)
+                    tag.extend(tags)
+            arrays["continuous.state_number"] = np.array(state_number, dtype=np.int64)
+            arrays["continuous.key"] = np.array(key, dtype=np.str_)
+            # Continuous values are stored as strings, matching `ExperimentLog.contdf`
+            arrays["continuous.value"] = np.array([str(v) for v in value], dtype=np.str_)
+            arrays["continuous.tag"] = np.array(
+                [np.nan if t is None else t for t in tag], dtype=np.float64
+            )
+        arrays["__header__"] = np.array(json.dumps({"columns": columns}))
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        payload = buffer.getvalue()
+        self._file.write(_FRAME_HEAD.pack(FRAME_MAGIC, len(payload)))
+        self._file.write(payload)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.n_frames += 1
+
+        self.states = defaultdict(dict)
+        self.continuous = defaultdict(lambda: defaultdict(list))
+
+    def close(self):
+        """
+        Flush any remaining records and close the file.
+        """
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def save(self, fn: str | Path | None = None):
+        """
+        Flush all records to the log file. If `fn` is given, additionally write the full tables to
+        a pickle in the same format as `ExperimentLog.save`.
+
+        Parameters
+        ----------
+        fn : str | Path | None, optional
+            Pickle file to write, by default None (only flush to the streamed log).
+        """
+        if not self._file.closed:
+            self.flush()
+        if fn is not None:
+            statesdf, contdf = read_log(self.path)
+            pd.to_pickle({"continuous": contdf, "states": statesdf}, fn)
+
+    @property
+    def statesdf(self):
+        """
+        Per-state table of everything logged so far, on disk and in memory.
+        """
+        if not self._file.closed:
+            self.flush()
+        return read_log(self.path)[0]
+
+    @property
+    def contdf(self):
+        """
+        Continuous table of everything logged so far, on disk and in memory.
+        """
+        if not self._file.closed:
+            self.flush()
+        return read_log(self.path)[1]
+
+
+def _iter_frames(path: str | Path):
+    with open(path, "rb") as f:
+        if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError(f"{path} is not a streamed experiment log.")
+        while True:
+            head = f.read(_FRAME_HEAD.size)
+            if len(head) < _FRAME_HEAD.size:
+                return
+            magic, length = _FRAME_HEAD.unpack(head)
+            if magic != FRAME_MAGIC:
+                raise ValueError(f"Corrupt frame header in {path} at byte {f.tell()}.")
+            payload = f.read(length)
+            if len(payload) < length:  # Truncated final frame from an interrupted write
+                return
+            yield payload
+
+
+def read_log(path: str | Path) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Rebuild the per-state and continuous tables from a streamed experiment log.
+
+    Parameters
+    ----------
+    path : str | Path
+        Log file written by `StreamingExperimentLog`.
+
+    Returns
+    -------
+    statesdf : pd.DataFrame
+        One row per state, indexed by state number, as `ExperimentLog.statesdf`.
+    contdf : pd.DataFrame
+        One row per continuous log value with `state_number`, `key`, `key_number`, `value` and
+        `tag` columns, as `ExperimentLog.contdf`.
+    """
+    state_frames = []
+    cont = defaultdict(list)
+    for payload in _iter_frames(path):
+        with np.load(io.BytesIO(payload), allow_pickle=False) as data:
+            header = json.loads(data["__header__"].item())
+            if "states" in header["columns"]:
+                state_frames.append(
+                    pd.DataFrame(
+                        {
+                            col["name"]: _decode_column(
+                                data[f"states.{i}.data"], data[f"states.{i}.mask"]
+                            )
+                            for i, col in enumerate(header["columns"]["states"])
+                        }
+                    )
+                )
+            if "continuous.key" in data:
+                for col in ("state_number", "key", "value", "tag"):
+                    cont[col].append(data[f"continuous.{col}"])
+
+    if len(state_frames) > 0:
+        statesdf = pd.concat(state_frames, ignore_index=True)
+        # A state whose records were split over several flushes is merged back into one row
+        statesdf = statesdf.groupby("state_number", sort=True, as_index=False).first()
+        statesdf = statesdf.convert_dtypes().set_index("state_number")
+    else:
+        statesdf = pd.DataFrame(index=pd.Index([], name="state_number"))
+
+    if len(cont) > 0:
+        contdf = pd.DataFrame({k: np.concatenate(v) for k, v in cont.items()})
+    else:
+        contdf = pd.DataFrame(
+            {
+                "state_number": np.empty(0, dtype=np.int64),
+                "key": np.empty(0, dtype=np.str_),
+                "value": np.empty(0, dtype=np.str_),
+                "tag": np.empty(0, dtype=np.float64),
+            }
+        )
+    contdf.insert(2, "key_number", contdf.groupby(["state_number", "key"]).cumcount())
+    return statesdf, contdf.convert_dtypes()
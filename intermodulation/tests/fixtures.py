@@ -39,7 +39,7 @@ def trigger():
 def worddf():
     import pandas as pd
 
-    df = pd.read_csv(Path(__file__).parents[3] / "two_word_stimuli_nina.csv")
+    df = pd.read_csv(Path(__file__).parents[2] / "two_word_stimuli_nina.csv")
     return df
 
 
@@ -47,7 +47,7 @@ def worddf():
 def oneworddf():
     import pandas as pd
 
-    df = pd.read_csv(Path(__file__).parents[3] / "one_word_stimuli.csv")
+    df = pd.read_csv(Path(__file__).parents[2] / "one_word_stimuli.csv")
     return df
 
 
@@ -0,0 +1,80 @@
+import mne
+import numpy as np
+import pytest
+
+import intermodulation.analysis as ima
+
+K, J = 4, 1  # noise bins on each side and bins skipped
+
+
+@pytest.fixture
+def psd():
+    rng = np.random.default_rng(0)
+    return rng.random((3, 5, 120)) + 0.1
+
+
+def _reference_floor(row, center, method, exclude=None):
+    # Noise floor of one bin from its explicitly listed neighbors
+    offsets = [o for o in range(-K - J, K + J + 1) if abs(o) > J]
+    noise = np.array(
+        [row[center + o] for o in offsets if exclude is None or not exclude[center + o]]
+    )
+    if method == "mean":
+        return noise.mean()
+    if method == "median":
+        return np.median(noise)
+    cut = int(np.floor(0.25 * len(noise)))
+    return np.sort(noise)[cut : len(noise) - cut].mean()
+
+
+def test_mean_matches_convolution(psd):
+    kernel = np.concatenate([np.ones(K), np.zeros(2 * J + 1), np.ones(K)]) / (2 * K)
+    noise = np.apply_along_axis(lambda p: np.convolve(p, kernel, mode="valid"), -1, psd)
+    snr = ima.snr_spectrum(psd, K, J)
+    np.testing.assert_allclose(snr[..., K + J : -K - J], psd[..., K + J : -K - J] / noise)
+    assert np.isnan(snr[..., : K + J]).all() and np.isnan(snr[..., -K - J :]).all()
+
+
+@pytest.mark.parametrize("method", ["mean", "median", "trimmed"])
+def test_robust_floors_and_exclusions(psd, method):
+    freqs = np.arange(psd.shape[-1]) * 0.5
+    exclude = ima.exclusion_mask(freqs, [20.0, 30.2], half_width=0.5)
+    np.testing.assert_array_equal(np.flatnonzero(exclude), [39, 40, 41, 60, 61])
+    snr = ima.snr_spectrum(psd, K, J, method=method, exclude=exclude, chunk_size=100)
+    for center in (10, 36, 43, 60):
+        expected = psd[1, 2, center] / _reference_floor(psd[1, 2], center, method, exclude)
+        np.testing.assert_allclose(snr[1, 2, center], expected)
+
+
+def test_median_ignores_line_spike(psd):
+    spiked = psd.copy()
+    spiked[..., 55] = 1e3
+    assert ima.snr_spectrum(spiked, K, J)[0, 0, 52] < 0.1
+    np.testing.assert_allclose(
+        ima.snr_spectrum(spiked, K, J, method="median")[0, 0, 52],
+        psd[0, 0, 52] / _reference_floor(spiked[0, 0], 52, "median"),
+    )
+    with pytest.raises(ValueError):
+        ima.snr_spectrum(psd, method="max")
+
+
+def test_epoch_window_spans_whole_epoch():
+    info = mne.create_info(["EEG000"], 100.0, "eeg")
+    epochs = mne.EpochsArray(np.zeros((2, 1, 301)), info, tmin=-1.0, verbose=False)
+    assert ima.epoch_window(epochs) == (0, 301)
+    assert ima.epoch_window(epochs, 0.0, 2.0) == (100, 200)
+    with pytest.raises(ValueError):
+        ima.epoch_window(epochs, 0.0, 2.5)
+
+
+def test_tagged_bins_share_columns():
+    freqs = np.arange(0, 30, 0.1)
+    targets, bins, noise_cols = ima.tagged_bins(freqs, [6.0, 7.0], order=2)
+    # Every target and noise bin is computed once, at its column of `bins`
+    assert len(np.unique(bins)) == len(bins)
+    np.testing.assert_array_equal(bins[targets["col"]], targets["bin"])
+    np.testing.assert_array_equal(bins[noise_cols], targets["bin"].to_numpy()[:, None] + [-2, 2])
+    f1 = targets.index[targets["term"] == "f1"][0]
+    assert np.isclose(freqs[bins[targets.loc[f1, "col"]]], 6.0)
+    info = mne.create_info(["EEG000", "STI101"], 100.0, ["eeg", "stim"])
+    assert ima.data_channels(info) == ["EEG000"]
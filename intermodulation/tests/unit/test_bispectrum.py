@@ -0,0 +1,53 @@
+import mne
+import numpy as np
+
+import intermodulation.bispectrum as imbis
+
+SFREQ = 200.0
+DUR = 8.5  # s, whole cycles of both tags
+TAGS = [6.0, 120 / 17]
+
+
+def test_coupling_triplets_sum_to_terms():
+    freqs = np.fft.rfftfreq(int(SFREQ * DUR), 1.0 / SFREQ)
+    triplets, offsets = imbis.coupling_triplets(freqs, TAGS, 2, 1)
+    assert list(triplets["term"]) == ["f1-f2", "2f1", "f1+f2", "2f2"]
+    np.testing.assert_array_equal(triplets["bin_a"] + triplets["bin_b"], triplets["bin_c"])
+    np.testing.assert_allclose(freqs[triplets["bin_c"]], [TAGS[1], 12.0, sum(TAGS), 240 / 17])
+    diff = triplets.iloc[0]
+    np.testing.assert_allclose(freqs[[diff["bin_a"], diff["bin_b"]]], [TAGS[1] - 6.0, 6.0])
+    np.testing.assert_array_equal(offsets, [-3, -2, 2, 3])
+
+
+def test_bicoherence_separates_coupled_from_uncoupled_im():
+    rng = np.random.default_rng(0)
+    n_epochs, n_times = 40, int(SFREQ * DUR)
+    times = np.arange(n_times) / SFREQ
+    phi = rng.uniform(0, 2 * np.pi, (2, n_epochs, 1))
+    tags = np.cos(2 * np.pi * TAGS[0] * times + phi[0])
+    tags = tags + np.cos(2 * np.pi * TAGS[1] * times + phi[1])
+    # Channel 0 squares the tags, so f1+f2 and 2f1 are phase-locked to them; channel 1 has the
+    # same IM power at a random phase
+    coupled = tags + 0.3 * tags**2
+    free = np.cos(2 * np.pi * sum(TAGS) * times + rng.uniform(0, 2 * np.pi, (n_epochs, 1)))
+    uncoupled = tags + 0.3 * free
+    data = np.stack([coupled, uncoupled], axis=1)
+    data = data + 0.5 * rng.standard_normal(data.shape)
+    info = mne.create_info(["EEG000", "EEG001"], SFREQ, "eeg")
+    epochs = mne.EpochsArray(data, info, tmin=0.0, verbose=False)
+
+    result = imbis.epoch_bicoherence(epochs, TAGS)
+    fsum = result.triplets.index[result.triplets["term"] == "f1+f2"][0]
+    assert result.bicoherence[0, fsum] > 0.8
+    assert result.bicoherence[1, fsum] < 0.3
+    assert result.ratio[0, fsum] > 10
+    assert result.noise.shape == (2, len(result.triplets), 2)
+
+    # Same as the bispectrum of the full FFT at that triplet
+    coefs = np.fft.rfft(data, axis=-1) / n_times
+    a, b, c = result.triplets.loc[fsum, ["bin_a", "bin_b", "bin_c"]]
+    pair = coefs[..., a] * coefs[..., b]
+    expected = np.abs((pair * coefs[..., c].conj()).mean(axis=0)) ** 2 / (
+        (np.abs(pair) ** 2).mean(axis=0) * (np.abs(coefs[..., c]) ** 2).mean(axis=0)
+    )
+    np.testing.assert_allclose(result.bicoherence[:, fsum], expected, rtol=1e-10)
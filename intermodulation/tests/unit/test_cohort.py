@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+import intermodulation.cohort as imc
+import intermodulation.utils as imu
+from intermodulation.freqtag_spec import WORDSPATH
+from intermodulation.schedule import ScheduleConstraints
+from intermodulation.tests.fixtures import TESTING_SEED
+
+freqs = [6.0, 7.05882353]
+miniblock_len = 10
+
+
+def test_cohort_specs_stable():
+    specs = imc.cohort_specs(6, TESTING_SEED)
+    assert [s.group for s in specs] == ["even", "odd"] * 3
+    assert len({s.seed for s in specs}) == 6
+    # Adding subjects never changes the seeds of the ones already planned
+    assert imc.cohort_specs(10, TESTING_SEED)[:6] == specs
+
+
+def test_plan_cohort_matches_sessions(tmp_path):
+    constraints = ScheduleConstraints(max_condition_run=2)
+    manifest_path = tmp_path / "manifest.csv"
+    imc.plan_cohort(
+        4,
+        TESTING_SEED,
+        WORDSPATH,
+        miniblock_len,
+        freqs,
+        constraints,
+        cache_dir=tmp_path / "cache",
+        manifest_path=manifest_path,
+        n_jobs=2,
+    )
+    manifest = imc.read_manifest(manifest_path)
+    assert manifest.index.get_level_values("subject").nunique() == 4
+    for spec in imc.cohort_specs(4, TESTING_SEED):
+        # The checkbox in the manifest selects the planned group as miniblock_task.py reads it
+        even_group = manifest.xs(spec.subject, level="subject")["even_group"].iloc[0]
+        assert ("even" if even_group == 0 else "odd") == spec.group
+        # What the session computes from the dialog seed must match the manifest
+        rng = np.random.default_rng(spec.seed)
+        expected = imu.load_prep_words(
+            WORDSPATH / f"{spec.group}_one_word_stimuli.csv",
+            WORDSPATH / f"{spec.group}_two_word_stimuli.csv",
+            rng,
+            miniblock_len,
+            freqs,
+            constraints,
+        )
+        for exp, got in zip(expected, imc.subject_plan(manifest, spec.subject)):
+            pd.testing.assert_frame_equal(exp, got, check_dtype=False)
+    assert len(list((tmp_path / "cache").glob("prepwords_*.npz"))) == 4
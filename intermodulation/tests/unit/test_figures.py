@@ -0,0 +1,54 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import mne  # noqa: E402
+import numpy as np  # noqa: E402
+
+import intermodulation.figures as imfig  # noqa: E402
+from intermodulation.simulate import simulation_info  # noqa: E402
+
+
+def test_render_figures_from_memmaps(tmp_path):
+    info = simulation_info(1000.0)
+    info = mne.pick_info(info, mne.pick_types(info, meg=True))
+    rng = np.random.default_rng(0)
+    freqs = np.linspace(0.5, 20, 200)
+    spectra = {
+        f"oneword/allcond/{tag}": dict(
+            psds=rng.random((3, info["nchan"], len(freqs))) + 0.1,
+            freqs=freqs,
+            snrs=rng.random((3, info["nchan"], len(freqs))),
+        )
+        for tag in ("F1", "F2")
+    }
+    imfig.save_spectra(spectra, tmp_path / "spectra")
+    loaded = imfig.load_spectrum(tmp_path / "spectra", "oneword/allcond/F1")
+    assert isinstance(loaded["psds"], np.memmap)
+    np.testing.assert_array_equal(loaded["snrs"], spectra["oneword/allcond/F1"]["snrs"])
+
+    jobs = [
+        imfig.FigureJob(
+            tmp_path / "figs" / "snr.pdf",
+            "snr",
+            list(spectra),
+            ["F1", "F2"],
+            [6.0, 7.0],
+            suptitle="SNR",
+            kwargs=dict(fmin=1, fmax=15),
+        ),
+        *[
+            imfig.FigureJob(
+                tmp_path / "figs" / f"topo_{i}.pdf",
+                "snr_topo",
+                [key],
+                [key],
+                [[6.0, 7.0]],
+                kwargs=dict(fmin=1, fmax=15, fig_kwargs=dict(figsize=(4, 4), dpi=50)),
+            )
+            for i, key in enumerate(spectra)
+        ],
+    ]
+    paths = imfig.render_figures(jobs, tmp_path / "spectra", info=info, n_jobs=2)
+    assert paths == [job.path for job in jobs]
+    assert all(path.stat().st_size > 0 for path in paths)
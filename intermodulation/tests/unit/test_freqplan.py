@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import intermodulation.freqplan as imfp
+
+
+def test_renderable_frequencies():
+    freqs, frames = imfp.renderable_frequencies(240, fmin=5.0, fmax=30.0)
+    assert (frames % 2 == 0).all()
+    np.testing.assert_allclose(freqs * frames, 240)
+    assert np.isclose(freqs, 6.0).any() and np.isclose(freqs, 240 / 34).any()
+    assert freqs.min() >= 5.0 and freqs.max() <= 30.0
+
+
+def test_response_terms():
+    terms = imfp.response_terms(2)
+    assert imfp.term_labels(terms) == ["f2", "2f2", "f1-f2", "f1", "f1+f2", "2f1"]
+
+
+def test_plan_tag_pairs():
+    plan = imfp.plan_tag_pairs(240, epoch_dur=10.0, order=2, fmin=10.0, fmax=20.0, tol=0.05)
+    assert (plan["f1"] < plan["f2"]).all()
+    pairs = plan.set_index([plan["f1_frames"], plan["f2_frames"]])
+    # 10 and 20 Hz: f2 and 2f1 coincide, and so do f1 and |f1 - f2|
+    assert pairs.loc[(24, 12), "collisions"] == 4
+    # 10 and 15 Hz: terms at 5, 10, 15, 20, 25 and 30 Hz, the closest 20 Hz below 50 Hz mains
+    assert pairs.loc[(24, 16), "collisions"] == 0
+    assert pairs.loc[(24, 16), "line_distance"] == 20.0
+    assert pairs.loc[(24, 16), "off_bin"] == 0
+    # 240 / 22 Hz does not fall on a 0.1 Hz bin
+    assert pairs.loc[(24, 22), "off_bin"] > 0
+    assert plan["collisions"].is_monotonic_increasing
+
+
+def test_solve_word_durations():
+    solutions = imfp.solve_word_durations(240, [6.0, 240 / 34], 10, (1.0, 6.0))
+    np.testing.assert_array_equal(solutions["word_frames"], [680, 1360])
+    assert solutions.loc[0, ["cycles_f1", "cycles_f2"]].tolist() == [17, 20]
+    np.testing.assert_allclose(solutions["bin_width"], 1 / (10 * solutions["word_dur"]))
+    assert imfp.solve_word_durations(240, [6.0, 240 / 34], 10, (1.0, 2.0)).empty
+    with pytest.raises(ValueError):
+        imfp.solve_word_durations(240, [6.0, 16.0], 10, (1.0, 6.0))  # 15 frames per cycle
+
+
+def test_exact_sfreq():
+    word = 680 / 240
+    for max_sfreq in (600.0, 1000.0, 2000.0):
+        sfreq = imfp.exact_sfreq(word, [6.0, 120 / 17], max_sfreq)
+        assert max_sfreq - 1 / word < sfreq <= max_sfreq
+        assert imfp.exact_windows(sfreq, [6.0, 120 / 17], word)[0] == round(word * sfreq)
+    with pytest.raises(ValueError):
+        imfp.exact_sfreq(2.0, [6.0, 120 / 17], 1000.0)
+
+
+def test_check_frame_timing():
+    imfp.check_frame_timing(240, 680 / 240, [6.0, 7.05882353])
+    with pytest.raises(ValueError, match="frames"):
+        imfp.check_frame_timing(240, 2.1001, [6.0])
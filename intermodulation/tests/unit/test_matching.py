@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+import intermodulation.matching as immt
+import intermodulation.ngrams as imng
+
+
+def test_match_items_recovers_permutation():
+    rng = np.random.default_rng(0)
+    left = pd.DataFrame(rng.normal(size=(40, 3)), columns=["x", "y", "z"])
+    perm = rng.permutation(40)
+    right = (left.iloc[perm] + rng.normal(scale=1e-3, size=(40, 3))).set_index(
+        pd.Index(np.arange(40) + 100)
+    )
+    weights = {"x": 1.0, "y": 1.0, "z": 1.0}
+    matched = immt.match_items(left, right, weights)
+    # Right row i + 100 is a noisy copy of left row perm[i]
+    assert dict(zip(matched["left"], matched["right"])) == {p: i + 100 for i, p in enumerate(perm)}
+    assert matched["cost"].is_monotonic_increasing
+    assert len(immt.match_items(left, right, weights, n=5)) == 5
+    stats = immt.balance_stats(left.loc[matched["left"]], right.loc[matched["right"]], paired=True)
+    assert (stats["smd"].abs() < 0.01).all()
+
+
+def test_split_phrase_lists(tmp_path):
+    nouns = ["car", "dog", "cat", "house", "tree", "road", "lamp", "bird"]
+    adjs = ["red", "big", "old", "new"]
+    unigrams = pd.DataFrame(
+        {
+            "ngram": [f"{w}_NOUN" for w in nouns] + [f"{w}_ADJ" for w in adjs],
+            "freq": np.arange(len(nouns) + len(adjs)) * 10 + 5,
+        }
+    )
+    pairs = pd.DataFrame([(a, n) for a in adjs for n in nouns], columns=["w1", "w2"])
+    bigrams = pd.DataFrame(
+        {"ngram": pairs["w1"] + " " + pairs["w2"], "freq": np.arange(len(pairs)) + 1}
+    )
+    unigrams.to_csv(tmp_path / "1grams.csv", index=False)
+    bigrams.to_csv(tmp_path / "2grams.csv", index=False)
+    index = imng.NgramIndex(
+        imng.build_ngram_index(tmp_path / "1grams.csv", tmp_path / "2grams.csv", tmp_path / "ix")
+    )
+
+    even, odd, stats = immt.split_phrase_lists(pairs, index, 10, np.random.default_rng(1))
+    for group, subtype in ((even, "even"), (odd, "odd")):
+        assert len(group) == 20
+        assert (group["subtype"] == subtype).all()
+        assert group["condition"].value_counts().to_dict() == {"phrase": 10, "non-phrase": 10}
+    # Each group's non-phrases are the other group's phrases with the words swapped
+    for group, other in ((even, odd), (odd, even)):
+        nonphrase = group[group["condition"] == "non-phrase"]
+        phrase = other[other["condition"] == "phrase"]
+        np.testing.assert_array_equal(nonphrase[["w1", "w2"]], phrase[["w2", "w1"]])
+    assert set(even.index[even["condition"] == "phrase"]) == {"b"}
+    shown = pd.concat([even[even["condition"] == "phrase"], odd[odd["condition"] == "phrase"]])
+    assert not shown.duplicated(["w1", "w2"]).any()
+    assert list(stats.index) == list(immt.FEATURE_WEIGHTS)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import intermodulation.ngrams as imng
+
+
+@pytest.fixture
+def ngram_files(tmp_path):
+    unigrams = pd.DataFrame(
+        {
+            "ngram": ["the_DET", "red_ADJ", "car_NOUN", "red_NOUN", "car_NOUN", "über_ADJ"],
+            "freq": [100, 20, 30, 5, 2, 7],
+        }
+    )
+    bigrams = pd.DataFrame(
+        {
+            "ngram": ["the car", "red car", "the red", "the car", "über car"],
+            "freq": [50, 10, 8, 1, 3],
+        }
+    )
+    unigrams.to_csv(tmp_path / "1grams.csv", index=False)
+    bigrams.to_csv(tmp_path / "2grams.csv", index=False)
+    return tmp_path / "1grams.csv", tmp_path / "2grams.csv"
+
+
+@pytest.mark.parametrize("chunksize, bucket_rows", [(1_000, 1_000), (2, 2)])
+def test_ngram_index_lookups(ngram_files, tmp_path, chunksize, bucket_rows):
+    path = imng.build_ngram_index(
+        *ngram_files, tmp_path / "index", chunksize=chunksize, bucket_rows=bucket_rows
+    )
+    index = imng.NgramIndex(path)
+    assert index.total_unigram == 164
+    assert index.total_bigram == 72
+    # Duplicate n-grams are merged by summing their frequencies
+    assert index.pos_freq("car", "NOUN") == 32
+    assert index.bigram_freq("the", "car") == 51
+    assert index.word_freq("red") == 25
+    assert index.word_freq("über") == 7
+    np.testing.assert_array_equal(index.word_freq(["red", "missing"]), [25, 0])
+    np.testing.assert_array_equal(
+        index.bigram_freq(["red", "car", "the"], ["car", "red", "red"]), [10, 0, 8]
+    )
+    np.testing.assert_array_equal(index.pos_freq(["red", "red"], ["ADJ", "VERB"]), [20, 0])
+    assert index.word_pos("red").to_dict() == {"ADJ": 20, "NOUN": 5}
+    assert index.words(index.word_ids("über")) == "über"
+    nouns = index.pos_table("NOUN").set_index("word")["freq"]
+    assert nouns.to_dict() == {"car": 32, "red": 5}
@@ -0,0 +1,53 @@
+import numpy as np
+
+import intermodulation.nonwords as imnw
+
+
+def test_encode_roundtrip_and_order():
+    words = ["b", "ab", "abc", "abd", "zz"]
+    codes = imnw.encode_strings(words)
+    np.testing.assert_array_equal(imnw.decode_strings(codes), words)
+    keys = imnw.pack_keys(codes)
+    np.testing.assert_array_equal(np.argsort(keys), np.argsort(words))
+
+
+def test_lexicon_lookups():
+    lexicon = imnw.Lexicon(["Street", "the", "kjv", "strengths", "st"])
+    codes = imnw.encode_strings(["street", "str", "strength", "stx", "kjv", "th", "xyz"])
+    np.testing.assert_array_equal(
+        lexicon.is_word(codes), [True, False, False, False, True, False, False]
+    )
+    np.testing.assert_array_equal(
+        lexicon.is_prefix(codes), [True, True, True, False, True, True, False]
+    )
+
+
+def test_screen_candidates():
+    lexicon = imnw.Lexicon(["street", "kjv", "the"], [10, 1, 1000])
+    codes = imnw.enumerate_candidates(["st", "xk"], "bjkvw", lengths=(3, 4))
+    assert len(codes) == 2 * 5 + 2 * 5**2
+    strings = imnw.decode_strings(codes)
+    keep = imnw.screen_candidates(codes, lexicon, max_bigram_pct=None)
+    rejected = set(strings[~keep])
+    assert {"xkjv", "xkkb", "xkbk"} <= rejected  # Embedded word and repeated letters
+    assert not any(s.startswith("st") and len(set(s)) == len(s) for s in rejected)
+    # "th" and "he" are the only bigrams of a very frequent word
+    bits = lexicon.bigram_bitset(0.4)
+    suspicious = imnw.decode_strings(
+        np.array([[a, b] for a in range(1, 27) for b in range(1, 27) if bits[a] >> b & 1])
+    )
+    assert sorted(suspicious) == ["he", "th"]
+
+
+def test_generate_nonwords_per_onset():
+    lexicon = imnw.Lexicon(["street", "skill"])
+    out = imnw.generate_nonwords(
+        lexicon,
+        ["st", "sk"],
+        lengths=(4,),
+        n_per_onset=3,
+        rng=np.random.default_rng(0),
+        max_bigram_pct=None,  # Every bigram of a two-word lexicon is common
+    )
+    assert out.groupby("onset").size().to_dict() == {"sk": 3, "st": 3}
+    assert (out["non_word"].str.len() == 4).all()
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+import intermodulation.phrases as imph
+from intermodulation.freqtag_spec import WORDSPATH
+
+ngrampath = WORDSPATH / "word_ngrams"
+
+
+def test_phrase_candidates_match_design_tables():
+    candidates = imph.build_phrase_candidates(
+        ngrampath / "1grams_english_1b_with_pos.csv",
+        ngrampath / "2grams_english_1a_no_pos.csv",
+        chunksize=25_000,  # Several chunks, to exercise the streaming merge
+    )
+    expected = pd.read_csv(ngrampath / "phrases_candidates.csv", keep_default_na=False)
+    # The design notebook sorted with an unstable sort, so rows of equal frequency may be swapped
+    key = ["freq", "word1", "word2"]
+    got = candidates.sort_values(key).reset_index(drop=True)
+    expected = expected.sort_values(key).reset_index(drop=True)
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+    np.testing.assert_array_equal(np.diff(candidates["freq"].to_numpy()) <= 0, True)
+
+    final = imph.final_phrase_candidates(candidates)
+    expected_final = pd.read_csv(ngrampath / "phrases_final_candidates.csv")
+    key = ["ngram_rank", "w1", "w2"]
+    pd.testing.assert_frame_equal(
+        final.sort_values(key).reset_index(drop=True),
+        expected_final.sort_values(key).reset_index(drop=True),
+        check_dtype=False,
+    )
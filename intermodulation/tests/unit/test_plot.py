@@ -0,0 +1,68 @@
+import re
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+import mne  # noqa: E402
+import numpy as np  # noqa: E402
+
+import intermodulation.plot as imp  # noqa: E402
+from intermodulation.simulate import simulation_info  # noqa: E402
+
+
+def test_topo_lines_matches_iter_topography():
+    info = simulation_info(1000.0)
+    info = mne.pick_info(info, mne.pick_types(info, meg=True))
+    freqs = np.linspace(0, 60, 601)
+    data = np.random.default_rng(0).random((info["nchan"], len(freqs)))
+    mask = np.zeros(info["nchan"], dtype=bool)
+    mask[::2] = True
+
+    fig = imp.topo_lines(
+        data,
+        freqs,
+        info,
+        (1.0, 15.0),
+        (0.0, 1.0),
+        vlines=[6.0, 7.0, 99.0],
+        ch_mask=mask,
+        fig_kwargs={"figsize": (4, 4), "dpi": 50},
+    )
+    (ax,) = fig.axes
+    traces, vlines = ax.collections
+    segments = traces.get_segments()
+    assert len(segments) == mask.sum()
+    # Cropped to 1-15 Hz and drawn inside the channel's box from iter_topography
+    assert len(segments[0]) == np.count_nonzero((freqs >= 1.0) & (freqs <= 15.0))
+    ref = plt.figure()
+    boxes = {idx: ax.get_position().bounds for ax, idx in mne.viz.iter_topography(info, fig=ref)}
+    first = np.flatnonzero(mask)[0]
+    x, y, w, h = boxes[first]
+    np.testing.assert_allclose(segments[0][[0, -1], 0], [x, x + w])
+    assert (segments[0][:, 1] >= y).all() and (segments[0][:, 1] <= y + h).all()
+    assert len(vlines.get_segments()) == 2 * mask.sum()  # 99 Hz is out of range
+    plt.close("all")
+
+
+def test_itc_singlefreq_pdf(tmp_path):
+    info = simulation_info(1000.0)
+    info = mne.pick_info(info, mne.pick_types(info, meg=True))
+    times = np.linspace(0, 2, 50)
+    freqs = np.array([6.0, 7.0, 13.0])
+    data = np.random.default_rng(0).random((info["nchan"], len(freqs), len(times)))
+
+    fig = imp.itc_singlefreq_topo(info, data, times, freqs, 6.9, picks=info["ch_names"][:10])
+    (ax,) = fig.axes
+    segments = ax.collections[0].get_segments()
+    assert len(segments) == 10
+    assert fig._suptitle.get_text() == "ITC at 7.00 Hz"
+    # The layout is found once per channel setup
+    assert imp._topo_boxes(info) is imp._topo_boxes(info.copy())
+
+    path = imp.itc_singlefreq_pdf(
+        tmp_path / "itc.pdf", info, data, times, freqs, fig_kwargs={"figsize": (4, 4)}
+    )
+    assert len(re.findall(rb"/Type /Page\b", path.read_bytes())) == len(freqs)
+    plt.close("all")
@@ -0,0 +1,59 @@
+import base64
+import json
+import re
+import zlib
+
+import mne
+import numpy as np
+import pytest
+
+import intermodulation.report as imrep
+from intermodulation.simulate import simulation_info
+
+
+def test_downsample_keeps_peaks():
+    freqs = np.linspace(0, 50, 5001)
+    data = np.ones((2, len(freqs)))
+    data[:, 600] = 10.0
+    dsfreqs, dsdata = imrep.downsample_spectrum(freqs, data, 1.0, 40.0, max_points=500)
+    assert len(dsfreqs) <= 500
+    assert dsdata.max() == 10.0
+    assert abs(dsfreqs[dsdata[0].argmax()] - 6.0) < 0.05
+
+
+def test_quantize_roundtrip():
+    data = np.array([[0.0, 1.0, np.nan, 3.0], [2.0, 2.0, 2.0, 2.0]])
+    codes, lo, hi = imrep.quantize(data)
+    assert codes.dtype == np.uint8
+    assert codes[0, 2] == imrep.NAN_CODE
+    values = lo[:, None] + codes / 254 * (hi - lo)[:, None]
+    np.testing.assert_allclose(values[0, [0, 1, 3]], [0.0, 1.0, 3.0], atol=3 / 254)
+    np.testing.assert_array_equal(values[1], 2.0)
+
+
+def test_write_spectrum_report(tmp_path):
+    info = simulation_info(1000.0)
+    info = mne.pick_info(info, mne.pick_types(info, meg=True))
+    rng = np.random.default_rng(0)
+    freqs = np.linspace(0.5, 60, 2000)
+    snrs = rng.random((3, info["nchan"], len(freqs)))
+    spectra = {
+        cond: dict(psds=snrs + 0.1, snrs=snrs, freqs=freqs) for cond in ("WORD", "NONWORD")
+    }
+
+    path = imrep.write_spectrum_report(
+        tmp_path / "report.html", spectra, info, [6.0, 7.06], fmin=1, fmax=30, max_points=300
+    )
+    page = path.read_text()
+    meta = json.loads(re.search(r'id="meta" type="application/json">(.*?)</script>', page).group(1))
+    assert [cond["name"] for cond in meta["conditions"]] == ["WORD", "NONWORD"]
+    assert len(meta["channels"]) == info["nchan"]
+    cond = meta["conditions"][0]
+    assert np.shape(cond["overview"]) == (2, info["nchan"])
+    chunk = re.search(r'id="chunk-0" type="application/octet-stream">(.*?)</script>', page)
+    codes = np.frombuffer(zlib.decompress(base64.b64decode(chunk.group(1))), dtype=np.uint8)
+    assert codes.size == info["nchan"] * len(cond["freqs"]) <= info["nchan"] * 300
+
+    bad = {"x": dict(psds=snrs[:, :5] + 0.1, snrs=snrs[:, :5], freqs=freqs)}
+    with pytest.raises(ValueError):
+        imrep.write_spectrum_report(tmp_path / "bad.html", bad, info, [6.0])
@@ -0,0 +1,89 @@
+import mne
+import numpy as np
+import pytest
+
+import intermodulation.ress as imress
+
+SFREQ = 200.0
+DUR = 8.5  # s, whole cycles of both tags
+TAGS = [6.0, 120 / 17]
+
+
+@pytest.fixture(scope="module")
+def epochs():
+    # One tagged source under correlated 1/f noise from many more sources
+    rng = np.random.default_rng(0)
+    n_epochs, n_ch, n_times = 12, 16, int(SFREQ * DUR)
+    times = np.arange(n_times) / SFREQ
+    pattern = rng.standard_normal(n_ch)
+    source = np.sin(2 * np.pi * TAGS[0] * times) + 0.5 * np.sin(2 * np.pi * TAGS[1] * times)
+    noise = np.cumsum(rng.standard_normal((n_epochs, 40, n_times)), axis=-1) * 0.05
+    noise = noise - noise.mean(axis=-1, keepdims=True)
+    noise += rng.standard_normal((n_epochs, 40, n_times))
+    data = rng.standard_normal((n_ch, 40)) @ noise + 0.3 * pattern[:, None] * source
+    info = mne.create_info([f"EEG{i:03d}" for i in range(n_ch)], SFREQ, "eeg")
+    return mne.EpochsArray(data, info, tmin=0.0, verbose=False), pattern
+
+
+def test_covariance_matches_time_domain_filter(epochs):
+    epochs, _ = epochs
+    covs = imress.ress_covariances(epochs, TAGS, peak_fwhm=0.5)
+    data = epochs.get_data()
+    freqs = np.fft.rfftfreq(data.shape[-1], 1.0 / SFREQ)
+    f1 = covs.targets.index[covs.targets["term"] == "f1"][0]
+    gain = imress.gaussian_gain(freqs, TAGS[0], 0.5)
+    filtered = np.fft.irfft(np.fft.rfft(data, axis=-1) * gain, n=data.shape[-1], axis=-1)
+    expected = filtered @ filtered.transpose(0, 2, 1) / data.shape[-1]
+    np.testing.assert_allclose(covs.signal[:, f1], expected, rtol=1e-6, atol=1e-12)
+
+
+def test_ress_recovers_tagged_source(epochs):
+    epochs, pattern = epochs
+    covs = imress.ress_covariances(epochs, TAGS)
+    ress = imress.fit_ress(covs)
+    f1 = covs.targets.index[covs.targets["term"] == "f1"][0]
+    corr = np.corrcoef(ress.patterns[f1], pattern)[0, 1]
+    assert abs(corr) > 0.95
+
+    freqs, power, snr = ress.spectrum(epochs)
+    fbin = np.argmin(np.abs(freqs - TAGS[0]))
+    channel_snr = imress.snr_spectrum(
+        (np.abs(np.fft.rfft(epochs.get_data(), axis=-1)) ** 2).mean(axis=0)
+    )
+    assert snr[f1, fbin] > channel_snr[:, fbin].max()
+    np.testing.assert_allclose(
+        ress.target_power(covs)[f1, covs.targets.loc[f1, "col"]],
+        power[f1, fbin],
+        rtol=1e-8,
+    )
+    assert ress.topographies(epochs.info).data.shape == (len(pattern), len(covs.targets))
+
+    scores = imress.cross_validate_ress(covs, n_splits=3)
+    assert len(scores) == 3 * len(covs.targets)
+    held_out = scores[scores["term"] == "f1"]
+    assert (held_out["snr"] > 3).all()
+    assert (held_out["itc"] > 0.9).all()
+    with pytest.raises(ValueError):
+        imress.cross_validate_ress(covs, n_splits=len(epochs) + 1)
+
+
+def test_other_tag_is_not_noise():
+    # Overlapping but distinct topographies of the two tags, as for left and right words
+    rng = np.random.default_rng(0)
+    n_epochs, n_ch, n_times = 12, 16, int(SFREQ * DUR)
+    times = np.arange(n_times) / SFREQ
+    pattern1 = rng.standard_normal(n_ch)
+    pattern2 = 0.9 * pattern1 + 0.45 * rng.standard_normal(n_ch)
+    noise = rng.standard_normal((n_ch, n_ch)) @ rng.standard_normal((n_epochs, n_ch, n_times))
+    f1_response = 0.5 * pattern1[:, None] * np.sin(2 * np.pi * TAGS[0] * times)
+    f2_response = 2.0 * pattern2[:, None] * np.sin(2 * np.pi * TAGS[1] * times)
+    info = mne.create_info([f"EEG{i:03d}" for i in range(n_ch)], SFREQ, "eeg")
+    filters = []
+    for data in (noise + f1_response, noise + f1_response + f2_response):
+        covs = imress.ress_covariances(mne.EpochsArray(data, info, verbose=False), TAGS)
+        ress = imress.fit_ress(covs)
+        f1 = covs.targets.index[covs.targets["term"] == "f1"][0]
+        assert abs(np.corrcoef(ress.patterns[f1], pattern1)[0, 1]) > 0.99
+        filters.append(ress.filters[f1])
+    # f2 is kept out of the reference at f1, so its response does not change f1's filter
+    assert abs(np.corrcoef(filters)[0, 1]) > 1 - 1e-6
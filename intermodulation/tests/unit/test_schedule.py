@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import intermodulation.schedule as imsch
+from intermodulation.tests.fixtures import TESTING_SEED, worddf  # noqa: F401
+
+miniblock_len = 10
+freqs = [6.0, 7.5]
+
+
+@pytest.mark.parametrize(
+    "constraints",
+    [
+        imsch.ScheduleConstraints(),
+        imsch.ScheduleConstraints(max_condition_run=1, tag_block_len=6),
+    ],
+)
+def test_generate_schedule_valid(worddf, constraints):  # noqa: F811
+    rng = np.random.default_rng(TESTING_SEED)
+    schedule = imsch.generate_schedule(worddf, miniblock_len, freqs, rng, constraints)
+    assert len(schedule) == len(worddf)
+    assert sorted(schedule.index) == sorted(worddf.index)
+    assert (schedule.groupby("miniblock").size() == miniblock_len).all()
+    assert imsch.schedule_violations(schedule, constraints, freqs) == []
+
+
+def test_generate_schedule_reproducible(worddf):  # noqa: F811
+    constraints = imsch.ScheduleConstraints(max_condition_run=2, tag_block_len=4)
+    first = imsch.generate_schedule(
+        worddf, miniblock_len, freqs, np.random.default_rng(TESTING_SEED), constraints
+    )
+    second = imsch.generate_schedule(
+        worddf, miniblock_len, freqs, np.random.default_rng(TESTING_SEED), constraints
+    )
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_schedule_violations_detects_repeats(worddf):  # noqa: F811
+    constraints = imsch.ScheduleConstraints(max_condition_run=1)
+    rng = np.random.default_rng(TESTING_SEED)
+    schedule = imsch.generate_schedule(worddf, miniblock_len, freqs, rng, constraints)
+    # Present the miniblocks grouped by condition and repeat a word within the first miniblock
+    bad = schedule.sort_values(["condition", "miniblock"], kind="stable")
+    bad["miniblock"] = np.arange(len(bad)) // miniblock_len
+    bad.iloc[1, bad.columns.get_loc("w1")] = bad.iloc[0]["w1"]
+    violations = imsch.schedule_violations(bad, constraints, freqs)
+    assert any("within a miniblock" in v for v in violations)
+    assert any("condition runs" in v for v in violations)
+
+
+def test_schedule_constraints_validation():
+    with pytest.raises(ValueError):
+        imsch.ScheduleConstraints(min_word_distance=0)
+    with pytest.raises(ValueError):
+        imsch.ScheduleConstraints(max_condition_run=0)
@@ -0,0 +1,59 @@
+import mne
+import numpy as np
+
+import intermodulation.simulate as imsim
+from intermodulation.analysis import miniblock_events
+from intermodulation.freqtag_spec import TRIGGERS
+
+
+def test_simulate_raw_events_and_responses():
+    n_miniblocks = 10
+    raw, design = imsim.simulate_raw(
+        n_miniblocks,
+        sfreq=200.0,
+        rng=np.random.default_rng(0),
+        amplitudes={"f1": 2.0, "f2": 2.0, "f1+f2": 1.0},
+        line_amplitude=0.0,
+    )
+    assert len(design) == n_miniblocks
+    assert design["onset"].is_monotonic_increasing
+    # Every condition appears once in the first round
+    assert design[["task", "condition", "tag"]].drop_duplicates().shape[0] == n_miniblocks
+
+    stim = raw.get_data(picks=imsim.STIM_CHANNEL)[0]
+    first = design.iloc[0]
+    code = TRIGGERS[first.task][first.condition][first.tag]
+    assert (stim == code).sum() == imsim.MINIBLOCK_LEN
+    descriptions = set(raw.annotations.description)
+    assert f"{first.task}_{first.condition}_{first.tag}" in descriptions
+
+    miniblock_events(raw)
+    events, event_id = mne.events_from_annotations(raw, verbose=False)
+    keep = {k: v for k, v in event_id.items() if k.startswith("MINIBLOCK/")}
+    assert np.isin(events[:, 2], list(keep.values())).sum() == n_miniblocks
+
+    # Two-word miniblocks respond at f1, f2 and f1 + f2 but not at the absent f2 - f1
+    minidur = imsim.MINIBLOCK_LEN * imsim.WORD_DUR
+    twoword = {k: v for k, v in keep.items() if "TWOWORD" in k}
+    epochs = mne.Epochs(
+        raw, events, twoword, 0.0, minidur, picks="mag", baseline=None, verbose=False
+    )
+    spectrum = epochs.compute_psd(
+        method="welch",
+        n_fft=int(200 * minidur),
+        n_overlap=0,
+        fmin=0.5,
+        fmax=40.0,
+        window="boxcar",
+        verbose=False,
+    )
+    psd, freqs = spectrum.get_data(return_freqs=True)
+    power = psd.mean(axis=0).max(axis=0)
+    f1, f2 = imsim.FREQUENCIES
+
+    def peak(f):
+        i = np.argmin(np.abs(freqs - f))
+        return power[i] / np.median(power[i - 10 : i + 10])
+
+    assert peak(f1) > 10 and peak(f2) > 10 and peak(f1 + f2) > 10
+    assert peak(f2 - f1) < 10
@@ -0,0 +1,64 @@
+import mne
+import numpy as np
+import pytest
+
+import intermodulation.source as imsrc
+
+SFREQ = 200.0
+DUR = 2.0  # s, 0.5 Hz bins
+
+
+@pytest.fixture(scope="module")
+def inverse():
+    # EEG on a sphere with a coarse volume source grid, the smallest model that needs no MRI
+    montage = mne.channels.make_standard_montage("easycap-M1")
+    info = mne.create_info(montage.ch_names[:60], SFREQ, "eeg")
+    info.set_montage(montage)
+    sphere = mne.make_sphere_model("auto", "auto", info, verbose=False)
+    src = mne.setup_volume_source_space(sphere=sphere, pos=20.0, verbose=False)
+    fwd = mne.make_forward_solution(info, None, src, sphere, verbose=False)
+    raw = mne.io.RawArray(np.zeros((len(info["ch_names"]), 1)), info, verbose=False)
+    info = raw.set_eeg_reference(projection=True, verbose=False).info
+    cov = mne.make_ad_hoc_cov(info, verbose=False)
+    inv = mne.minimum_norm.make_inverse_operator(
+        info, fwd, cov, loose=1.0, depth=None, verbose=False
+    )
+    return info, fwd, inv
+
+
+def test_source_spectra_matches_time_domain_inverse(inverse):
+    info, fwd, inv = inverse
+    rng = np.random.default_rng(0)
+    times = np.arange(int(SFREQ * DUR)) / SFREQ
+    # A 6 Hz source with the same phase in every epoch, in noise
+    source = 10
+    gain = fwd["sol"]["data"][:, 3 * source + 2]
+    data = 2e-8 * gain[None, :, None] * np.sin(2 * np.pi * 6.0 * times)
+    data = data + 1e-6 * rng.standard_normal((12, len(info["ch_names"]), len(times)))
+    epochs = mne.EpochsArray(data, info, tmin=0.0, verbose=False)
+
+    result = imsrc.source_spectra(epochs, inv, [6.0, 7.5], pick_ori="vector")
+    assert list(result.targets["term"]) == ["f1-f2", "f1", "f2", "2f1", "f1+f2", "2f2"]
+    np.testing.assert_allclose(result.freqs[result.targets["col"]], result.targets["term_freq"])
+
+    stcs = mne.minimum_norm.apply_inverse_epochs(
+        epochs, inv, 1.0 / 9.0, "dSPM", pick_ori="vector", verbose=False
+    )
+    coefs = np.fft.rfft(np.stack([stc.data for stc in stcs]), axis=-1) / len(times)
+    bins = np.round(result.freqs * DUR).astype(int)
+    power = (np.abs(coefs[..., bins]) ** 2).sum(axis=2).mean(axis=0)
+    np.testing.assert_allclose(result.power, power, rtol=1e-8)
+
+    f1 = result.targets.index[result.targets["term"] == "f1"][0]
+    assert result.snr[:, f1].max() > 10 * np.median(result.snr[:, f1])
+    peak = result.snr[:, f1].argmax()
+    assert result.itc[peak, result.targets.loc[f1, "col"]] > 0.9
+    stc = result.stc("itc")
+    assert isinstance(stc, mne.VolSourceEstimate)
+    assert stc.data.shape == (len(result.power), len(result.targets))
+
+
+def test_free_orientation_needs_pick_ori(inverse):
+    info, _, inv = inverse
+    with pytest.raises(ValueError):
+        imsrc.inverse_kernel(inv, info, pick_ori=None)
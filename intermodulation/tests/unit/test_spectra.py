@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from intermodulation.spectra import SpectrumSummary
+
+
+@pytest.fixture
+def spectrum():
+    rng = np.random.default_rng(0)
+    freqs = np.linspace(0.5, 40, 80)
+    return dict(
+        psds=rng.random((4, 3, len(freqs))) + 0.1,
+        snrs=rng.random((4, 3, len(freqs))),
+        freqs=freqs,
+    )
+
+
+def test_band_stats_match_full_reduction(spectrum):
+    summary = SpectrumSummary.from_spectrum(spectrum)
+    freqs = spectrum["freqs"]
+    band = range(
+        np.flatnonzero(np.floor(freqs) >= 2)[0], np.flatnonzero(np.ceil(freqs) <= 20)[-1]
+    )
+    psd = summary.psd_db(2, 20)
+    logpsd = 10 * np.log10(spectrum["psds"])
+    np.testing.assert_array_equal(psd.freqs, freqs[band])
+    np.testing.assert_allclose(psd.mean, logpsd.mean(axis=(0, 1))[band])
+    np.testing.assert_allclose(psd.std, logpsd.std(axis=(0, 1))[band])
+    snr = summary.snr(2, 20)
+    np.testing.assert_allclose(snr.mean, spectrum["snrs"].mean(axis=(0, 1))[band])
+    np.testing.assert_allclose(snr.sem, snr.std / np.sqrt(12))
+    # Cached per band
+    assert summary.snr(2, 20) is snr
+    assert summary.snr(2, 30) is not snr
+
+    chfreqs, chsnr = summary.channel_snr(5, 10)
+    inband = (freqs >= 5) & (freqs <= 10)
+    np.testing.assert_array_equal(chfreqs, freqs[inband])
+    np.testing.assert_allclose(chsnr, spectrum["snrs"].mean(axis=0)[:, inband])
+
+
+def test_shape_mismatch_raises(spectrum):
+    with pytest.raises(ValueError):
+        SpectrumSummary(spectrum["psds"], spectrum["snrs"][..., :-1], spectrum["freqs"])
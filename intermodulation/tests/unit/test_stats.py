@@ -0,0 +1,48 @@
+import numpy as np
+from scipy import sparse
+
+import intermodulation.stats as imst
+
+
+def _chain(n):
+    # Channels on a line, each adjacent to its neighbours
+    return sparse.diags([np.ones(n - 1), np.ones(n - 1)], [-1, 1])
+
+
+def test_target_bins():
+    freqs = np.arange(0.5, 30, 0.05)
+    bins = imst.target_bins(freqs, [6.0, 7.5], order=2, half_width=0.1)
+    assert set(bins["term"]) == {"f2", "2f2", "f1-f2", "f1", "f1+f2", "2f1"}
+    assert np.all(np.abs(bins["freq"] - bins["term_freq"]) <= 0.1 + 1e-9)
+    assert np.isclose(bins.loc[bins["term"] == "f1-f2", "term_freq"], 1.5).all()
+    assert (np.diff(bins["bin"]) > 0).all()
+
+
+def test_feature_adjacency_breaks_between_bands():
+    adjacency = imst.feature_adjacency(_chain(3), np.array([4, 5, 9])).toarray()
+    # Channel-major features: (ch0, b4), (ch0, b5), (ch0, b9), (ch1, b4), ...
+    assert adjacency[0, 1] and adjacency[0, 3]
+    assert not adjacency[1, 2]
+    assert not adjacency[0, 4]
+
+
+def test_cluster_test_finds_effect_deterministically():
+    rng = np.random.default_rng(0)
+    n_ch, n_bins = 12, 6
+    adjacency = imst.feature_adjacency(_chain(n_ch), np.arange(n_bins))
+    X = rng.standard_normal((15, n_ch, n_bins))
+    X[:, 3:6, 1:3] += 1.5
+
+    result = imst.cluster_test(X, adjacency, n_permutations=300, seed=1, batch_size=64)
+    assert result.t_obs.shape == (n_ch, n_bins)
+    assert result.clusters[0][3:6, 1:3].all()
+    assert result.p_values[0] < 0.01
+    assert len(result.h0) == 300
+    parallel = imst.cluster_test(X, adjacency, n_permutations=300, seed=1, batch_size=64, n_jobs=2)
+    np.testing.assert_array_equal(result.h0, parallel.h0)
+
+    # Two groups with the same effect, relabelled instead of sign-flipped
+    Y = rng.standard_normal((15, n_ch, n_bins))
+    twosample = imst.cluster_test(X, adjacency, Y=Y, n_permutations=300, seed=1)
+    assert twosample.clusters[0][3:6, 1:3].all()
+    assert twosample.p_values[0] < 0.01
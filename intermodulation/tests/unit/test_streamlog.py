@@ -0,0 +1,48 @@
+import pandas as pd
+import psystate.events as pe
+
+from intermodulation.streamlog import StreamingExperimentLog, read_log
+
+
+class FixedClock:
+    def getTime(self):
+        return 0.0
+
+
+def fill_log(logger, flush_at=()):
+    for sn in range(6):
+        logger.log(sn, "state", "words" if sn % 2 else "iti", unique=True)
+        logger.log(sn, "state_start", 0.5 * sn, unique=True)
+        logger.log(sn, "trial_end", sn % 3 == 0, unique=True)
+        if sn == 4:
+            logger.log(sn, "test_word", "cat", unique=True)
+        for frame in range(3):
+            logger.log(sn, "word1.opacity", float(frame % 2), unique=False, tag=frame)
+        if sn in flush_at:
+            logger.flush()
+
+
+def test_streamed_tables_match_in_memory_log(tmp_path):
+    reference = pe.ExperimentLog(FixedClock())
+    fill_log(reference)
+    streamed = StreamingExperimentLog(FixedClock(), tmp_path / "test.imlog")
+    fill_log(streamed, flush_at=(1, 3))
+    # Flushed records must have left memory
+    assert set(streamed.states.keys()) == {4, 5}
+    streamed.close()
+
+    statesdf, contdf = read_log(tmp_path / "test.imlog")
+    pd.testing.assert_frame_equal(statesdf, reference.statesdf)
+    assert len(contdf) == 6 * 3
+    assert (contdf.groupby(["state_number", "key"])["key_number"].max() == 2).all()
+
+
+def test_truncated_frame_is_dropped(tmp_path):
+    path = tmp_path / "test.imlog"
+    streamed = StreamingExperimentLog(FixedClock(), path)
+    fill_log(streamed, flush_at=(1, 3))
+    streamed.close()
+    data = path.read_bytes()
+    path.write_bytes(data[:-16])  # Simulate a crash while writing the last frame
+    statesdf, _ = read_log(path)
+    assert list(statesdf.index) == [0, 1, 2, 3]
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import intermodulation.textmetrics as imtm
+
+
+@pytest.fixture
+def metrics():
+    return imtm.FontMetrics.from_config({"font": "DejaVu Sans Mono", "bold": True})
+
+
+def test_word_widths_monospace(metrics):
+    widths = metrics.word_widths(["abc", "ab", "", "über"])
+    np.testing.assert_allclose(widths, np.array([3, 2, 0, 4]) * widths[1] / 2)
+
+
+def test_cached_extents_and_layout(metrics, tmp_path):
+    twowords = pd.DataFrame({"w1": ["the", "big"], "w2": ["house", "cat"]})
+    words = pd.concat([twowords["w1"], twowords["w2"]])
+    extents = imtm.cached_word_extents(words, metrics, tmp_path)
+    assert len(list(tmp_path.glob("extents-*.npz"))) == 1
+    pd.testing.assert_frame_equal(extents, imtm.cached_word_extents(words, metrics, tmp_path))
+    pd.testing.assert_frame_equal(extents, imtm.word_extents(words, metrics))
+
+    layout = imtm.select_text_layout(twowords, extents, max_sep=5.0, word_sep=0.3, fudge=0.5)
+    em = metrics.word_widths(["a"])[0]
+    # The widest pair has 8 letters
+    assert layout.height == pytest.approx(np.floor(4.2 / (8 * em) * 100) / 100)
+    assert layout.max_extent <= 5.0
+    assert layout.word_sep == pytest.approx(4.5 - 8 * em * layout.height)
+    with pytest.raises(ValueError):
+        imtm.select_text_layout(twowords, extents, max_sep=1.0)
@@ -0,0 +1,65 @@
+import mne
+import numpy as np
+import pytest
+
+import intermodulation.timeresolved as imtr
+
+SFREQ = 600.0
+TAGS = [6.0, 120 / 17]
+
+
+def _epochs(rng, n_epochs=8, dur=17.0, sfreq=SFREQ):
+    # A phase-locked 6 Hz response that only starts halfway through every epoch
+    times = np.arange(int(dur * sfreq)) / sfreq
+    info = mne.create_info(["MEG0111", "MEG0121", "MEG0131"], sfreq, "mag")
+    data = rng.standard_normal((n_epochs, 3, len(times)))
+    data[:, 0] += 2.0 * np.sin(2 * np.pi * TAGS[0] * times) * (times >= dur / 2)
+    return mne.EpochsArray(data, info, tmin=0.0, verbose=False)
+
+
+def test_sliding_spectra_tracks_onset():
+    rng = np.random.default_rng(0)
+    epochs = _epochs(rng)
+    result = imtr.sliding_spectra(epochs, TAGS, step=1.0)
+    # One word of the experiment is the shortest window with whole cycles of both tags
+    assert np.isclose(result.window_dur, 680 / 240)
+    n_windows = len(result.times)
+    assert result.snr.shape == (n_windows, 3, len(result.targets))
+    assert result.itc.shape == result.snr.shape
+    f1 = result.targets.index[result.targets["term"] == "f1"][0]
+    assert np.isclose(result.freqs[result.targets.loc[f1, "col"]], TAGS[0])
+
+    early = result.times + result.window_dur / 2 <= 8.5
+    late = result.times - result.window_dur / 2 >= 8.5
+    assert result.snr[late, 0, f1].min() > 10 * result.snr[early, 0, f1].max()
+    assert result.itc[late, 0, f1].min() > 0.9
+    assert result.snr[late, 1, f1].max() < 10
+
+    # Same power as the FFT of one window
+    n_window = int(round(result.window_dur * SFREQ))
+    start = int(round((result.times[3] - result.window_dur / 2) * SFREQ))
+    coefs = np.fft.rfft(epochs.get_data()[..., start : start + n_window], axis=-1) / n_window
+    bins = np.round(result.freqs * result.window_dur).astype(int)
+    np.testing.assert_allclose(
+        result.power[3], (np.abs(coefs[..., bins]) ** 2).mean(axis=0), rtol=1e-8
+    )
+
+
+def test_resampling_reaches_one_word_windows():
+    epochs = _epochs(np.random.default_rng(0), n_epochs=4, sfreq=1000.0)
+    word = 680 / 240
+    # The shortest exact window at 1 kHz is three words
+    assert np.isclose(imtr.sliding_spectra(epochs, TAGS, step=1.0).window_dur, 3 * word)
+    result = imtr.sliding_spectra(epochs, TAGS, window_dur=word, step=1.0, sfreq="window")
+    assert np.isclose(result.window_dur, word)
+    f1 = result.targets.index[result.targets["term"] == "f1"][0]
+    late = result.times - result.window_dur / 2 >= 8.5
+    assert result.itc[late, 0, f1].min() > 0.9
+    with pytest.raises(ValueError):
+        imtr.sliding_spectra(epochs, TAGS, sfreq="window")
+
+
+def test_window_must_fit():
+    epochs = _epochs(np.random.default_rng(0), n_epochs=2, dur=2.0)
+    with pytest.raises(ValueError):
+        imtr.sliding_spectra(epochs, TAGS)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import intermodulation.utils as imu
+from intermodulation.tests.fixtures import TESTING_SEED, worddf  # noqa: F401
+
+miniblock_len = 10
+
+
+def test_split_miniblocks_single_condition_blocks(worddf):  # noqa: F811
+    rng = np.random.default_rng(TESTING_SEED)
+    outdf = imu.split_miniblocks(worddf, miniblock_len, rng)
+    assert len(outdf) == len(worddf)
+    assert (outdf.groupby("miniblock")["condition"].nunique() == 1).all()
+    assert (outdf.groupby("miniblock").size() == miniblock_len).all()
+
+
+def test_split_miniblocks_dup_extra(worddf):  # noqa: F811
+    rng = np.random.default_rng(TESTING_SEED)
+    df = worddf.iloc[:-3]  # Last condition is now 3 stimuli short of a full miniblock
+    with pytest.raises(ValueError):
+        imu.split_miniblocks(df, miniblock_len, rng)
+    outdf = imu.split_miniblocks(df, miniblock_len, rng, dup_extra=True)
+    assert len(outdf) == len(worddf)
+    assert (outdf.groupby("condition").size() % miniblock_len == 0).all()
+    assert (outdf.groupby("miniblock")["condition"].nunique() == 1).all()
+
+
+@pytest.mark.parametrize("freqs", [[6.0, 7.5], [6.0, 7.5, 10.0, 12.0]])
+def test_assign_miniblock_freqs_balanced(worddf, freqs):  # noqa: F811
+    rng = np.random.default_rng(TESTING_SEED)
+    df = pd.concat([worddf] * 4, ignore_index=True)
+    outdf = imu.assign_miniblock_freqs(imu.split_miniblocks(df, miniblock_len, rng), freqs, rng)
+    grouped = outdf.groupby("miniblock")
+    # Every miniblock uses a single frequency arrangement
+    assert (grouped[["w1_freq", "w2_freq"]].nunique() == 1).all().all()
+    blocks = grouped[["condition", "w1_freq", "w2_freq"]].first()
+    idx = np.searchsorted(freqs, blocks["w1_freq"])
+    np.testing.assert_array_equal(blocks["w2_freq"], np.asarray(freqs)[(idx + 1) % len(freqs)])
+    counts = pd.crosstab(blocks["condition"], blocks["w1_freq"])
+    assert counts.shape[1] == len(freqs)
+    assert (counts.max(axis=1) - counts.min(axis=1) <= 1).all()
+
+
+def test_prep_miniblocks_reproducible(worddf):  # noqa: F811
+    freqs = [6.0, 7.5]
+    first = imu.prep_miniblocks("twoword", np.random.default_rng(TESTING_SEED), worddf, 10, freqs)
+    second = imu.prep_miniblocks("twoword", np.random.default_rng(TESTING_SEED), worddf, 10, freqs)
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_seeded_miniblocks_match_earlier_versions(worddf):  # noqa: F811
+    # Values produced by the loop-based implementation, so subjects can be regenerated from seeds
+    rng = np.random.default_rng(TESTING_SEED)
+    outdf = imu.assign_miniblock_freqs(
+        imu.split_miniblocks(worddf, miniblock_len, rng), [6.0, 7.5], rng
+    )
+    assert outdf.index[[0, 10, 100]].tolist() == [60, 70, 160]
+    np.testing.assert_array_equal(
+        outdf.groupby("miniblock")["w1_freq"].first().head(12),
+        [7.5, 6.0, 7.5, 7.5, 6.0, 6.0, 6.0, 7.5, 6.0, 6.0, 7.5, 7.5],
+    )
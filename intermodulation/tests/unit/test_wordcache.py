@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import intermodulation.utils as imu
+import intermodulation.wordcache as imwc
+from intermodulation.freqtag_spec import WORDSPATH
+from intermodulation.tests.fixtures import TESTING_SEED
+
+path_1w = WORDSPATH / "even_one_word_stimuli.csv"
+path_2w = WORDSPATH / "even_two_word_stimuli.csv"
+freqs = [6.0, 7.05882353]
+miniblock_len = 10
+
+
+def test_cache_roundtrip_matches_uncached(tmp_path):
+    rng = np.random.default_rng(TESTING_SEED)
+    expected = imu.load_prep_words(path_1w, path_2w, rng, miniblock_len, freqs)
+    expected_draw = rng.random()
+
+    for _ in range(2):  # First call fills the cache, second call reads it
+        rng = np.random.default_rng(TESTING_SEED)
+        cached = imwc.cached_prep_words(path_1w, path_2w, rng, miniblock_len, freqs, tmp_path)
+        for exp, got in zip(expected, cached):
+            pd.testing.assert_frame_equal(exp, got)
+        # Later draws in the session must not depend on whether the cache was hit
+        assert rng.random() == expected_draw
+    assert len(list(tmp_path.glob("prepwords_*.npz"))) == 1
+
+
+def test_cache_key_depends_on_inputs():
+    rng = np.random.default_rng(TESTING_SEED)
+    key = imwc.prep_cache_key(path_1w, path_2w, rng, miniblock_len, freqs)
+    assert key == imwc.prep_cache_key(path_1w, path_2w, rng, miniblock_len, freqs)
+    other_seed = np.random.default_rng(TESTING_SEED + 1)
+    assert key != imwc.prep_cache_key(path_1w, path_2w, other_seed, miniblock_len, freqs)
+    assert key != imwc.prep_cache_key(path_1w, path_2w, rng, miniblock_len, freqs[::-1])
+    assert key != imwc.prep_cache_key(path_1w, path_2w, rng, 12, freqs)
+
+
+def test_load_subject_words(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        imwc.load_subject_words(tmp_path, path_1w, path_2w, TESTING_SEED, miniblock_len, freqs)
+    rng = np.random.default_rng(TESTING_SEED)
+    expected = imwc.cached_prep_words(path_1w, path_2w, rng, miniblock_len, freqs, tmp_path)
+    loaded = imwc.load_subject_words(
+        tmp_path, path_1w, path_2w, TESTING_SEED, miniblock_len, freqs
+    )
+    for exp, got in zip(expected, loaded):
+        pd.testing.assert_frame_equal(exp, got)
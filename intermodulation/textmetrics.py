@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+import matplotlib.font_manager as fm
+import numpy as np
+import pandas as pd
+from fontTools.ttLib import TTFont
+
+from intermodulation.freqtag_spec import FOVEAL_ANGLE, TEXT_CONFIG, WORD_SEP
+from intermodulation.wordcache import file_digest
+
+METRICS_VERSION = 1
+# PsychoPy's text extent runs from roughly the middle of the first letter to the middle of the
+# last one, so measured extents are padded by this much (degrees) before comparing to the limit.
+FUDGE_FACTOR = 0.5
+HEIGHTS = np.round(np.arange(0.3, 1.5001, 0.01), 2)
+
+
+def find_font_file(font: str, bold: bool = False) -> Path:
+    """
+    Locate the font file for a font family name without opening a window.
+
+    Parameters
+    ----------
+    font : str
+        Font family name, as in `TEXT_CONFIG["font"]`.
+    bold : bool, optional
+        Whether to look for the bold face, by default False.
+
+    Returns
+    -------
+    Path
+        Path to the font file.
+    """
+    props = fm.FontProperties(family=font, weight="bold" if bold else "normal")
+    try:
+        return Path(fm.findfont(props, fallback_to_default=False))
+    except ValueError as e:
+        raise ValueError(f"Font {font!r} is not installed.") from e
+
+
+@dataclass(frozen=True)
+class FontMetrics:
+    """
+    Horizontal glyph metrics of a font.
+
+    Attributes
+    ----------
+    path : Path
+        Font file the metrics were read from.
+    advances : np.ndarray
+        Advance width of every code point up to the largest mapped one, in em. Unmapped code
+        points get the advance of the font's missing-glyph symbol.
+    """
+
+    path: Path
+    advances: np.ndarray
+
+    @classmethod
+    def from_file(cls, path: str | Path) -> "FontMetrics":
+        """
+        Read the advance widths of every mapped character from a TrueType or OpenType file.
+
+        Parameters
+        ----------
+        path : str | Path
+            Font file.
+
+        Returns
+        -------
+        FontMetrics
+            Metrics of the font.
+        """
+        with TTFont(path, lazy=True) as ttf:
+            per_em = ttf["head"].unitsPerEm
+            hmtx = ttf["hmtx"]
+            cmap = ttf.getBestCmap()
+            missing = hmtx[ttf.getGlyphOrder()[0]][0]
+            advances = np.full(max(cmap) + 1, missing / per_em)
+            for code, glyph in cmap.items():
+                advances[code] = hmtx[glyph][0] / per_em
+        return cls(path=Path(path), advances=advances)
+
+    @classmethod
+    def from_config(cls, text_config: Mapping = TEXT_CONFIG) -> "FontMetrics":
+        """
+        Read the metrics of the font of a PsychoPy text configuration.
+
+        Parameters
+        ----------
+        text_config : Mapping, optional
+            Text configuration with `font` and optionally `bold` keys, by default `TEXT_CONFIG`.
+
+        Returns
+        -------
+        FontMetrics
+            Metrics of the configured font face.
+        """
+        return cls.from_file(find_font_file(text_config["font"], text_config.get("bold", False)))
+
+    def word_widths(self, words: Sequence[str]) -> np.ndarray:
+        """
+        Width of each word in em, i.e. for a text height of 1.
+
+        Parameters
+        ----------
+        words : Sequence[str]
+            Words to measure.
+
+        Returns
+        -------
+        np.ndarray
+            Width of each word.
+        """
+        codes = np.asarray(words, dtype=np.str_)
+        if codes.size == 0:
+            return np.zeros(0)
+        codes = codes.view(np.uint32).reshape(len(codes), -1)
+        # Code points beyond the font's range fall back to the missing glyph
+        widths = self.advances[np.minimum(codes, len(self.advances) - 1)]
+        widths[codes >= len(self.advances)] = self.advances[0]
+        widths[codes == 0] = 0.0  # Padding of shorter words
+        return widths.sum(axis=1)
+
+
+def word_extents(
+    words: Sequence[str], metrics: FontMetrics, heights: Sequence[float] = HEIGHTS
+) -> pd.DataFrame:
+    """
+    Width of every word at every candidate text height, in degrees.
+
+    Parameters
+    ----------
+    words : Sequence[str]
+        Words to measure. Duplicates are measured once.
+    metrics : FontMetrics
+        Metrics of the font used.
+    heights : Sequence[float], optional
+        Candidate text heights in degrees, by default 0.3 to 1.5 in steps of 0.01.
+
+    Returns
+    -------
+    pd.DataFrame
+        Widths indexed by word, with one column per height.
+    """
+    words = pd.unique(np.asarray(words, dtype=np.str_))
+    widths = metrics.word_widths(words)
+    heights = np.asarray(heights, dtype=float)
+    return pd.DataFrame(
+        widths[:, None] * heights[None, :],
+        index=pd.Index(words, name="word"),
+        columns=pd.Index(heights, name="height"),
+    )
+
+
+def cached_word_extents(
+    words: Sequence[str],
+    metrics: FontMetrics,
+    cache_dir: str | Path,
+    heights: Sequence[float] = HEIGHTS,
+) -> pd.DataFrame:
+    """
+    `word_extents` backed by an on-disk cache keyed on the font file, words and heights.
+
+    Parameters
+    ----------
+    words : Sequence[str]
+        Words to measure.
+    metrics : FontMetrics
+        Metrics of the font used.
+    cache_dir : str | Path
+        Directory holding cache entries.
+    heights : Sequence[float], optional
+        Candidate text heights in degrees, by default 0.3 to 1.5 in steps of 0.01.
+
+    Returns
+    -------
+    pd.DataFrame
+        Widths indexed by word, with one column per height.
+    """
+    words = pd.unique(np.asarray(words, dtype=np.str_))
+    heights = np.asarray(heights, dtype=float)
+    h = hashlib.sha256()
+    h.update(f"textmetrics-v{METRICS_VERSION}".encode())
+    h.update(file_digest(metrics.path))
+    h.update(json.dumps(words.tolist()).encode())
+    h.update(heights.tobytes())
+    path = Path(cache_dir) / f"extents-{h.hexdigest()[:16]}.npz"
+
+    if path.exists():
+        with np.load(path, allow_pickle=False) as data:
+            extents = data["extents"]
+    else:
+        extents = word_extents(words, metrics, heights).to_numpy()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmppath = path.with_name(path.name + f".{os.getpid()}.tmp")
+        with open(tmppath, "wb") as f:
+            np.savez_compressed(f, words=words, heights=heights, extents=extents)
+        os.replace(tmppath, path)
+    return pd.DataFrame(
+        extents,
+        index=pd.Index(words, name="word"),
+        columns=pd.Index(heights, name="height"),
+    )
+
+
+@dataclass(frozen=True)
+class TextLayout:
+    """
+    Largest text layout that keeps every two-word stimulus within the foveal limit.
+
+    Attributes
+    ----------
+    height : float
+        Largest feasible text height in degrees.
+    word_sep : float
+        Largest feasible word separation in degrees at that height, at least the requested one.
+    max_extent : float
+        Largest left-to-right extent of a stimulus at `height` and the requested separation,
+        including the fudge factor.
+    """
+
+    height: float
+    word_sep: float
+    max_extent: float
+
+
+def select_text_layout(
+    twowords: pd.DataFrame,
+    extents: pd.DataFrame,
+    max_sep: float = FOVEAL_ANGLE,
+    word_sep: float = WORD_SEP,
+    fudge: float = FUDGE_FACTOR,
+) -> TextLayout:
+    """
+    Pick the largest text height at which every word pair fits within `max_sep`.
+
+    The first word is right-aligned `word_sep / 2` left of the center and the second is
+    left-aligned `word_sep / 2` right of it, as in `TwoWordStim`, so a pair spans the widths of
+    both words plus the separation.
+
+    Parameters
+    ----------
+    twowords : pd.DataFrame
+        Two-word stimuli with `w1` and `w2` columns.
+    extents : pd.DataFrame
+        Word widths per height, from `word_extents` or `cached_word_extents`. Must cover every
+        word of `twowords`.
+    max_sep : float, optional
+        Maximum extent in degrees, by default `FOVEAL_ANGLE`.
+    word_sep : float, optional
+        Word separation in degrees, by default `WORD_SEP`.
+    fudge : float, optional
+        Padding added to every extent, by default `FUDGE_FACTOR`.
+
+    Returns
+    -------
+    TextLayout
+        The chosen height and the separation it leaves room for.
+    """
+    w1 = extents.index.get_indexer(twowords["w1"].astype(str))
+    w2 = extents.index.get_indexer(twowords["w2"].astype(str))
+    if (w1 < 0).any() or (w2 < 0).any():
+        raise ValueError("Word extents do not cover every stimulus word.")
+    widths = extents.to_numpy()
+    spans = (widths[w1] + widths[w2]).max(axis=0)  # Widest pair at each height
+    feasible = np.flatnonzero(spans + word_sep + fudge <= max_sep)
+    if len(feasible) == 0:
+        raise ValueError(f"No candidate height keeps every word pair within {max_sep} degrees.")
+    best = feasible[np.argmax(extents.columns.to_numpy()[feasible])]
+    return TextLayout(
+        height=float(extents.columns[best]),
+        word_sep=float(max_sep - fudge - spans[best]),
+        max_extent=float(spans[best] + word_sep + fudge),
+    )
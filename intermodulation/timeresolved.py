@@ -0,0 +1,172 @@
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import mne
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from intermodulation.analysis import data_channels, epoch_window, tagged_bins
+from intermodulation.freqplan import exact_sfreq, exact_windows
+
+
+@dataclass
+class SlidingSpectra:
+    """
+    Sliding-window power, SNR and ITC at the tagged frequencies.
+
+    Attributes
+    ----------
+    times : np.ndarray
+        (n_windows,) center of every window in epoch time.
+    window_dur : float
+        Window length in seconds.
+    targets : pd.DataFrame
+        Terms as from `analysis.tagged_bins`, for the spectrum of one window. The `col` column
+        indexes the term's bin in `freqs`.
+    freqs : np.ndarray
+        (n_bins,) frequencies of every computed bin, targets and noise.
+    power : np.ndarray
+        (n_windows, n_channels, n_bins) power averaged over epochs.
+    snr : np.ndarray
+        (n_windows, n_channels, n_targets) power at every target over the mean power of its
+        noise bins.
+    itc : np.ndarray
+        (n_windows, n_channels, n_targets) inter-trial phase coherence at every target.
+    ch_names : list[str]
+        Channels.
+    """
+
+    times: np.ndarray
+    window_dur: float
+    targets: pd.DataFrame
+    freqs: np.ndarray
+    power: np.ndarray
+    snr: np.ndarray
+    itc: np.ndarray
+    ch_names: list[str]
+
+
+def sliding_spectra(
+    epochs: mne.BaseEpochs,
+    tagfreqs: Sequence[float],
+    window_dur: float | None = None,
+    step: float | None = None,
+    tmin: float | None = None,
+    tmax: float | None = None,
+    order: int = 2,
+    noise_n_neighbor_freqs: int = 1,
+    noise_skip_neighbor_freqs: int = 1,
+    picks: list[str] | None = None,
+    batch_size: int = 1,
+    sfreq: float | str | None = None,
+    tol: float = 1e-6,
+) -> SlidingSpectra:
+    """
+    Time-resolved SNR and ITC of the tags, harmonics and IM terms within epochs.
+
+    Every epoch is cut into overlapping windows with a strided view, and the Fourier
+    coefficients of the target and noise bins of all windows of a batch of epochs are computed
+    at once as a product with the DFT basis of those bins. Window lengths are restricted to
+    whole cycles of every tag (see `freqplan.exact_windows`), so all terms fall exactly on bins.
+
+    The exact lengths depend on the sampling frequency: one word (680 / 240 s) is one at 600 Hz,
+    but at 1 and 2 kHz the shortest is three words. Pass `sfreq="window"` with `window_dur` set
+    to one word to resample to the highest rate at which that window is exact (999.88 Hz for a
+    1 kHz recording, see `freqplan.exact_sfreq`) and resolve the response word by word.
+
+    Parameters
+    ----------
+    epochs : mne.BaseEpochs
+        Epochs, e.g. the miniblocks of one condition.
+    tagfreqs : Sequence[float]
+        Tag frequencies f1 and f2.
+    window_dur : float | None, optional
+        Desired window length in seconds. The closest exact length is used, by default the
+        shortest.
+    step : float | None, optional
+        Step between windows in seconds, rounded to samples, by default a quarter window.
+    tmin, tmax : float | None, optional
+        Part of the epochs to slide over, by default all of it.
+    order : int, optional
+        Largest harmonic and IM order, by default 2.
+    noise_n_neighbor_freqs, noise_skip_neighbor_freqs : int, optional
+        Noise bins of each window's spectrum for the SNR, as in `analysis.snr_spectrum`, by
+        default 1 and 1.
+    picks : list[str] | None, optional
+        Channels, by default `analysis.data_channels`.
+    batch_size : int, optional
+        Epochs transformed at once, by default 1. The windows of a batch are copied for the
+        product, about 0.4 GB per epoch for 306 channels, 20 windows of 8.5 s at 1 kHz.
+    sfreq : float | str | None, optional
+        Sampling frequency to resample the analyzed part of every batch to, with
+        `mne.filter.resample`, before windowing. "window" uses the highest rate up to that of the
+        epochs at which `window_dur` is exact. By default the epochs are not resampled.
+    tol : float, optional
+        Relative tolerance for whole tag cycles, by default 1e-6.
+
+    Returns
+    -------
+    SlidingSpectra
+        Power, SNR and ITC of every window.
+    """
+    orig_sfreq = epochs.info["sfreq"]
+    start, n_times = epoch_window(epochs, tmin, tmax)
+    if sfreq == "window":
+        if window_dur is None:
+            raise ValueError('sfreq="window" needs a window_dur.')
+        sfreq = exact_sfreq(window_dur, tagfreqs, orig_sfreq, tol)
+    elif sfreq is None:
+        sfreq = orig_sfreq
+    n_orig = n_times
+    n_times = int(np.round(n_orig * sfreq / orig_sfreq))
+    lengths = exact_windows(sfreq, tagfreqs, n_times / sfreq, tol)
+    if len(lengths) == 0:
+        raise ValueError(
+            f"No window of at most {n_times / sfreq:.3f} s holds whole cycles of {tagfreqs} "
+            f"at {sfreq} Hz."
+        )
+    if window_dur is None:
+        n_window = lengths[0]
+    else:
+        n_window = lengths[np.abs(lengths - window_dur * sfreq).argmin()]
+    n_step = max(1, int(np.round(n_window / 4 if step is None else step * sfreq)))
+
+    freqs = np.fft.rfftfreq(n_window, 1.0 / sfreq)
+    targets, bins, noise_cols = tagged_bins(
+        freqs, tagfreqs, order, noise_n_neighbor_freqs, noise_skip_neighbor_freqs
+    )
+    # Real DFT basis of the bins, cosines then sines, for real matrix products
+    phase = 2 * np.pi * np.arange(n_window)[:, None] * bins[None, :] / n_window
+    basis = np.concatenate([np.cos(phase), -np.sin(phase)], axis=1) / n_window
+
+    if picks is None:
+        picks = data_channels(epochs.info)
+    power, phasors = 0.0, 0.0
+    for first in range(0, len(epochs), batch_size):
+        items = np.arange(first, min(first + batch_size, len(epochs)))
+        data = epochs.get_data(picks=picks, item=items)[..., start : start + n_orig]
+        if sfreq != orig_sfreq:
+            data = mne.filter.resample(data, sfreq, orig_sfreq, verbose=False)
+        windows = sliding_window_view(data, n_window, axis=-1)[..., ::n_step, :]
+        coefs = windows @ basis
+        coefs = coefs[..., : len(bins)] + 1j * coefs[..., len(bins) :]
+        amplitude = np.abs(coefs)
+        power = power + (amplitude**2).sum(axis=0)
+        unit = np.divide(coefs, amplitude, out=np.zeros_like(coefs), where=amplitude > 0)
+        phasors = phasors + unit[..., targets["col"]].sum(axis=0)
+    # (n_channels, n_windows, ...) -> (n_windows, n_channels, ...)
+    power = (power / len(epochs)).transpose(1, 0, 2)
+    itc = np.abs(phasors / len(epochs)).transpose(1, 0, 2)
+    snr = power[..., targets["col"]] / power[..., noise_cols].mean(axis=-1)
+    starts = np.arange(0, n_times - n_window + 1, n_step)
+    return SlidingSpectra(
+        times=epochs.times[start] + (starts + n_window / 2) / sfreq,
+        window_dur=n_window / sfreq,
+        targets=targets,
+        freqs=freqs[bins],
+        power=power,
+        snr=snr,
+        itc=itc,
+        ch_names=list(picks),
+    )
@@ -1,19 +1,25 @@
+from __future__ import annotations
+
 from collections.abc import Sequence
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Hashable, Literal
+from typing import TYPE_CHECKING, Hashable, Literal
 
 import numpy as np
 import pandas as pd
-import psystate.controller as psycon
-from byte_triggers import ParallelPortTrigger
 
 from intermodulation.freqtag_spec import (
     TRIGGERS,
 )
-from intermodulation.states import (
-    QueryState,
-)
+from intermodulation.schedule import ScheduleConstraints, generate_schedule
+
+# psychopy-backed imports are only needed for annotations. Keeping them out of the runtime import
+# lets the stimulus preparation functions run on headless analysis nodes.
+if TYPE_CHECKING:
+    import psystate.controller as psycon
+    from byte_triggers import ParallelPortTrigger
+
+    from intermodulation.states import QueryState
 
 
 @dataclass
@@ -137,6 +143,10 @@ def split_miniblocks(
     """
     Split a dataframe into mini-blocks of a given length, and assign a miniblock number to each row.
 
+    Rows are ordered by condition with `DataFrame.sort_values`, as in earlier versions, and numbered
+    consecutively so that every miniblock holds a single condition. Seeds used before this function
+    was vectorized therefore give the same miniblocks.
+
     Parameters
     ----------
     df : pd.DataFrame
@@ -145,60 +155,94 @@ def split_miniblocks(
     miniblock_len : int
         Length of each mini-block
     rng : np.random.Generator
-        Random state to pass to the sampling function.
+        Random state used to pick the duplicated stimuli.
     dup_extra : bool, optional
         If the number of stimuli in a condition are not a whole-number multiple of `miniblock_len`,
-        whether to duplicate some elements to reach the whole-number. By default False
+        whether to duplicate randomly chosen elements of that condition to reach the whole-number.
+        By default False
 
     Returns
     -------
     pd.DataFrame
         Dataframe with new column `miniblock` containing the miniblock number for each row
     """
-    df = df.copy()
-    n_mini = len(df) / miniblock_len  # Number of mini-blocks
-    if n_mini % 1 != 0:  # make sure we're not dropping stimuli
+    codes, _ = pd.factorize(df["condition"], sort=True)
+    counts = np.bincount(codes)
+    n_dups = -counts % miniblock_len  # Stimuli missing to complete each condition's last block
+    rows = np.arange(len(df))
+    if np.any(n_dups > 0):
         if not dup_extra:
-            raise ValueError("The miniblock length does not evently divide the number of stimuli.")
-        else:
-            condrem = {
-                cond: len(df.query(f"condition == '{cond}'")) % miniblock_len
-                for cond in df["condition"].unique()
-            }
-            dups = []
-            for cond, n in condrem.items():
-                dups.append(df.query(f"condition == '{cond}'").sample(n, random_state=rng))
-            dupdf = pd.concat(dups, ignore_index=True)
-            df = pd.concat([df, dupdf], ignore_index=True)
+            raise ValueError(
+                "The miniblock length does not evenly divide the number of stimuli in each "
+                "condition."
+            )
+        if np.any(n_dups > counts):
+            raise ValueError("Cannot duplicate more stimuli than a condition contains.")
+        # Draw the duplicates without replacement by ranking random keys within each condition.
+        # Earlier versions could not complete miniblocks here, so no seed depends on this draw
+        shuffled = np.lexsort((rng.random(len(df)), codes))
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        rank = np.arange(len(df)) - starts[codes[shuffled]]
+        dups = shuffled[rank < n_dups[codes[shuffled]]]
+        rows = np.concatenate((rows, dups))
+
+    if len(rows) > len(df):  # Duplicated rows get fresh labels, as with pd.concat(ignore_index)
+        df = df.iloc[rows].reset_index(drop=True)
+    # Same sort as earlier versions, whose tie order within a condition existing seeds rely on
     sorted_df = df.sort_values("condition")
-    miniblocks = np.repeat(np.arange(int(n_mini)), miniblock_len)
-    sorted_df["miniblock"] = miniblocks
+    sorted_df["miniblock"] = np.arange(len(rows)) // miniblock_len
     return sorted_df
 
 
 def assign_miniblock_freqs(
     df: pd.DataFrame, freqs: Sequence[float], rng: np.random.Generator = np.random.default_rng()
 ) -> pd.DataFrame:
+    """
+    Assign tagging frequencies to every miniblock, balanced within each condition.
+
+    Each miniblock gets one of `len(freqs)` arrangements, which are the rotations of `freqs`:
+    arrangement `k` tags the first word with `freqs[k]` and the second word (if any) with
+    `freqs[(k + 1) % len(freqs)]`. With two frequencies these are (F1, F2) and (F2, F1). Within
+    each condition every arrangement is used equally often; if the miniblocks do not divide evenly
+    the later arrangements get one extra miniblock each.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Stimuli with 'condition' and 'miniblock' columns, e.g. from `split_miniblocks`.
+    freqs : Sequence[float]
+        Tagging frequencies.
+    rng : np.random.Generator
+        Random state used to shuffle the arrangements across the miniblocks of each condition.
+
+    Returns
+    -------
+    pd.DataFrame
+        Copy of `df` with `w1_freq` (and `w2_freq` if there is a `w2` column) added.
+    """
     df = df.copy()
-    df["w1_freq"] = np.nan
-    if "w2" in df.columns:
-        df["w2_freq"] = np.nan
-    minis = df.groupby("condition").value_counts(["miniblock"])
-    # We want to balance the number of F1 and F2 tags in each condition, so we will create a
-    # balanced number of F1/F2 blocks and shuffle the indices. This biases our miniblocks to have
-    # one more F1 tag (idx 0) if there are an uneven number.
-    freqids = []
-    for cond in minis.index.levels[0]:
-        halfcondmini = len(minis[cond]) // 2
-        freqids = np.concatenate(
-            [np.zeros(halfcondmini), np.ones(len(minis[cond]) - halfcondmini)]
+    freqs = np.asarray(freqs, dtype=float)
+    n_freqs = len(freqs)
+    codes, _ = pd.factorize(df["condition"], sort=True)
+    mini_codes, _ = pd.factorize(df["miniblock"])  # Miniblocks numbered in order of appearance
+    _, first_rows = np.unique(mini_codes, return_index=True)
+    mini_conds = codes[first_rows]
+    mini_counts = np.bincount(mini_conds)
+
+    arrangements = np.empty(len(first_rows), dtype=int)
+    for cond, n_minis in enumerate(mini_counts):
+        if n_minis == 0:
+            continue
+        per_arrangement = np.full(n_freqs, n_minis // n_freqs)
+        per_arrangement[n_freqs - n_minis % n_freqs :] += 1
+        arrangements[mini_conds == cond] = rng.permutation(
+            np.repeat(np.arange(n_freqs), per_arrangement)
         )
-        freqidxs = rng.permutation(freqids)
-        stim_freqidxs = np.repeat(freqidxs, minis[cond]).reshape(-1, 1)
-        condfreqs = np.where(stim_freqidxs == 0, freqs, freqs[::-1])
-        df.loc[df["condition"] == cond, "w1_freq"] = condfreqs[:, 0]
-        if "w2" in df.columns:
-            df.loc[df["condition"] == cond, "w2_freq"] = condfreqs[:, 1]
+
+    row_arrangement = arrangements[mini_codes]
+    df["w1_freq"] = freqs[row_arrangement]
+    if "w2" in df.columns:
+        df["w2_freq"] = freqs[(row_arrangement + 1) % n_freqs]
     return df
 
 
@@ -208,7 +252,11 @@ def prep_miniblocks(
     df: pd.DataFrame,
     miniblock_len: int,
     freqs: Sequence[float],
+    constraints: ScheduleConstraints | None = None,
 ) -> pd.DataFrame:
+    if constraints is not None:
+        # Search for a miniblock order and tag arrangement that satisfies the constraints
+        return generate_schedule(df, miniblock_len, freqs, rng, constraints)
     # Shuffle within conditions and split into miniblocks.
     shuf_df = shuffle_condition(df, rng)
     miniblock_df = split_miniblocks(shuf_df, miniblock_len, rng)
@@ -223,14 +271,15 @@ def load_prep_words(
     rng: np.random.Generator,
     miniblock_len: int,
     freqs: Sequence[float],
+    constraints: ScheduleConstraints | None = None,
 ) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     # Prepare word stimuli by first shuffling, then assigning frequencies
     twowords = pd.read_csv(path_2w, index_col=0)
     twowords = twowords.sample(frac=1, random_state=rng)
-    twowords = prep_miniblocks("twoword", rng, twowords, miniblock_len, freqs)
+    twowords = prep_miniblocks("twoword", rng, twowords, miniblock_len, freqs, constraints)
     onewords = pd.read_csv(path_1w, index_col=0)
     onewords = onewords.sample(frac=1, random_state=rng)
-    onewords = prep_miniblocks("oneword", rng, onewords, miniblock_len, freqs)
+    onewords = prep_miniblocks("oneword", rng, onewords, miniblock_len, freqs, constraints)
 
     # Generate a list of all used words together with their categories, for the query task
     all_2w = pd.melt(
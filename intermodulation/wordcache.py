@@ -0,0 +1,310 @@
+import hashlib
+import json
+import os
+from collections.abc import Sequence
+from dataclasses import asdict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from intermodulation.schedule import ScheduleConstraints
+from intermodulation.utils import load_prep_words
+
+# Bump whenever the preparation code changes in a way that alters the prepared lists, so that
+# stale cache entries are never picked up.
+CACHE_VERSION = 1
+TABLES = ("onewords", "twowords", "allwords")
+
+
+def file_digest(path: str | Path) -> bytes:
+    """
+    SHA-256 digest of a file's contents, read in chunks.
+
+    Parameters
+    ----------
+    path : str | Path
+        File to hash.
+
+    Returns
+    -------
+    bytes
+        Raw digest, to feed into a cache key.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+def prep_cache_key(
+    path_1w: str | Path,
+    path_2w: str | Path,
+    rng: np.random.Generator,
+    miniblock_len: int,
+    freqs: Sequence[float],
+    constraints: ScheduleConstraints | None = None,
+) -> str:
+    """
+    Content-addressed key for a set of prepared word lists.
+
+    The key hashes the contents (not the paths) of both stimulus files, the full bit generator
+    state of `rng` before preparation, the miniblock length, the tag frequencies and the schedule
+    constraints, if any. For `np.random.default_rng(seed)` the generator state is a deterministic
+    function of the seed, so two sessions with the same seed and inputs share a key.
+
+    Parameters
+    ----------
+    path_1w : str | Path
+        Path to the one-word stimulus CSV.
+    path_2w : str | Path
+        Path to the two-word stimulus CSV.
+    rng : np.random.Generator
+        Random number generator that will be used for preparation. Not advanced by this function.
+    miniblock_len : int
+        Number of stimuli per miniblock.
+    freqs : Sequence[float]
+        Tagging frequencies assigned to the miniblocks.
+    constraints : ScheduleConstraints | None, optional
+        Schedule constraints passed on to `load_prep_words`, by default None.
+
+    Returns
+    -------
+    str
+        Hexadecimal key.
+    """
+    h = hashlib.sha256()
+    h.update(f"prepwords-v{CACHE_VERSION}".encode())
+    h.update(file_digest(path_1w))
+    h.update(file_digest(path_2w))
+    h.update(json.dumps(rng.bit_generator.state, sort_keys=True).encode())
+    h.update(str(int(miniblock_len)).encode())
+    h.update(np.asarray(freqs, dtype=np.float64).tobytes())
+    if constraints is not None:
+        # Constraints enter the key only when given, so unconstrained keys do not depend on them
+        h.update(json.dumps(asdict(constraints), sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def _frame_to_arrays(name: str, df: pd.DataFrame) -> tuple[dict[str, np.ndarray], dict]:
+    # String columns are dictionary-encoded into integer codes and a category array, everything
+    # else is stored as-is. Nothing is stored as an object array, so reading never unpickles.
+    arrays = {}
+    columns = []
+    for col in df.columns:
+        values = df[col]
+        key = f"{name}.{col}"
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            arrays[key] = values.to_numpy()
+            columns.append({"name": col, "kind": "values"})
+        else:
+            codes, cats = pd.factorize(values, use_na_sentinel=True)
+            arrays[f"{key}.codes"] = codes.astype(np.min_scalar_type(-max(len(cats), 1)))
+            arrays[f"{key}.categories"] = np.asarray(cats, dtype=np.str_)
+            columns.append({"name": col, "kind": "categorical"})
+    arrays[f"{name}.__index__"] = df.index.to_numpy()
+    layout = {"columns": columns, "index_name": df.index.name}
+    return arrays, layout
+
+
+def _arrays_to_frame(name: str, data, layout: dict) -> pd.DataFrame:
+    columns = {}
+    for col in layout["columns"]:
+        key = f"{name}.{col['name']}"
+        if col["kind"] == "values":
+            columns[col["name"]] = data[key]
+        else:
+            codes = data[f"{key}.codes"].astype(np.intp)
+            cats = data[f"{key}.categories"].astype(object)
+            values = np.empty(len(codes), dtype=object)
+            values[:] = np.nan
+            valid = codes >= 0
+            values[valid] = cats[codes[valid]]
+            columns[col["name"]] = values
+    index = pd.Index(data[f"{name}.__index__"], name=layout["index_name"])
+    return pd.DataFrame(columns, index=index)
+
+
+def save_prepared_words(
+    path: str | Path,
+    onewords: pd.DataFrame,
+    twowords: pd.DataFrame,
+    allwords: pd.DataFrame,
+    meta: dict | None = None,
+) -> Path:
+    """
+    Write prepared one-word, two-word and all-word tables to a compressed `.npz` file.
+
+    The file is written to a temporary name and moved into place, so a crash never leaves a
+    partially written cache entry behind.
+
+    Parameters
+    ----------
+    path : str | Path
+        Output file path.
+    onewords, twowords, allwords : pd.DataFrame
+        Tables as returned by `intermodulation.utils.load_prep_words`.
+    meta : dict | None, optional
+        Extra JSON-serializable information to store alongside the tables, by default None.
+
+    Returns
+    -------
+    Path
+        The path the tables were written to.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {}
+    layouts = {}
+    for name, df in zip(TABLES, (onewords, twowords, allwords)):
+        tabarrays, layouts[name] = _frame_to_arrays(name, df)
+        arrays.update(tabarrays)
+    header = {"version": CACHE_VERSION, "tables": layouts, "meta": meta or {}}
+    arrays["__header__"] = np.array(json.dumps(header))
+
+    tmppath = path.with_name(path.name + f".{os.getpid()}.tmp")
+    with open(tmppath, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmppath, path)
+    return path
+
+
+def read_prepared_words(
+    path: str | Path, return_meta: bool = False
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame] | tuple[pd.DataFrame, ...]:
+    """
+    Read prepared word tables written by `save_prepared_words`.
+
+    Parameters
+    ----------
+    path : str | Path
+        Cache file to read.
+    return_meta : bool, optional
+        Whether to also return the stored metadata dictionary, by default False.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
+        One-word, two-word and all-word tables, followed by the metadata dict if `return_meta`.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        header = json.loads(data["__header__"].item())
+        if header["version"] != CACHE_VERSION:
+            raise ValueError(
+                f"Prepared word cache {path} has version {header['version']}, "
+                f"expected {CACHE_VERSION}."
+            )
+        tables = tuple(_arrays_to_frame(name, data, header["tables"][name]) for name in TABLES)
+    if return_meta:
+        return (*tables, header["meta"])
+    return tables
+
+
+def cached_prep_words(
+    path_1w: str | Path,
+    path_2w: str | Path,
+    rng: np.random.Generator,
+    miniblock_len: int,
+    freqs: Sequence[float],
+    cache_dir: str | Path,
+    constraints: ScheduleConstraints | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Drop-in replacement for `load_prep_words` backed by a content-addressed cache.
+
+    On a cache miss the lists are prepared with `load_prep_words` and stored in `cache_dir`. On a
+    hit the stored tables are read back and `rng` is fast-forwarded to the state it would have
+    after preparation, so every later draw in the session (queries, ITIs) is identical to an
+    uncached run.
+
+    Parameters
+    ----------
+    path_1w : str | Path
+        Path to the one-word stimulus CSV.
+    path_2w : str | Path
+        Path to the two-word stimulus CSV.
+    rng : np.random.Generator
+        Random number generator used for preparation. Advanced exactly as `load_prep_words` would.
+    miniblock_len : int
+        Number of stimuli per miniblock.
+    freqs : Sequence[float]
+        Tagging frequencies assigned to the miniblocks.
+    cache_dir : str | Path
+        Directory holding the cache files.
+    constraints : ScheduleConstraints | None, optional
+        Schedule constraints passed on to `load_prep_words`, by default None.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
+        One-word, two-word and all-word tables.
+    """
+    key = prep_cache_key(path_1w, path_2w, rng, miniblock_len, freqs, constraints)
+    cachefile = Path(cache_dir) / f"prepwords_{key}.npz"
+    if cachefile.exists():
+        onewords, twowords, allwords, meta = read_prepared_words(cachefile, return_meta=True)
+        rng.bit_generator.state = meta["rng_state_after"]
+        return onewords, twowords, allwords
+
+    rng_state_before = rng.bit_generator.state
+    onewords, twowords, allwords = load_prep_words(
+        path_1w, path_2w, rng, miniblock_len, freqs, constraints
+    )
+    meta = {
+        "key": key,
+        "path_1w": str(path_1w),
+        "path_2w": str(path_2w),
+        "miniblock_len": int(miniblock_len),
+        "freqs": [float(f) for f in freqs],
+        "constraints": None if constraints is None else asdict(constraints),
+        "rng_state_before": rng_state_before,
+        "rng_state_after": rng.bit_generator.state,
+    }
+    save_prepared_words(cachefile, onewords, twowords, allwords, meta=meta)
+    return onewords, twowords, allwords
+
+
+def load_subject_words(
+    cache_dir: str | Path,
+    path_1w: str | Path,
+    path_2w: str | Path,
+    seed: int,
+    miniblock_len: int,
+    freqs: Sequence[float],
+    constraints: ScheduleConstraints | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Load the exact word lists a subject saw, given the session seed, without re-preparing them.
+
+    Parameters
+    ----------
+    cache_dir : str | Path
+        Directory holding the cache files written during the session.
+    path_1w : str | Path
+        Path to the one-word stimulus CSV used in the session.
+    path_2w : str | Path
+        Path to the two-word stimulus CSV used in the session.
+    seed : int
+        Seed entered in the session dialog.
+    miniblock_len : int
+        Number of stimuli per miniblock.
+    freqs : Sequence[float]
+        Tagging frequencies used in the session.
+    constraints : ScheduleConstraints | None, optional
+        Schedule constraints used in the session, by default None.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
+        One-word, two-word and all-word tables.
+    """
+    key = prep_cache_key(
+        path_1w, path_2w, np.random.default_rng(seed), miniblock_len, freqs, constraints
+    )
+    cachefile = Path(cache_dir) / f"prepwords_{key}.npz"
+    if not cachefile.exists():
+        raise FileNotFoundError(
+            f"No prepared word lists for seed {seed} in {cache_dir} (expected {cachefile.name})."
+        )
+    return read_prepared_words(cachefile)
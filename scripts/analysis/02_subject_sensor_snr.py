@@ -1,12 +1,13 @@
 import pickle
 from pathlib import Path
+from tempfile import TemporaryDirectory
 
-import matplotlib.pyplot as plt
 import mne
 import mne_bids as mnb
 
 import intermodulation.analysis as ima
-import intermodulation.plot as imp
+import intermodulation.figures as imfig
+import intermodulation.report as imrep
 from intermodulation import freqtag_spec
 
 if __name__ == "__main__":
@@ -43,6 +44,19 @@ if __name__ == "__main__":
         default="/srv/beegfs/scratch/users/g/gercek/syntax_im/results",
         help="Directory in which to save SNR data",
     )
+    parser.add_argument(
+        "--snr_method",
+        type=str,
+        default="mean",
+        choices=["mean", "median", "trimmed"],
+        help="Noise level of the SNR neighbor bins, see analysis.snr_spectrum",
+    )
+    parser.add_argument(
+        "--n_jobs",
+        type=int,
+        default=None,
+        help="Number of processes rendering figures, one per CPU by default",
+    )
     args = parser.parse_args()
 
     processing = None if args.proc == "raw" else args.proc
@@ -133,14 +147,20 @@ if __name__ == "__main__":
             psds,
             noise_n_neighbor_freqs=snr_neighbor_K,
             noise_skip_neighbor_freqs=snr_skip_neighbor_J,
+            method=args.snr_method,
         )
         twsnrs = ima.snr_spectrum(
             twpsds,
             noise_n_neighbor_freqs=snr_neighbor_K,
             noise_skip_neighbor_freqs=snr_skip_neighbor_J,
+            method=args.snr_method,
+        )
+        allcond_spectra_ow[tag] = dict(
+            psds=psds, freqs=freqs, snrs=snrs, ch_names=spectrum.ch_names
+        )
+        allcond_spectra_tw[twtag] = dict(
+            psds=twpsds, freqs=twfreqs, snrs=twsnrs, ch_names=twspectrum.ch_names
         )
-        allcond_spectra_ow[tag] = dict(psds=psds, freqs=freqs, snrs=snrs)
-        allcond_spectra_tw[twtag] = dict(psds=twpsds, freqs=twfreqs, snrs=twsnrs)
         for cond in ["WORD", "NONWORD"]:
             fulltag = f"ONEWORD/{cond}/{tag}"
             spectrum = epochs["MINIBLOCK/" + fulltag].compute_psd(
@@ -151,8 +171,11 @@ if __name__ == "__main__":
                 psds,
                 noise_n_neighbor_freqs=snr_neighbor_K,
                 noise_skip_neighbor_freqs=snr_skip_neighbor_J,
+                method=args.snr_method,
+            )
+            percond_spectra_ow[fulltag] = dict(
+                psds=psds, freqs=freqs, snrs=snrs, ch_names=spectrum.ch_names
             )
-            percond_spectra_ow[fulltag] = dict(psds=psds, freqs=freqs, snrs=snrs)
         for cond in ["PHRASE", "NONPHRASE", "NONWORD"]:
             fulltag = f"TWOWORD/{cond}/{twtag}"
             spectrum = epochs["MINIBLOCK/" + fulltag].compute_psd(
@@ -163,8 +186,11 @@ if __name__ == "__main__":
                 psds,
                 noise_n_neighbor_freqs=snr_neighbor_K,
                 noise_skip_neighbor_freqs=snr_skip_neighbor_J,
+                method=args.snr_method,
+            )
+            percond_spectra_tw[fulltag] = dict(
+                psds=psds, freqs=freqs, snrs=snrs, ch_names=spectrum.ch_names
             )
-            percond_spectra_tw[fulltag] = dict(psds=psds, freqs=freqs, snrs=snrs)
     print("Done. Saving data...")
     with open(
         procpath / f"{owbase}_allcond.pkl",
@@ -189,122 +215,102 @@ if __name__ == "__main__":
 
     print("Done.\n")
 
-    print("Plotting SNR and SNR topos for oneword+twoword, all conditions combined...")
+    print("Plotting SNR and SNR topos for oneword+twoword, all and per condition...")
     plot_freqs = (1, 15)
     topofig_kw = dict(figsize=(8, 8), dpi=200)
+    f1, f2 = freqtag_spec.FREQUENCIES
+    # Vertical lines at tag frequencies and f2-f1, f1+f2 IMs
+    twoword_freqs = [f2 - f1, f1, f2, 2 * f1, f1 + f2, 2 * f2]
+    snr_kw = dict(fmin=plot_freqs[0], fmax=plot_freqs[1])
+    topo_kw = dict(
+        fmin=plot_freqs[0], fmax=plot_freqs[1], ymin=0.0, ymax=8.0, fig_kwargs=topofig_kw
+    )
+    figbase = f"sub-{args.subject}_ses-{args.session}_task-syntaxIM"
 
-    for name, spectra in {"oneword": allcond_spectra_ow, "twoword": allcond_spectra_tw}.items():
-        fig, axes = plt.subplots(2, 2, figsize=(15, 11), sharex=True, sharey="row")
-        for i, (tag, data) in enumerate(spectra.items()):
-            ax = axes[:, i]
-            if name == "twoword":
-                # Vertical lines at tag frequencies and f2-f1, f1+f2 IMs
-                tagfreq = [
-                    7.05882353 - 6.0,
-                    6.0,
-                    7.05882353,
-                    2 * 6,
-                    6 + 7.05882353,
-                    2 * 7.05882353,
-                ]
-                titlestr = f"{tag} Two-Word SNR"
-            else:
-                tagfreq = {"F1": 6.0, "F2": 7.05882353}[tag]
-                titlestr = f"{tag} One-Word SNR"
-            imp.plot_snr(
-                data["psds"],
-                data["snrs"],
-                data["freqs"],
-                fmin=plot_freqs[0],
-                fmax=plot_freqs[1],
-                fig=fig,
-                axes=ax,
-                titleannot=titlestr,
-                tagfreq=tagfreq,
-                plotpsd=True,
-            )
-            # Topomap plots
-            topofig = imp.snr_topo(
-                data["snrs"].mean(axis=0),
-                epochs.pick("data", exclude="bads"),
-                data["freqs"],
-                fmin=plot_freqs[0],
-                fmax=plot_freqs[1],
-                ymin=0.0,
-                ymax=8.0,
-                vlines=[tagfreq] if name == "oneword" else tagfreq,
-                fig_kwargs=topofig_kw,
+    spectra = {}
+    jobs = []
+    for name, allcond, percond in (
+        ("oneword", allcond_spectra_ow, percond_spectra_ow),
+        ("twoword", allcond_spectra_tw, percond_spectra_tw),
+    ):
+        keys, titles, tagfreqs = [], [], []
+        for tag, data in allcond.items():
+            key = f"{name}/allcond/{tag}"
+            spectra[key] = data
+            tagfreq = twoword_freqs if name == "twoword" else {"F1": f1, "F2": f2}[tag]
+            titlestr = f"{tag} {'Two-Word' if name == 'twoword' else 'One-Word'} SNR"
+            keys.append(key)
+            titles.append(titlestr)
+            tagfreqs.append(tagfreq)
+            jobs.append(
+                imfig.FigureJob(
+                    plotpath / f"{figbase}_{name}_allconds_{tag}_snrtopo.pdf",
+                    "snr_topo",
+                    [key],
+                    [titlestr + ": All conditions"],
+                    [tagfreq],
+                    kwargs=topo_kw,
+                )
             )
-            topofig.suptitle(titlestr + ": All conditions", color="w")
-            topofig.savefig(
-                plotpath
-                / f"sub-{args.subject}_ses-{args.session}_task-syntaxIM_{name}_allconds_{tag}_snrtopo.pdf"
+        jobs.append(
+            imfig.FigureJob(
+                plotpath / f"{figbase}_{name}_allconds_snr.pdf",
+                "snr",
+                keys,
+                titles,
+                tagfreqs,
+                figsize=(15, 11),
+                kwargs=snr_kw,
             )
-            plt.close(topofig)
-        axes[1, 0].set_ylim([-0.5, 4.0])
-        fig.savefig(
-            plotpath
-            / f"sub-{args.subject}_ses-{args.session}_task-syntaxIM_{name}_allconds_snr.pdf"
         )
-        plt.close(fig)
-    print("Done.")
 
-    print("Plotting SNR and SNR topos for oneword+twoword, per condition...")
-    for name, spectra in {"oneword": percond_spectra_ow, "twoword": percond_spectra_tw}.items():
-        ncond = len(spectra.keys())
-        fig, axes = plt.subplots(2, ncond, figsize=(ncond * 5, 11), sharex=True, sharey="row")
-        for i, (tag, data) in enumerate(spectra.items()):
-            cond = tag.split("/")[1]
-            freq = tag.split("/")[-1]
-            if name == "twoword":
-                # Vertical lines at tag frequencies and f2-f1, f1+f2 IMs
-                tagfreq = [
-                    7.05882353 - 6.0,
-                    6.0,
-                    7.05882353,
-                    2 * 6,
-                    6 + 7.05882353,
-                    2 * 7.05882353,
-                ]
-                titlestr = f"{cond} SNR"
-            else:
-                tagfreq = {"F1": 6.0, "F2": 7.05882353}[freq]
-                titlestr = f"{cond} SNR"
-            ax = axes[:, i]
-            imp.plot_snr(
-                data["psds"],
-                data["snrs"],
-                data["freqs"],
-                fmin=plot_freqs[0],
-                fmax=plot_freqs[1],
-                fig=fig,
-                axes=ax,
-                titleannot=titlestr,
-                tagfreq=tagfreq,
-                plotpsd=True,
-            )
-            topofig = imp.snr_topo(
-                data["snrs"].mean(axis=0),
-                epochs.pick("data", exclude="bads"),
-                data["freqs"],
-                fmin=plot_freqs[0],
-                fmax=plot_freqs[1],
-                ymin=0.0,
-                ymax=8.0,
-                vlines=[tagfreq] if name == "oneword" else tagfreq,
-                fig_kwargs=topofig_kw,
+        keys, titles, tagfreqs = [], [], []
+        for fulltag, data in percond.items():
+            cond = fulltag.split("/")[1]
+            freq = fulltag.split("/")[-1]
+            key = f"{name}/percond/{cond}/{freq}"
+            spectra[key] = data
+            tagfreq = twoword_freqs if name == "twoword" else {"F1": f1, "F2": f2}[freq]
+            keys.append(key)
+            titles.append(f"{cond} SNR")
+            tagfreqs.append(tagfreq)
+            jobs.append(
+                imfig.FigureJob(
+                    plotpath / f"{figbase}_{name}_{cond}_{freq}_snrtopo.pdf",
+                    "snr_topo",
+                    [key],
+                    [f"{name}: {freq} {cond} trials SNR"],
+                    [tagfreq],
+                    kwargs=topo_kw,
+                )
             )
-            topofig.suptitle(f"{name}: {freq} {cond} trials SNR", color="w")
-            topofig.savefig(
-                plotpath
-                / f"sub-{args.subject}_ses-{args.session}_task-syntaxIM_{name}_{cond}_{freq}_snrtopo.pdf"
+        jobs.append(
+            imfig.FigureJob(
+                plotpath / f"{figbase}_{name}_percond_snr.pdf",
+                "snr",
+                keys,
+                titles,
+                tagfreqs,
+                suptitle=f"{name} SNR per condition",
+                kwargs=snr_kw,
             )
-            plt.close(topofig)
-        axes[1, 0].set_ylim([-0.5, 4.0])
-        fig.suptitle(f"{name} SNR per condition", fontsize=16)
-        fig.tight_layout()
-        fig.savefig(
-            plotpath
-            / f"sub-{args.subject}_ses-{args.session}_task-syntaxIM_{name}_percond_snr.pdf"
         )
+
+    # Figures are rendered in parallel from memory-mapped copies of the spectra
+    info = epochs.pick("data", exclude="bads").info
+    with TemporaryDirectory() as spectra_dir:
+        imfig.save_spectra(spectra, spectra_dir)
+        imfig.render_figures(jobs, spectra_dir, info=info, n_jobs=args.n_jobs)
     print("Done.")
+
+    # One offline HTML file to browse every channel and condition
+    reportpath = imrep.write_spectrum_report(
+        plotpath / f"{figbase}_snr_report.html",
+        spectra,
+        info,
+        overview_freqs=sorted(twoword_freqs),
+        fmin=fmin,
+        fmax=30.0,
+        title=f"sub-{args.subject} ses-{args.session} {args.proc} SNR",
+    )
+    print(f"Saved report to {reportpath}")
@@ -0,0 +1,158 @@
+import pickle
+from pathlib import Path
+
+import mne
+import numpy as np
+import pandas as pd
+
+import intermodulation.stats as imst
+from intermodulation import freqtag_spec
+
+# Built-in Neuromag adjacencies, with channel names written without spaces
+ADJACENCY = {"mag": "neuromag306mag", "grad": "neuromag306planar"}
+# Task, condition A, condition B and the tag assignments averaged over for each contrast
+CONTRASTS = {
+    "phrase": ("twoword", "TWOWORD/PHRASE", "TWOWORD/NONPHRASE", ("F1LEFT", "F1RIGHT")),
+    "word": ("oneword", "ONEWORD/WORD", "ONEWORD/NONWORD", ("F1", "F2")),
+}
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--subjects",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Subject IDs",
+    )
+    parser.add_argument(
+        "--contrast",
+        type=str,
+        default="phrase",
+        choices=list(CONTRASTS),
+        help="Phrase vs non-phrase or word vs non-word",
+    )
+    parser.add_argument(
+        "--ch_type",
+        type=str,
+        default="mag",
+        choices=list(ADJACENCY),
+        help="Sensor type to test",
+    )
+    parser.add_argument(
+        "--proc",
+        type=str,
+        default="raw",
+        help="Processing type: raw, sss, filt, or clean",
+    )
+    parser.add_argument(
+        "--session",
+        type=str,
+        default="01",
+        help="Session ID",
+    )
+    parser.add_argument(
+        "--savepath",
+        type=Path,
+        default="/srv/beegfs/scratch/users/g/gercek/syntax_im/results",
+        help="Directory holding the SNR data of 02_subject_sensor_snr.py",
+    )
+    parser.add_argument("--order", type=int, default=2, help="Largest harmonic/IM order")
+    parser.add_argument(
+        "--half_width", type=float, default=0.1, help="Hz around each term to include"
+    )
+    parser.add_argument("--n_permutations", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--n_jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes, one per CPU by default",
+    )
+    args = parser.parse_args()
+
+    procdir = "raw" if args.proc == "raw" else f"proc-{args.proc}"
+    task, cond_a, cond_b, tags = CONTRASTS[args.contrast]
+    adjacency, adj_names = mne.channels.read_ch_adjacency(ADJACENCY[args.ch_type])
+    adj_names = [str(name) for name in adj_names]
+
+    # Epoch-averaged SNR difference of every subject, averaged over tag assignments
+    diffs, ch_names, freqs = [], [], None
+    for subject in args.subjects:
+        path = (
+            args.savepath
+            / f"sub-{subject}"
+            / procdir
+            / f"ses-{args.session}_task-syntaxIM_spectraSNR_{task}_percond.pkl"
+        )
+        with open(path, "rb") as f:
+            spectra = pickle.load(f)
+        first = spectra[f"{cond_a}/{tags[0]}"]
+        if freqs is None:
+            freqs = first["freqs"]
+        elif not np.allclose(freqs, first["freqs"]):
+            raise ValueError(f"Subject {subject} has different frequencies.")
+        diff = np.mean(
+            [
+                spectra[f"{cond_a}/{tag}"]["snrs"].mean(axis=0)
+                - spectra[f"{cond_b}/{tag}"]["snrs"].mean(axis=0)
+                for tag in tags
+            ],
+            axis=0,
+        )
+        diffs.append(diff)
+        ch_names.append([name.replace(" ", "") for name in first["ch_names"]])
+
+    # Channels of the sensor type that no subject marked bad, in adjacency order
+    common = [name for name in adj_names if all(name in names for names in ch_names)]
+    print(f"Testing {len(common)} {args.ch_type} channels of {len(args.subjects)} subjects")
+    adj_idx = [adj_names.index(name) for name in common]
+    adjacency = adjacency.tocsr()[adj_idx][:, adj_idx]
+    bins = imst.target_bins(freqs, freqtag_spec.FREQUENCIES, args.order, args.half_width)
+    X = np.stack(
+        [
+            diff[[names.index(name) for name in common]][:, bins["bin"]]
+            for diff, names in zip(diffs, ch_names)
+        ]
+    )
+
+    result = imst.cluster_test(
+        X,
+        imst.feature_adjacency(adjacency, bins["bin"]),
+        n_permutations=args.n_permutations,
+        seed=args.seed,
+        n_jobs=args.n_jobs,
+    )
+
+    rows = []
+    for mask, mass, p in zip(result.clusters, result.cluster_stats, result.p_values):
+        chans, binidx = np.nonzero(mask)
+        rows.append(
+            dict(
+                mass=mass,
+                p=p,
+                n_channels=len(np.unique(chans)),
+                terms=",".join(bins["term"].iloc[np.unique(binidx)].unique()),
+                fmin=bins["freq"].iloc[binidx].min(),
+                fmax=bins["freq"].iloc[binidx].max(),
+                channels=",".join(np.asarray(common)[np.unique(chans)]),
+            )
+        )
+    clusters = pd.DataFrame(
+        rows, columns=["mass", "p", "n_channels", "terms", "fmin", "fmax", "channels"]
+    )
+    outpath = args.savepath / "group" / procdir
+    outpath.mkdir(parents=True, exist_ok=True)
+    outbase = f"ses-{args.session}_task-syntaxIM_clusters_{args.contrast}_{args.ch_type}"
+    clusters.to_csv(outpath / f"{outbase}.csv", index=False)
+    np.savez(
+        outpath / f"{outbase}.npz",
+        t_obs=result.t_obs,
+        h0=result.h0,
+        freqs=bins["freq"].to_numpy(),
+        ch_names=np.asarray(common),
+    )
+    print(clusters.drop(columns="channels").head(10).to_string(index=False))
+    print(f"Saved clusters to {outpath / outbase}.csv")
@@ -0,0 +1,133 @@
+import pickle
+from pathlib import Path
+
+import mne
+import mne_bids as mnb
+
+import intermodulation.source as imsrc
+from intermodulation import freqtag_spec
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--proc",
+        type=str,
+        default="clean",
+        help="Processing type: raw, sss, filt, or clean",
+    )
+    parser.add_argument(
+        "--subject",
+        type=str,
+        default="02",
+        help="Subject ID",
+    )
+    parser.add_argument(
+        "--session",
+        type=str,
+        default="01",
+        help="Session ID",
+    )
+    parser.add_argument(
+        "--bids_root",
+        type=Path,
+        default="/srv/beegfs/scratch/users/g/gercek/syntax_im/syntax_dataset",
+        help="Root directory for BIDS dataset",
+    )
+    parser.add_argument(
+        "--savepath",
+        type=Path,
+        default="/srv/beegfs/scratch/users/g/gercek/syntax_im/results",
+        help="Directory in which to save source SNR data",
+    )
+    parser.add_argument(
+        "--method", type=str, default="dSPM", help="Inverse method: MNE, dSPM, sLORETA, eLORETA"
+    )
+    parser.add_argument("--order", type=int, default=2, help="Largest harmonic/IM order")
+    args = parser.parse_args()
+
+    processing = None if args.proc == "raw" else args.proc
+    procdir = "raw" if args.proc == "raw" else f"proc-{args.proc}"
+
+    # STORAGE LOCATIONS
+    derivatives_root = args.bids_root / "derivatives/mne-bids-pipeline"
+    procpath = args.savepath / f"sub-{args.subject}" / procdir
+    procpath.mkdir(parents=True, exist_ok=True)
+    print(f"Saving data to {procpath}")
+
+    raw_bidspath = mnb.BIDSPath(
+        subject=args.subject,
+        session=args.session,
+        task="syntaxIM",
+        processing=processing,
+        split="01" if processing in ("sss", "filt", None) else None,
+        datatype="meg",
+        suffix="raw" if processing is not None else None,
+        extension=".fif",
+        root=derivatives_root if processing is not None else args.bids_root,
+        check=False,  # Need to disable checking for derivatives
+    )
+    # Written by `mne_bids_pipeline --steps source`, see cluster_pipeline/README.md
+    inv_bidspath = mnb.BIDSPath(
+        subject=args.subject,
+        session=args.session,
+        task="syntaxIM",
+        datatype="meg",
+        suffix="inv",
+        extension=".fif",
+        root=derivatives_root,
+        check=False,
+    )
+
+    minidur = freqtag_spec.WORD_DUR * freqtag_spec.MINIBLOCK_LEN
+
+    try:
+        raw = mne.io.read_raw_fif(raw_bidspath.fpath, verbose=False)
+    except FileNotFoundError:
+        raw = mne.io.read_raw_fif(raw_bidspath.copy().update(split=None).fpath, verbose=False)
+    inv = mne.minimum_norm.read_inverse_operator(inv_bidspath.fpath, verbose=False)
+    events, evdict = mne.events_from_annotations(raw)
+    keepev = {k: v for k, v in evdict.items() if k.split("/")[0] == "MINIBLOCK"}
+    epochs = mne.Epochs(raw, event_id=keepev, tmin=-0.2, tmax=minidur, picks="all", verbose=False)
+    epochs.load_data()
+    del raw
+
+    # Same window and noise bins as the sensor SNR of 02_subject_sensor_snr.py
+    tmin = 0.0
+    tmax = minidur
+    snr_neighbor_freqs = 0.8  # Hz
+    snr_skip_freqs = 0.1  # Hz total either side
+    snr_skip_neighbor_J = int((snr_skip_freqs / 2) / (1 / (tmax - tmin)))
+    snr_neighbor_K = int((snr_neighbor_freqs / 2) / (1 / (tmax - tmin)) - snr_skip_neighbor_J)
+
+    print("Projecting tagged Fourier coefficients to source space per condition...")
+    conditions = [
+        *(f"ONEWORD/{cond}/{tag}" for cond in ("WORD", "NONWORD") for tag in ("F1", "F2")),
+        *(
+            f"TWOWORD/{cond}/{tag}"
+            for cond in ("PHRASE", "NONPHRASE", "NONWORD")
+            for tag in ("F1LEFT", "F1RIGHT")
+        ),
+    ]
+    source_spectra = {}
+    for cond in conditions:
+        source_spectra[cond] = imsrc.source_spectra(
+            epochs["MINIBLOCK/" + cond],
+            inv,
+            freqtag_spec.FREQUENCIES,
+            tmin=tmin,
+            tmax=tmax,
+            order=args.order,
+            noise_n_neighbor_freqs=snr_neighbor_K,
+            noise_skip_neighbor_freqs=snr_skip_neighbor_J,
+            method=args.method,
+        )
+        print(f"{cond}: {len(epochs['MINIBLOCK/' + cond])} miniblocks")
+
+    with open(
+        procpath / f"ses-{args.session}_task-syntaxIM_sourceSNR_{args.method}.pkl",
+        "wb",
+    ) as f:
+        pickle.dump(source_spectra, f)
+    print("Done.")
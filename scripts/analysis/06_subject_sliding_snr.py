@@ -0,0 +1,122 @@
+import pickle
+from pathlib import Path
+
+import mne
+import mne_bids as mnb
+
+import intermodulation.timeresolved as imtr
+from intermodulation import freqtag_spec
+from intermodulation.freqplan import exact_sfreq
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--proc",
+        type=str,
+        default="raw",
+        help="Processing type: raw, sss, filt, or clean",
+    )
+    parser.add_argument(
+        "--subject",
+        type=str,
+        default="02",
+        help="Subject ID",
+    )
+    parser.add_argument(
+        "--session",
+        type=str,
+        default="01",
+        help="Session ID",
+    )
+    parser.add_argument(
+        "--bids_root",
+        type=Path,
+        default="/srv/beegfs/scratch/users/g/gercek/syntax_im/syntax_dataset",
+        help="Root directory for BIDS dataset",
+    )
+    parser.add_argument(
+        "--savepath",
+        type=Path,
+        default="/srv/beegfs/scratch/users/g/gercek/syntax_im/results",
+        help="Directory in which to save sliding-window SNR data",
+    )
+    parser.add_argument(
+        "--words", type=int, default=1, help="Window length in words of the miniblock"
+    )
+    parser.add_argument(
+        "--step", type=float, default=None, help="Step between windows in s, a quarter window"
+    )
+    args = parser.parse_args()
+
+    processing = None if args.proc == "raw" else args.proc
+    procdir = "raw" if args.proc == "raw" else f"proc-{args.proc}"
+
+    # STORAGE LOCATIONS
+    derivatives_root = args.bids_root / "derivatives/mne-bids-pipeline"
+    procpath = args.savepath / f"sub-{args.subject}" / procdir
+    procpath.mkdir(parents=True, exist_ok=True)
+    print(f"Saving data to {procpath}")
+
+    raw_bidspath = mnb.BIDSPath(
+        subject=args.subject,
+        session=args.session,
+        task="syntaxIM",
+        processing=processing,
+        split="01" if processing in ("sss", "filt", None) else None,
+        datatype="meg",
+        suffix="raw" if processing is not None else None,
+        extension=".fif",
+        root=derivatives_root if processing is not None else args.bids_root,
+        check=False,  # Need to disable checking for derivatives
+    )
+
+    minidur = freqtag_spec.WORD_DUR * freqtag_spec.MINIBLOCK_LEN
+
+    try:
+        raw = mne.io.read_raw_fif(raw_bidspath.fpath, verbose=False)
+    except FileNotFoundError:
+        raw = mne.io.read_raw_fif(raw_bidspath.copy().update(split=None).fpath, verbose=False)
+    events, evdict = mne.events_from_annotations(raw)
+    keepev = {k: v for k, v in evdict.items() if k.split("/")[0] == "MINIBLOCK"}
+    epochs = mne.Epochs(raw, event_id=keepev, tmin=-0.2, tmax=minidur, picks="all", verbose=False)
+    epochs.load_data()
+    del raw
+
+    # Same miniblock span as 02_subject_sensor_snr.py. A word is not a whole number of samples
+    # at 1 or 2 kHz, so the data are resampled to the closest rate below at which it is.
+    window_dur = args.words * freqtag_spec.WORD_DUR
+    print(
+        f"Raw sampled at {epochs.info['sfreq']} Hz, {args.words}-word windows at "
+        f"{exact_sfreq(window_dur, freqtag_spec.FREQUENCIES, epochs.info['sfreq']):.3f} Hz"
+    )
+
+    print("Computing sliding-window SNR and ITC per condition...")
+    conditions = [
+        *(f"ONEWORD/{cond}/{tag}" for cond in ("WORD", "NONWORD") for tag in ("F1", "F2")),
+        *(
+            f"TWOWORD/{cond}/{tag}"
+            for cond in ("PHRASE", "NONPHRASE", "NONWORD")
+            for tag in ("F1LEFT", "F1RIGHT")
+        ),
+    ]
+    sliding = {}
+    for cond in conditions:
+        sliding[cond] = imtr.sliding_spectra(
+            epochs["MINIBLOCK/" + cond],
+            freqtag_spec.FREQUENCIES,
+            window_dur=window_dur,
+            step=args.step,
+            tmin=0.0,
+            tmax=minidur,
+            sfreq="window",
+        )
+        print(f"{cond}: {len(sliding[cond].times)} windows of {sliding[cond].window_dur:.3f} s")
+
+    with open(
+        procpath / f"ses-{args.session}_task-syntaxIM_slidingSNR_{args.words}word.pkl",
+        "wb",
+    ) as f:
+        pickle.dump(sliding, f)
+    print("Done.")
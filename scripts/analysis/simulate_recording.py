@@ -0,0 +1,47 @@
+"""
+Script to write a simulated frequency-tagged recording of the miniblock task, for running and
+benchmarking the analysis scripts without subject data.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+import intermodulation.simulate as imsim
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--n_miniblocks",
+        type=int,
+        default=50,
+        help="Number of miniblocks to simulate",
+    )
+    parser.add_argument(
+        "--sfreq",
+        type=float,
+        default=2000.0,
+        help="Sampling frequency in Hz",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="Random seed",
+    )
+    parser.add_argument(
+        "--savepath",
+        type=Path,
+        default=Path("sub-sim_task-syntaxIM_meg.fif"),
+        help="FIF file to write the recording to",
+    )
+    args = parser.parse_args()
+
+    raw, design = imsim.simulate_raw(
+        args.n_miniblocks, sfreq=args.sfreq, rng=np.random.default_rng(args.seed)
+    )
+    print(f"Simulated {raw.times[-1] / 60:.1f} min of data, {len(design)} miniblocks")
+    raw.save(args.savepath, overwrite=True)
+    design.to_csv(args.savepath.with_suffix(".csv"), index=False)
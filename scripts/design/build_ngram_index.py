@@ -0,0 +1,19 @@
+from pathlib import Path
+
+from intermodulation.ngrams import NgramIndex, build_ngram_index
+
+# %%  Build the memory-mapped n-gram index once; design code then opens it with `NgramIndex`
+ngrampath = Path(__file__).parents[2] / "word_ngrams"
+indexpath = ngrampath / "index"
+
+build_ngram_index(
+    ngrampath / "1grams_english_1b_with_pos.csv",
+    ngrampath / "2grams_english_1a_no_pos.csv",
+    indexpath,
+)
+
+# %%  Sanity check
+index = NgramIndex(indexpath)
+print(f"{index.n_words} words, {index.n_pos} POS tags")
+print(index.word_pos("light"))
+print(index.bigram_freq(["the", "red"], ["world", "car"]))
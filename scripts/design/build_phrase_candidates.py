@@ -0,0 +1,18 @@
+from pathlib import Path
+
+from intermodulation.phrases import build_phrase_candidates, final_phrase_candidates
+
+# %%  Rebuild the phrase candidate tables from the n-gram frequency tables. Point these at larger
+# corpus dumps to rerun stimulus selection; the tables are streamed, so file size is not an issue.
+# The rebuilt tables are written next to the committed ones used for the stimuli, not over them.
+ngrampath = Path(__file__).parents[2] / "word_ngrams"
+unigram_path = ngrampath / "1grams_english_1b_with_pos.csv"
+bigram_path = ngrampath / "2grams_english_1a_no_pos.csv"
+
+candidates = build_phrase_candidates(unigram_path, bigram_path)
+candidates.to_csv(ngrampath / "phrases_candidates_rebuilt.csv", index=False)
+
+# %%  Drop reversible and very common phrases
+final_candidates = final_phrase_candidates(candidates)
+final_candidates.to_csv(ngrampath / "phrases_final_candidates_rebuilt.csv", index=False)
+print(f"{len(final_candidates)} final candidates out of {len(candidates)}")
@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import intermodulation.nonwords as imnw
+
+# %%  Screen every consonant string starting with one of the rare consonant clusters against the
+# n-gram lexicon, then sample an equal number of non-words per onset.
+ngrampath = Path(__file__).parents[2] / "word_ngrams"
+SEED = 42
+N_PER_ONSET = 4
+LENGTHS = (4, 5)
+
+lexicon = imnw.Lexicon.from_unigrams(ngrampath / "1grams_english_1b_with_pos.csv")
+onsets = pd.read_csv(ngrampath / "cons_clust_final_candidates.csv")["clus1"].unique()
+
+nonwords = imnw.generate_nonwords(
+    lexicon,
+    onsets,
+    alphabet=imnw.CONSONANTS,
+    lengths=LENGTHS,
+    n_per_onset=N_PER_ONSET,
+    rng=np.random.default_rng(SEED),
+)
+nonwords.to_csv(ngrampath / "nonword_candidates.csv", index=False)
+print(nonwords.groupby(["onset", "length"]).size().unstack())
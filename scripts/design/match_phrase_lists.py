@@ -0,0 +1,29 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import intermodulation.matching as immt
+from intermodulation.ngrams import NgramIndex
+
+# %%  Check the balance of the committed phrase lists. Set "a" is shown swapped as non-phrases to
+# even subjects and set "b" to odd subjects.
+ngrampath = Path(__file__).parents[2] / "word_ngrams"
+SEED = 42
+N_PHRASES = 60
+
+index = NgramIndex(ngrampath / "index")  # Built by build_ngram_index.py
+even = pd.read_csv(ngrampath / "final_P_NP_evensubs.csv", index_col=0)
+set_a = even[even["condition"] == "non-phrase"].rename(columns={"w1": "w2", "w2": "w1"})
+set_b = even[even["condition"] == "phrase"]
+current = immt.balance_stats(immt.pair_features(set_a, index), immt.pair_features(set_b, index))
+print("Committed lists:\n", current.round(3))
+
+# %%  Draw new matched lists from the final phrase candidates
+candidates = pd.read_csv(ngrampath / "phrases_final_candidates.csv").drop_duplicates(["w1", "w2"])
+even, odd, stats = immt.split_phrase_lists(
+    candidates, index, N_PHRASES, np.random.default_rng(SEED)
+)
+print("Matched lists:\n", stats.round(3))
+even.to_csv(ngrampath / "matched_P_NP_evensubs.csv")
+odd.to_csv(ngrampath / "matched_P_NP_oddsubs.csv")
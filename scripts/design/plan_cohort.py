@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import intermodulation.freqtag_spec as spec
+from intermodulation.cohort import plan_cohort
+from intermodulation.schedule import ScheduleConstraints
+
+# %%  Cohort parameters
+N_SUBJECTS = 100
+COHORT_SEED = 42
+MANIFEST_PATH = Path(__file__).parents[2] / "cohort_manifest.csv"
+
+# %%  Prepare every subject's lists in parallel and fill the word cache used by the task, so
+# each session only needs the subject's seed from the manifest.
+if __name__ == "__main__":
+    manifest = plan_cohort(
+        N_SUBJECTS,
+        COHORT_SEED,
+        wordspath=spec.WORDSPATH,
+        miniblock_len=spec.MINIBLOCK_LEN,
+        freqs=spec.FREQUENCIES,
+        constraints=ScheduleConstraints(**spec.MINIBLOCK_CONSTRAINTS),
+        cache_dir=spec.WORDCACHE_PATH,
+        manifest_path=MANIFEST_PATH,
+    )
+    # Enter seed and even_group in the session dialog of miniblock_task.py
+    subjects = manifest.groupby(level="subject")[["group", "seed", "even_group"]].first()
+    print(subjects.to_string())
@@ -0,0 +1,13 @@
+import intermodulation.freqplan as imfp
+from intermodulation.freqtag_spec import FRAMERATE, MINIBLOCK_LEN, WORD_DUR
+
+# %%  Rank every tag pair the display renders exactly. Change FRAMERATE to re-plan for a display
+# with a different refresh rate; the epoch is one miniblock.
+ORDER = 4
+F_RANGE = (3.0, 30.0)
+
+plan = imfp.plan_tag_pairs(
+    FRAMERATE, MINIBLOCK_LEN * WORD_DUR, order=ORDER, fmin=F_RANGE[0], fmax=F_RANGE[1]
+)
+print(f"{len(plan)} renderable pairs at {FRAMERATE} Hz")
+print(plan.head(20).to_string())
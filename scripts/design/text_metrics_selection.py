@@ -0,0 +1,23 @@
+from pathlib import Path
+
+import pandas as pd
+
+import intermodulation.textmetrics as imtm
+from intermodulation.freqtag_spec import FOVEAL_ANGLE, TEXT_CONFIG, WORD_SEP
+
+# %%  Headless version of font_size_selection.py: measure every two-word stimulus from the glyph
+# advances of the configured font instead of rendering it in a window.
+parent_path = Path(__file__).parents[2]
+cache_dir = parent_path / "text_metrics"
+
+twowords = pd.concat(
+    [pd.read_csv(parent_path / f"{g}_two_word_stimuli.csv", index_col=0) for g in ("even", "odd")]
+)
+metrics = imtm.FontMetrics.from_config(TEXT_CONFIG)
+extents = imtm.cached_word_extents(
+    pd.concat([twowords["w1"], twowords["w2"]]), metrics, cache_dir
+)
+layout = imtm.select_text_layout(twowords, extents, max_sep=FOVEAL_ANGLE, word_sep=WORD_SEP)
+print(f"Font: {metrics.path}")
+print(f"Chosen font height is {layout.height} deg")
+print(f"Largest word separation at that height is {layout.word_sep:.3f} deg")
@@ -13,6 +13,7 @@ from byte_triggers import MockTrigger, ParallelPortTrigger
 from mnemonic import Mnemonic
 from psychopy.gui import DlgFromDict
 
+import intermodulation.freqplan as imfp
 import intermodulation.freqtag_spec as spec
 import intermodulation.states as ims
 import intermodulation.stimuli as imst
@@ -189,11 +190,7 @@ else:
         trigger = MockTrigger()
 
 if not subinfo["debug"]:
-    wordframes = spec.WORD_DUR * framerate
-    assert wordframes % 1 == 0, "Word duration must produce a whole number of frames"
-    f1_frames = int(np.round(framerate / stimpars["f1"]))
-    f2_frames = int(np.round(framerate / stimpars["f2"]))
-    assert f1_frames % 2 == 0 and f2_frames % 2 == 0, "Frames per cycle for each freq must be even"
+    imfp.check_frame_timing(framerate, spec.WORD_DUR, FREQS)
 
 
 ###########################################
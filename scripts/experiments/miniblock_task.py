@@ -12,10 +12,14 @@ from byte_triggers import MockTrigger, ParallelPortTrigger
 from mnemonic import Mnemonic
 from psychopy.gui import DlgFromDict
 
+import intermodulation.freqplan as imfp
 import intermodulation.freqtag_spec as spec
+import intermodulation.schedule as imsch
 import intermodulation.states as ims
 import intermodulation.stimuli as imst
+import intermodulation.streamlog as imsl
 import intermodulation.utils as imu
+import intermodulation.wordcache as imwc
 
 ##################################
 ##  Dialog box for subject info ##
@@ -71,18 +75,22 @@ if subinfo["debug"]:  # Override the experiment parameters with the debug ones i
 ## Load in stimuli for both tasks ##
 ####################################
 
+# Unchecked is the even group, see cohort.EVEN_GROUP_CHECKBOX for planned subjects
 group = "even" if subinfo["even_group"] == 0 else "odd"
 onewordpath = spec.WORDSPATH / f"{group}_one_word_stimuli.csv"
 twowordpath = spec.WORDSPATH / f"{group}_two_word_stimuli.csv"
 
 rng = np.random.default_rng(subinfo["seed"])
-# Prepare word stimuli by first shuffling, then assigning frequencies
-onewords, twowords, allwords = imu.load_prep_words(
+# Prepare word stimuli by first shuffling, then assigning frequencies. Prepared lists are cached
+# by input contents and seed, so the analysis side can load exactly what this subject saw.
+onewords, twowords, allwords = imwc.cached_prep_words(
     path_1w=onewordpath,
     path_2w=twowordpath,
     rng=rng,
     miniblock_len=spec.MINIBLOCK_LEN,
     freqs=[stimpars["f1"], stimpars["f2"]],
+    cache_dir=spec.WORDCACHE_PATH,
+    constraints=imsch.ScheduleConstraints(**spec.MINIBLOCK_CONSTRAINTS),
 )
 if subinfo["debug"] and stimpars["n_mini"] is not None:
     maxmini = stimpars["n_mini"]
@@ -133,11 +141,7 @@ else:
         trigger = MockTrigger()
 
 if not subinfo["debug"]:
-    wordframes = spec.WORD_DUR * framerate
-    assert wordframes % 1 == 0, "Word duration must produce a whole number of frames"
-    f1_frames = int(np.round(framerate / stimpars["f1"]))
-    f2_frames = int(np.round(framerate / stimpars["f2"]))
-    assert f1_frames % 2 == 0 and f2_frames % 2 == 0, "Frames per cycle for each freq must be even"
+    imfp.check_frame_timing(framerate, spec.WORD_DUR, [stimpars["f1"], stimpars["f2"]])
 
 
 ###########################################
@@ -434,7 +438,9 @@ def newblock_trig(trigger, triggers):
 def save_and_quit():
     subj = subinfo["subject"]
     date = subinfo["date"]
-    controller.logger.save(f"interrupted_{subj}_{date}.pkl")
+    # Records are streamed to disk during every ITI, so only the current trial needs flushing
+    controller.logger.close()
+    print(f"Interrupted {subj} {date}, log saved to {controller.logger.path}")
     controller.quit()
     window.close()
     exit()
@@ -444,7 +450,9 @@ controller_2w = pc.ExperimentController(
     states=states_2w,
     window=window,
     start="fixation",
-    logger=pe.ExperimentLog(clock),
+    logger=imsl.StreamingExperimentLog(
+        clock, f"twoword_{subinfo['subject']}_{subinfo['date']}.imlog"
+    ),
     clock=clock,
     trial_endstate="iti",
     N_blocks=spec.N_BLOCKS,
@@ -455,13 +463,19 @@ controller_1w = pc.ExperimentController(
     states=states_1w,
     window=window,
     start="fixation",
-    logger=pe.ExperimentLog(clock),
+    logger=imsl.StreamingExperimentLog(
+        clock, f"oneword_{subinfo['subject']}_{subinfo['date']}.imlog"
+    ),
     clock=clock,
     trial_endstate="iti",
     N_blocks=spec.N_1W_BLOCKS,
     K_blocktrials=blocktrials_1w,
     block_calls=[partial(newblock_trig, trigger=trigger, triggers=spec.TRIGGERS)],
 )
+# Write the finished trial's records to disk at the start of every ITI. The ITI state is shared
+# by both tasks, and flushing the idle logger is a no-op.
+iti.start_calls.append(controller_2w.logger.flush)
+iti.start_calls.append(controller_1w.logger.flush)
 
 controller = controller_2w
 
@@ -498,8 +512,7 @@ if not subinfo["debug"] or not stimpars["skip_twoword"]:
     if subinfo["debug"]:
         controller_2w.logger.contdf.to_csv("testcont.csv")
         controller_2w.logger.statesdf.to_csv("teststates.csv")
-    else:
-        controller_2w.logger.save(f"twoword_{subinfo['subject']}_{subinfo['date']}.pkl")
+    controller_2w.logger.close()
 
 trigger.signal(spec.TRIGGERS.EXPEND)
 
@@ -530,10 +543,9 @@ psyev.globalKeys.add(key="q", modifiers=["ctrl"], func=save_and_quit)
 if not subinfo["debug"] or not stimpars["skip_oneword"]:
     controller_1w.run_experiment()
     if subinfo["debug"]:
-        controller_2w.logger.contdf.to_csv("testcont_1w.csv")
-        controller_2w.logger.statesdf.to_csv("teststates_1w.csv")
-    else:
-        controller_2w.logger.save(f"oneword_{subinfo['subject']}_{subinfo['date']}.pkl")
+        controller_1w.logger.contdf.to_csv("testcont_1w.csv")
+        controller_1w.logger.statesdf.to_csv("teststates_1w.csv")
+    controller_1w.logger.close()
 trigger.signal(spec.TRIGGERS.EXPEND)
 
 window.close()